@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List
+import pandas as pd
+from modules.mock_sunat import ServidorSunatSimulado
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(DIRECTORIO, 'procesar_sunat_paralelo.py')
+
+PALABRAS = (
+    'ANDINA', 'PACIFICO', 'INCA', 'SOLAR', 'NORTE', 'SUR', 'ALTO', 'MISTI', 'CONDOR', 'RIMAC',
+    'HUASCAR', 'TITICACA', 'AMAZONAS', 'MARAÑON', 'CHAVIN', 'NAZCA', 'MOCHE', 'PARACAS', 'VILCA', 'PUNO',
+)
+RUBROS = (
+    'COMERCIAL', 'INDUSTRIAL', 'CONSTRUCTORA', 'INVERSIONES', 'TRANSPORTES', 'DISTRIBUIDORA',
+    'SERVICIOS GENERALES', 'AGROINDUSTRIAL', 'MINERA', 'TEXTIL',
+)
+FORMAS = ('S.A.C.', 'SAC', 'E.I.R.L.', 'S.A.', 'S.R.L.')
+
+
+def generar_entrada(path: str, registros: int, duplicados: float, sin_resultados: float, semilla: int):
+    """
+    Entrada sintetica reproducible: razones sociales con formas societarias variadas,
+    una fraccion de duplicados dispersos y otra sin resultados en el servidor simulado.
+    """
+    aleatorio = random.Random(semilla)
+    unicas = []
+    filas = []
+    for i in range(registros):
+        if unicas and aleatorio.random() < duplicados:
+            razon = aleatorio.choice(unicas)
+        else:
+            razon = (f"{aleatorio.choice(RUBROS)} {aleatorio.choice(PALABRAS)} {aleatorio.choice(PALABRAS)} "
+                     f"{i} {aleatorio.choice(FORMAS)}")
+            if aleatorio.random() < sin_resultados:
+                razon = f"INEXISTENTE {razon}"
+            unicas.append(razon)
+        filas.append({
+            'RAZON SOCIAL': razon,
+            'DIRECCION': f"AV. {aleatorio.choice(PALABRAS)} {aleatorio.randint(100, 999)}",
+            'NUMERO': i + 1,
+        })
+
+    df = pd.DataFrame(filas)
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+    return len(unicas)
+
+
+def _leer_json(path: str) -> Dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _estados_journal(path: str) -> Counter:
+    estados = Counter()
+    try:
+        with open(path, encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    estados[json.loads(linea).get('estado')] += 1
+                except ValueError:
+                    pass
+    except OSError:
+        pass
+    return estados
+
+
+def ejecutar_corrida(url: str, entrada: str, directorio: str, workers: int, args) -> Dict:
+    """Corre procesar_sunat_paralelo.py de punta a punta contra el servidor simulado"""
+    salida = os.path.join(directorio, f'resultados_{workers}w.xlsx')
+    journal = os.path.join(directorio, f'resultados_{workers}w.jsonl')
+    metricas = os.path.join(directorio, f'metricas_{workers}w.json')
+    log = os.path.join(directorio, f'log_{workers}w.txt')
+
+    entorno = dict(os.environ)
+    entorno.update({
+        'SUNAT_URL': url,
+        'INPUT_FILE': entrada,
+        'OUTPUT_FILE': salida,
+        'JOURNAL_FILE': journal,
+        'JOURNAL_FSYNC': 'false',
+        'METRICS_FILE': metricas,
+        'CACHE_ENABLED': 'false',
+        'NUM_WORKERS': str(workers),
+        'WORKERS_MAX': str(workers),
+        'CONTROL_ADAPTATIVO': 'true' if args.adaptativo else 'false',
+        'SCRAPER_BACKEND': args.backend,
+        'TABS_PER_WORKER': str(args.tabs),
+        'HEADLESS_MODE': 'true',
+        'PYTHONUNBUFFERED': '1',
+    })
+    if args.delay is not None:
+        entorno['DELAY_BETWEEN_BATCHES'] = str(args.delay)
+
+    inicio = time.perf_counter()
+    with open(log, 'w', encoding='utf-8') as f:
+        try:
+            # Las pausas interactivas (inicio, CAPTCHA) se responden con ENTER
+            proceso = subprocess.run(
+                [sys.executable, SCRIPT], cwd=DIRECTORIO, env=entorno, input='\n' * 1000,
+                stdout=f, stderr=subprocess.STDOUT, text=True, timeout=args.timeout
+            )
+            codigo = proceso.returncode
+        except subprocess.TimeoutExpired:
+            codigo = 'timeout'
+    segundos = time.perf_counter() - inicio
+
+    datos = _leer_json(metricas)
+    busquedas = datos.get('busquedas', 0)
+    return {
+        'workers': workers,
+        'codigo_salida': codigo,
+        'segundos': round(segundos, 2),
+        'busquedas': busquedas,
+        'busquedas_por_minuto': round(busquedas / segundos * 60, 2) if segundos else 0.0,
+        'registros_por_minuto': round(args.registros / segundos * 60, 2) if segundos else 0.0,
+        'latencia_s': datos.get('latencia_s', {}),
+        'fases_s': datos.get('fases_s', {}),
+        'estados': dict(_estados_journal(journal)),
+        'log': log,
+    }
+
+
+def imprimir_tabla(corridas: List[Dict]):
+    print("\n" + "="*86)
+    print(f"{'Workers':>7} {'Segundos':>9} {'Busquedas':>9} {'Busq/min':>9} {'Reg/min':>9} "
+          f"{'p50':>7} {'p95':>7} {'p99':>7} {'Errores':>8}  Salida")
+    print("-"*86)
+    for c in corridas:
+        latencia = c['latencia_s']
+        errores = sum(n for estado, n in c['estados'].items() if str(estado).startswith('ERROR'))
+        print(f"{c['workers']:>7} {c['segundos']:>9.1f} {c['busquedas']:>9} {c['busquedas_por_minuto']:>9.1f} "
+              f"{c['registros_por_minuto']:>9.1f} {latencia.get('p50', 0):>7.2f} {latencia.get('p95', 0):>7.2f} "
+              f"{latencia.get('p99', 0):>7.2f} {errores:>8}  {c['codigo_salida']}")
+    print("="*86)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark de throughput de procesar_sunat_paralelo.py contra un SUNAT simulado local")
+    parser.add_argument('--workers', default='1,2,4', help="Numeros de workers a medir, separados por coma (default: 1,2,4)")
+    parser.add_argument('--registros', type=int, default=200, help="Filas de la entrada sintetica (default: 200)")
+    parser.add_argument('--duplicados', type=float, default=0.2, help="Fraccion de filas duplicadas (default: 0.2)")
+    parser.add_argument('--sin-resultados', type=float, default=0.05,
+                        help="Fraccion de razones sin resultados en SUNAT (default: 0.05)")
+    parser.add_argument('--formato', choices=['xlsx', 'csv'], default='xlsx', help="Formato de la entrada (default: xlsx)")
+    parser.add_argument('--semilla', type=int, default=42, help="Semilla de la entrada y del servidor (default: 42)")
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='http', help="SCRAPER_BACKEND (default: http)")
+    parser.add_argument('--tabs', type=int, default=1, help="TABS_PER_WORKER (default: 1)")
+    parser.add_argument('--delay', type=float, default=None, help="DELAY_BETWEEN_BATCHES (default: el de config)")
+    parser.add_argument('--adaptativo', action='store_true', help="Activar el control adaptativo (default: desactivado)")
+    parser.add_argument('--timeout', type=float, default=1800, help="Segundos maximos por corrida (default: 1800)")
+    parser.add_argument('--latencia', type=float, default=0.3, help="Latencia fija del servidor en segundos (default: 0.3)")
+    parser.add_argument('--jitter', type=float, default=0.2, help="Latencia aleatoria extra en segundos (default: 0.2)")
+    parser.add_argument('--capacidad', type=int, default=0, help="Busquedas que el servidor atiende a la vez, 0 = sin limite")
+    parser.add_argument('--tasa-error', type=float, default=0.0, help="Fraccion de respuestas HTTP 500")
+    parser.add_argument('--tasa-corte', type=float, default=0.0, help="Fraccion de conexiones cortadas")
+    parser.add_argument('--tasa-alert', type=float, default=0.0, help="Fraccion de respuestas con alert")
+    parser.add_argument('--iframe', action='store_true', help="Resultados dentro de un iframe (solo backend selenium)")
+    parser.add_argument('--salida', default=None, help="Guardar el reporte en este archivo JSON")
+    parser.add_argument('--directorio', default=None, help="Directorio de trabajo (default: uno temporal)")
+    args = parser.parse_args()
+
+    lista_workers = [int(w) for w in args.workers.split(',') if w.strip()]
+    random.seed(args.semilla)
+
+    servidor = ServidorSunatSimulado(
+        latencia=args.latencia, jitter=args.jitter, capacidad=args.capacidad, tasa_error=args.tasa_error,
+        tasa_corte=args.tasa_corte, tasa_alert=args.tasa_alert, iframe=args.iframe
+    )
+    url = servidor.iniciar()
+    directorio = args.directorio or tempfile.mkdtemp(prefix='benchmark_sunat_')
+    os.makedirs(directorio, exist_ok=True)
+
+    print("="*70)
+    print("BENCHMARK SUNAT (servidor simulado)")
+    print("="*70)
+    print(f"Servidor: {url}")
+    print(f"Latencia: {args.latencia}s + hasta {args.jitter}s | capacidad: {args.capacidad or 'sin limite'}")
+    print(f"Errores: 500 {args.tasa_error:.0%} | cortes {args.tasa_corte:.0%} | alerts {args.tasa_alert:.0%}")
+    print(f"Backend: {args.backend} | pestanas: {args.tabs} | control adaptativo: {args.adaptativo}")
+
+    entrada = os.path.join(directorio, f'entrada.{args.formato}')
+    unicas = generar_entrada(entrada, args.registros, args.duplicados, args.sin_resultados, args.semilla)
+    print(f"Entrada: {entrada} ({args.registros} registros, {unicas} razones unicas)")
+    print(f"Directorio de trabajo: {directorio}")
+
+    corridas = []
+    try:
+        for workers in lista_workers:
+            print(f"\nCorriendo con {workers} workers...")
+            corrida = ejecutar_corrida(url, entrada, directorio, workers, args)
+            corridas.append(corrida)
+            print(f"  {corrida['segundos']:.1f}s | {corrida['busquedas_por_minuto']:.1f} busquedas/min | "
+                  f"estados: {corrida['estados']} | log: {corrida['log']}")
+    except KeyboardInterrupt:
+        print("\nBenchmark interrumpido")
+    finally:
+        servidor.detener()
+
+    imprimir_tabla(corridas)
+
+    if args.salida:
+        reporte = {
+            'parametros': vars(args),
+            'razones_unicas': unicas,
+            'consultas_servidor': servidor.consultas,
+            'corridas': corridas,
+        }
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+        print(f"Reporte: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
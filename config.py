@@ -5,22 +5,142 @@ load_dotenv()
 
 INPUT_FILE = os.getenv('INPUT_FILE', 'DATA.xlsx')
 OUTPUT_FILE = os.getenv('OUTPUT_FILE', 'RESULTADOS_FINALES.xlsx')
+# Lectura incremental de la entrada (xlsx, csv o parquet): solo las columnas usadas, por bloques
+INPUT_STREAMING = os.getenv('INPUT_STREAMING', 'true').lower() == 'true'
+INPUT_CHUNK_SIZE = int(os.getenv('INPUT_CHUNK_SIZE', 5000))
+INPUT_CSV_SEP = os.getenv('INPUT_CSV_SEP', ',')
+INPUT_CSV_ENCODING = os.getenv('INPUT_CSV_ENCODING', 'utf-8')
 
-CHROMEDRIVER_PATHS = [
+# Journal append-only donde se escribe cada resultado al completarse (el xlsx se genera al final)
+JOURNAL_FILE = os.getenv('JOURNAL_FILE', os.path.splitext(OUTPUT_FILE)[0] + '.jsonl')
+JOURNAL_FSYNC = os.getenv('JOURNAL_FSYNC', 'true').lower() == 'true'
+# Mapa representante -> duplicados: solo se guarda un resultado por razon social unica
+DUPLICADOS_FILE = os.getenv('DUPLICADOS_FILE', os.path.splitext(JOURNAL_FILE)[0] + '.duplicados.jsonl')
+
+CHROMEDRIVER_PATHS = [p for p in [
+    os.getenv('CHROMEDRIVER_PATH'),
     os.path.expanduser("~/.chromedriver/chromedriver.exe"),
     "C:/chromedriver/chromedriver.exe",
     "chromedriver.exe"
-]
+] if p]
 
 NUM_WORKERS = int(os.getenv('NUM_WORKERS', 5))
 BATCH_SIZE = int(os.getenv('BATCH_SIZE', 5))
 DELAY_BETWEEN_BATCHES = float(os.getenv('DELAY_BETWEEN_BATCHES', 0.5))
+# Metricas de busqueda: archivo exportado periodicamente ('.prom' = formato Prometheus, si no JSON; vacio = no exportar)
+METRICS_FILE = os.getenv('METRICS_FILE', 'metricas_sunat.json')
+METRICS_INTERVAL = float(os.getenv('METRICS_INTERVAL', 30))
+METRICS_VENTANA = int(os.getenv('METRICS_VENTANA', 1000))  # busquedas para los percentiles
+METRICS_VENTANA_TASA = float(os.getenv('METRICS_VENTANA_TASA', 300))  # segundos para registros/minuto y ETA
+
+# Control adaptativo (AIMD): ajusta en ejecucion los workers activos y la pausa entre busquedas
+# segun la latencia, los alerts/CAPTCHA y los errores de conexion observados
+CONTROL_ADAPTATIVO = os.getenv('CONTROL_ADAPTATIVO', 'true').lower() == 'true'
+WORKERS_MIN = int(os.getenv('WORKERS_MIN', 1))
+WORKERS_MAX = int(os.getenv('WORKERS_MAX', NUM_WORKERS))
+DELAY_MIN = float(os.getenv('DELAY_MIN', 0.0))
+DELAY_MAX = float(os.getenv('DELAY_MAX', 10.0))
+DELAY_PASO = float(os.getenv('DELAY_PASO', 0.1))
+CONTROL_INTERVALO = float(os.getenv('CONTROL_INTERVALO', 15))
+CONTROL_MIN_MUESTRAS = int(os.getenv('CONTROL_MIN_MUESTRAS', 5))
+CONTROL_FACTOR_LATENCIA = float(os.getenv('CONTROL_FACTOR_LATENCIA', 2.0))
+CONTROL_MAX_TASA_ALERTAS = float(os.getenv('CONTROL_MAX_TASA_ALERTAS', 0.5))
+# Motor asyncio (procesar_sunat_async.py): busquedas simultaneas y limite global de consultas/segundo (una por variante)
+ASYNC_CONCURRENCY = int(os.getenv('ASYNC_CONCURRENCY', 20))
+RATE_LIMIT_RPS = float(os.getenv('RATE_LIMIT_RPS', 2.0))
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', 5))
+
+# Segundos que un worker puede retener un registro antes de que vuelva a la cola (0 = sin limite)
+WORK_LEASE_TIMEOUT = float(os.getenv('WORK_LEASE_TIMEOUT', 300))
+
+# Circuit breaker ante errores de conexion: pausa a los workers y sondea SUNAT_URL con backoff exponencial
+CIRCUIT_UMBRAL = int(os.getenv('CIRCUIT_UMBRAL', 1))  # errores de conexion seguidos para abrir el circuito
+CIRCUIT_BACKOFF_INICIAL = float(os.getenv('CIRCUIT_BACKOFF_INICIAL', 5))
+CIRCUIT_BACKOFF_MAX = float(os.getenv('CIRCUIT_BACKOFF_MAX', 300))
+CONEXION_MAX_REINTENTOS = int(os.getenv('CONEXION_MAX_REINTENTOS', 3))  # reencolados de un registro por error de conexion
+
+# Reanudacion: los resultados con estos estados vuelven a quedar pendientes hasta MAX_INTENTOS corridas
+ESTADOS_REINTENTABLES = [e.strip() for e in os.getenv(
+    'ESTADOS_REINTENTABLES', 'ERROR,ERROR_CONEXION,CAPTCHA,NO ENCONTRADO'
+).split(',') if e.strip()]
+MAX_INTENTOS = int(os.getenv('MAX_INTENTOS', 3))
 
 SELENIUM_TIMEOUT = int(os.getenv('SELENIUM_TIMEOUT', 10))
-PAGE_LOAD_WAIT = float(os.getenv('PAGE_LOAD_WAIT', 3))
+
+# Pool de Chrome precalentados (solo backend selenium)
+BROWSER_POOL_ENABLED = os.getenv('BROWSER_POOL_ENABLED', 'true').lower() == 'true'
+BROWSER_POOL_RESERVA = int(os.getenv('BROWSER_POOL_RESERVA', 1))
+BROWSER_POOL_TIMEOUT = float(os.getenv('BROWSER_POOL_TIMEOUT', 120))
+# Reciclar cada Chrome tras N busquedas o si su memoria supera el limite (0 = desactivado, requiere psutil)
+DRIVER_MAX_BUSQUEDAS = int(os.getenv('DRIVER_MAX_BUSQUEDAS', 300))
+DRIVER_MAX_RSS_MB = float(os.getenv('DRIVER_MAX_RSS_MB', 1500))
+# Peticiones bloqueadas via DevTools en cada pagina (patrones con comodin *, separados por coma)
+URLS_BLOQUEADAS = [u.strip() for u in os.getenv('URLS_BLOQUEADAS', ','.join([
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.ico', '*.webp',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*clarity.ms*',
+])).split(',') if u.strip()]
+# Contar peticiones y bytes transferidos por busqueda (log de performance de Chrome)
+CONTADORES_RED = os.getenv('CONTADORES_RED', 'true').lower() == 'true'
+# Pestanas por Chrome: mientras una espera la respuesta de SUNAT otra escribe y envia (1 = secuencial)
+TABS_PER_WORKER = int(os.getenv('TABS_PER_WORKER', 1))
+
+# Espera por eventos tras enviar la busqueda: termina apenas aparecen resultados,
+# un alert o el mensaje de sin resultados; RESULT_WAIT_TIMEOUT es el limite duro
+RESULT_WAIT_TIMEOUT = float(os.getenv('RESULT_WAIT_TIMEOUT', 10))
+RESULT_POLL_INTERVAL = float(os.getenv('RESULT_POLL_INTERVAL', 0.1))
+SELECTOR_RESULTADOS = os.getenv('SELECTOR_RESULTADOS', 'a.aRucs, .list-group a.list-group-item')
+XPATH_SIN_RESULTADOS = (
+    "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'no se encontr')"
+    " or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'no existe')"
+    " or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'no produjo resultados')]"
+)
 HEADLESS_MODE = os.getenv('HEADLESS_MODE', 'false').lower() == 'true'
 
-SUNAT_URL = "https://e-consultaruc.sunat.gob.pe/cl-ti-itmrconsruc/jcrS00Alias"
+# Deduplicacion: 'global' (cualquier posicion) o 'consecutivo' (solo filas contiguas)
+DEDUP_MODE = os.getenv('DEDUP_MODE', 'global')
+
+# Cache persistente de RUCs (SQLite), clave = razon social limpia
+CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_FILE = os.getenv('CACHE_FILE', 'cache_rucs.sqlite')
+CACHE_TTL_DIAS = float(os.getenv('CACHE_TTL_DIAS', 30))
+CACHE_MAX_ENTRADAS = int(os.getenv('CACHE_MAX_ENTRADAS', 500000))
+
+SUNAT_URL = os.getenv('SUNAT_URL', "https://e-consultaruc.sunat.gob.pe/cl-ti-itmrconsruc/jcrS00Alias")
+
+# Backend de busqueda: 'selenium' (Chrome), 'http' (peticiones directas sin navegador)
+# o 'replay' (responde desde las paginas grabadas en ARCHIVO_PAGINAS, sin red)
+SCRAPER_BACKEND = os.getenv('SCRAPER_BACKEND', 'selenium').lower()
+
+# Grabacion del HTML crudo de cada respuesta, por variante, para re-parsear sin red
+GRABAR_PAGINAS = os.getenv('GRABAR_PAGINAS', 'false').lower() == 'true'
+ARCHIVO_PAGINAS = os.getenv('ARCHIVO_PAGINAS', 'paginas_sunat.sqlite')
+ARCHIVO_PAGINAS_COMPRESION = int(os.getenv('ARCHIVO_PAGINAS_COMPRESION', 6))  # nivel zlib (1-9)
+
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 15))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 4))
+HTTP_USER_AGENT = os.getenv(
+    'HTTP_USER_AGENT',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+)
+
+# Campos del formulario "Por Razon Social" de jcrS00Alias (razSoc, search3 y token se completan por busqueda)
+SUNAT_HTTP_FORM = {
+    'accion': 'consPorRazonSoc',
+    'razSoc': '',
+    'nroRuc': '',
+    'nrodoc': '',
+    'contexto': 'ti-it',
+    'modo': '1',
+    'rbtnTipo': '3',
+    'search1': '',
+    'tipdoc': '1',
+    'search2': '',
+    'search3': '',
+    'codigo': '',
+    'token': '',
+}
 
 OUTPUT_COLUMNS = [
     'indice_original',
@@ -30,7 +150,9 @@ OUTPUT_COLUMNS = [
     'observacion',
     'direccion_original',
     'numero_original',
-    'worker_id'
+    'worker_id',
+    'intentos',
+    'huella'
 ]
 
 STATUS = {
@@ -41,6 +163,12 @@ STATUS = {
     'NOT_FOUND': 'NO ENCONTRADO'
 }
 
+# Seleccion de candidatos por similitud de tokens con la razon social buscada (0 a 1)
+# >= SIMILITUD_ALTA: coincidencia segura, no se prueban mas variantes
+# <  SIMILITUD_MINIMA: el candidato se descarta (no pertenece a la empresa buscada)
+SIMILITUD_ALTA = float(os.getenv('SIMILITUD_ALTA', 0.85))
+SIMILITUD_MINIMA = float(os.getenv('SIMILITUD_MINIMA', 0.3))
+
 SUFIJOS_EMPRESAS = [
     ' SAC', ' EIRL', ' SRL', ' SAA', ' SA',
     ' SOCIEDAD ANONIMA CERRADA',
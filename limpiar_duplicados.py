@@ -1,68 +1,54 @@
+import argparse
 import pandas as pd
-import sys
+from modules.excel_manager import ExcelManager
 
-def limpiar_duplicados_consecutivos(archivo_entrada, archivo_salida=None):
+def limpiar_duplicados(archivo_entrada, archivo_salida=None, modo='consecutivo'):
     """
-    Elimina duplicados consecutivos de un Excel.
-    Mantiene solo la primera ocurrencia de cada razon social consecutiva.
+    Elimina duplicados de un Excel usando la misma deduplicacion que el procesamiento.
+    - consecutivo: mantiene solo la primera ocurrencia de cada razon social consecutiva
+    - global: mantiene solo la primera ocurrencia de cada razon social en todo el archivo
     """
     if archivo_salida is None:
         archivo_salida = archivo_entrada.replace('.xlsx', '_LIMPIO.xlsx')
-    
+
     print("="*70)
-    print("LIMPIADOR DE DUPLICADOS CONSECUTIVOS")
+    print(f"LIMPIADOR DE DUPLICADOS ({modo.upper()})")
     print("="*70)
-    
+
     try:
+        excel_manager = ExcelManager(input_file=archivo_entrada, output_file=archivo_salida)
         df = pd.read_excel(archivo_entrada)
         print(f"\nArchivo cargado: {archivo_entrada}")
         print(f"Total registros: {len(df)}")
-        
-        col_razon = None
-        for col in df.columns:
-            if 'razon' in col.lower() or 'social' in col.lower():
-                col_razon = col
-                break
-        
-        if not col_razon:
-            print("ERROR: No se encontro columna de Razon Social")
-            return
-        
-        print(f"Columna detectada: {col_razon}")
-        
-        indices_a_mantener = []
-        razon_anterior = None
-        duplicados_eliminados = 0
-        
-        for idx, row in df.iterrows():
-            razon_actual = str(row[col_razon]).strip().upper()
-            
-            if razon_actual != razon_anterior:
-                indices_a_mantener.append(idx)
-                razon_anterior = razon_actual
-            else:
-                duplicados_eliminados += 1
-        
-        df_limpio = df.loc[indices_a_mantener]
-        
+
+        col_razon = excel_manager.find_columns(df)['razon']
+
+        df_limpio, _ = excel_manager.deduplicate(df, col_razon, modo)
+        duplicados_eliminados = len(df) - len(df_limpio)
+
         print(f"\nResultados:")
         print(f"  Registros originales: {len(df)}")
         print(f"  Duplicados eliminados: {duplicados_eliminados}")
         print(f"  Registros finales: {len(df_limpio)}")
         print(f"  Reduccion: {duplicados_eliminados/len(df)*100:.1f}%")
-        
+
         df_limpio.to_excel(archivo_salida, index=False)
         print(f"\nArchivo guardado: {archivo_salida}")
-        
+
     except Exception as e:
         print(f"ERROR: {e}")
         import traceback
         traceback.print_exc()
 
+def limpiar_duplicados_consecutivos(archivo_entrada, archivo_salida=None):
+    limpiar_duplicados(archivo_entrada, archivo_salida, modo='consecutivo')
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        archivo = sys.argv[1]
-    else:
-        archivo = "DATA.xlsx"
-    
-    limpiar_duplicados_consecutivos(archivo)
+    parser = argparse.ArgumentParser(description="Elimina razones sociales duplicadas de un Excel")
+    parser.add_argument('archivo', nargs='?', default="DATA.xlsx")
+    parser.add_argument('--salida', default=None, help="Archivo de salida (default: <archivo>_LIMPIO.xlsx)")
+    parser.add_argument('--modo', choices=['consecutivo', 'global'], default='consecutivo',
+                        help="consecutivo: solo duplicados seguidos (default); global: en cualquier posicion")
+    args = parser.parse_args()
+
+    limpiar_duplicados(args.archivo, args.salida, args.modo)
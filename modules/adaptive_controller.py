@@ -0,0 +1,123 @@
+import threading
+from statistics import median
+from typing import Callable, List
+import config
+
+
+class ControlAdaptativo:
+    """
+    Control AIMD del numero de workers activos y de la pausa entre busquedas.
+    Cada CONTROL_INTERVALO segundos se evaluan las busquedas terminadas desde la ultima revision:
+    - Con senales de congestion (errores de conexion, CAPTCHA, demasiados alerts o una latencia
+      mediana muy por encima de la de referencia) se reducen a la mitad los workers activos
+      y se duplica la pausa (decremento multiplicativo).
+    - Sin congestion primero se acorta la pausa en DELAY_PASO y, ya en el minimo,
+      se activa un worker mas (incremento aditivo).
+    Los workers por encima del numero activo quedan estacionados sin tomar registros.
+    """
+
+    def __init__(self, workers_inicial: int, workers_min: int = None, workers_max: int = None,
+                 delay_inicial: float = None, delay_min: float = None, delay_max: float = None):
+        self.cond = threading.Condition()
+        self.workers_max = max(1, config.WORKERS_MAX if workers_max is None else workers_max)
+        self.workers_min = min(self.workers_max, max(1, config.WORKERS_MIN if workers_min is None else workers_min))
+        self.delay_base = config.DELAY_BETWEEN_BATCHES if delay_inicial is None else delay_inicial
+        self.delay_min = config.DELAY_MIN if delay_min is None else delay_min
+        self.delay_max = config.DELAY_MAX if delay_max is None else delay_max
+
+        self.activos = min(self.workers_max, max(self.workers_min, workers_inicial))
+        self.delay = min(self.delay_max, max(self.delay_min, self.delay_base))
+        self.latencia_referencia = None
+        self.retirados = set()  # workers que terminaron: su turno pasa a los siguientes
+        self._reiniciar_ventana()
+
+    def _reiniciar_ventana(self):
+        self.latencias: List[float] = []
+        self.busquedas = 0
+        self.errores_conexion = 0
+        self.alertas = 0
+        self.captchas = 0
+
+    def registrar(self, latencia: float, estado: str, alertas: int = 0, captchas: int = 0):
+        """
+        Registra una busqueda terminada. latencia: suma de las fases de la busqueda sin la
+        espera por CAPTCHA; incluye las demas esperas medidas como fase (p.ej. limite_tasa)
+        """
+        with self.cond:
+            self.busquedas += 1
+            self.alertas += alertas
+            self.captchas += captchas
+            if estado == 'ERROR_CONEXION':
+                self.errores_conexion += 1
+            elif latencia > 0:
+                self.latencias.append(latencia)
+
+    def _motivo_congestion(self) -> str:
+        if self.errores_conexion:
+            return f"{self.errores_conexion} errores de conexion"
+        if self.captchas:
+            return f"{self.captchas} CAPTCHA"
+        if self.busquedas and self.alertas / self.busquedas > config.CONTROL_MAX_TASA_ALERTAS:
+            return f"{self.alertas} alerts en {self.busquedas} busquedas"
+
+        if not self.latencias:
+            return ''
+        mediana = median(self.latencias)
+        referencia = self.latencia_referencia
+        if referencia is not None and mediana > referencia * config.CONTROL_FACTOR_LATENCIA:
+            return f"latencia {mediana:.2f}s (referencia {referencia:.2f}s)"
+
+        # La referencia baja de inmediato y sube lentamente si el sitio se vuelve mas lento en general
+        if referencia is None or mediana < referencia:
+            self.latencia_referencia = mediana
+        else:
+            self.latencia_referencia = referencia + 0.1 * (mediana - referencia)
+        return ''
+
+    def ajustar(self) -> str:
+        """Evalua la ventana actual y ajusta workers/pausa; retorna la descripcion del cambio ('' si no hubo)"""
+        with self.cond:
+            if self.busquedas == 0:
+                return ''
+
+            motivo = self._motivo_congestion()
+            if not motivo and self.busquedas < config.CONTROL_MIN_MUESTRAS:
+                # Muestra insuficiente: se sigue acumulando en la misma ventana
+                return ''
+
+            activos, delay = self.activos, self.delay
+            if motivo:
+                self.activos = max(self.workers_min, self.activos // 2)
+                self.delay = min(self.delay_max, max(self.delay * 2, self.delay_base))
+            elif self.delay > self.delay_min:
+                self.delay = max(self.delay_min, round(self.delay - config.DELAY_PASO, 3))
+            else:
+                self.activos = min(self.workers_max, self.activos + 1)
+            self._reiniciar_ventana()
+
+            if (activos, delay) == (self.activos, self.delay):
+                return ''
+            self.cond.notify_all()
+            return (f"{motivo or 'sin congestion'}: workers activos {activos} -> {self.activos}, "
+                    f"pausa {delay:.2f}s -> {self.delay:.2f}s")
+
+    def _activo(self, worker_id: int) -> bool:
+        # Estan activos los primeros `activos` workers que siguen en ejecucion
+        posicion = worker_id - sum(1 for w in self.retirados if w < worker_id)
+        return posicion < self.activos
+
+    def puede_trabajar(self, worker_id: int) -> bool:
+        with self.cond:
+            return self._activo(worker_id)
+
+    def esperar_turno(self, worker_id: int, terminado: Callable[[], bool]):
+        """Bloquea a un worker estacionado hasta que vuelva a estar activo o ya no quede trabajo"""
+        with self.cond:
+            while not self._activo(worker_id) and not terminado():
+                self.cond.wait(1.0)
+
+    def retirar(self, worker_id: int):
+        """Un worker termino (o murio): cede su turno a un worker estacionado"""
+        with self.cond:
+            self.retirados.add(worker_id)
+            self.cond.notify_all()
@@ -0,0 +1,49 @@
+import config
+from modules.sunat_scraper import SunatScraper
+
+
+def crear_scraper(worker_id: int = 0, backend: str = None, pool=None) -> SunatScraper:
+    """
+    Crea el backend de busqueda configurado en SCRAPER_BACKEND.
+    - 'selenium': Chrome controlado por Selenium (default); usa el BrowserPool si se entrega
+    - 'http': peticiones HTTP directas, sin navegador
+    - 'replay': paginas grabadas en ARCHIVO_PAGINAS, sin red
+    Con GRABAR_PAGINAS los backends reales graban el HTML de cada respuesta.
+    """
+    backend = (backend or config.SCRAPER_BACKEND).lower()
+    
+    if backend == 'replay':
+        from modules.sunat_replay import SunatReplayScraper
+        return SunatReplayScraper(worker_id=worker_id)
+    
+    if backend == 'http':
+        from modules.sunat_http import SunatHttpScraper
+        scraper = SunatHttpScraper(worker_id=worker_id)
+    elif backend == 'selenium':
+        scraper = SunatScraper(worker_id=worker_id)
+        scraper.pool = pool
+    else:
+        raise ValueError(f"Backend desconocido: {backend}")
+    
+    if config.GRABAR_PAGINAS:
+        from modules.page_archive import abrir_archivo_paginas
+        scraper.archivo = abrir_archivo_paginas()
+    return scraper
+
+
+def crear_browser_pool(tamano: int, backend: str = None):
+    """BrowserPool ya lanzado para el backend selenium (None si no aplica o esta desactivado)"""
+    backend = (backend or config.SCRAPER_BACKEND).lower()
+    if backend != 'selenium' or not config.BROWSER_POOL_ENABLED:
+        return None
+    
+    # En modo headless el Worker 0 sigue visible (debugging) y lanza su propio Chrome
+    if config.HEADLESS_MODE:
+        tamano -= 1
+    if tamano <= 0:
+        return None
+    
+    from modules.browser_pool import BrowserPool
+    pool = BrowserPool(tamano)
+    pool.start()
+    return pool
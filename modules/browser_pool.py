@@ -0,0 +1,120 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import config
+from modules.sunat_scraper import crear_driver_chrome
+
+
+class BrowserPool:
+    """
+    Pool de Chrome "calientes" compartido por los workers.
+    - Los Chrome se lanzan en paralelo en segundo plano
+    - Cuando un worker toma uno se lanza otro solo si la reserva (listos + iniciandose)
+      queda por debajo de `reserva`: el proceso nunca pasa de tamano + reserva Chrome
+      y reciclar un Chrome (por busquedas o memoria) no espera un arranque en frio
+    - Los Chrome liberados se cierran en segundo plano
+    """
+
+    def __init__(self, tamano: int, reserva: int = None, headless: bool = None):
+        self.tamano = tamano
+        self.reserva = config.BROWSER_POOL_RESERVA if reserva is None else reserva
+        self.headless = config.HEADLESS_MODE if headless is None else headless
+        self.listos = queue.Queue()
+        self.lock = threading.Lock()
+        self.creando = 0
+        self.creados = 0
+        self.fallos = 0
+        self.cerrado = False
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.tamano + self.reserva,
+            thread_name_prefix='browser-pool'
+        )
+
+    def start(self):
+        total = self.tamano + self.reserva
+        print(f"[Pool] Lanzando {total} Chrome en paralelo ({self.tamano} workers + {self.reserva} de reserva)")
+        for _ in range(total):
+            self._lanzar()
+
+    def _lanzar(self):
+        with self.lock:
+            if self.cerrado:
+                return
+            self.creando += 1
+        self.executor.submit(self._crear)
+
+    def _reponer(self):
+        """Lanza un Chrome solo si la reserva (listos + iniciandose) quedo incompleta"""
+        with self.lock:
+            if self.cerrado or self.listos.qsize() + self.creando >= self.reserva:
+                return
+            self.creando += 1
+        self.executor.submit(self._crear)
+
+    def _crear(self):
+        try:
+            driver = crear_driver_chrome(self.headless)
+        except Exception as e:
+            with self.lock:
+                self.creando -= 1
+                self.fallos += 1
+            print(f"[Pool] ERROR iniciando Chrome: {e}")
+            return
+
+        with self.lock:
+            self.creando -= 1
+            self.creados += 1
+            cerrado = self.cerrado
+
+        if cerrado:
+            self._cerrar(driver)
+        else:
+            self.listos.put(driver)
+
+    def obtener(self, timeout: float = None):
+        """Entrega un Chrome ya iniciado (None si no hay ninguno a tiempo) y repone la reserva"""
+        with self.lock:
+            sin_reserva = self.listos.empty() and self.creando == 0
+        if sin_reserva:
+            self._lanzar()
+
+        try:
+            driver = self.listos.get(timeout=timeout or config.BROWSER_POOL_TIMEOUT)
+        except queue.Empty:
+            return None
+
+        self._reponer()
+        return driver
+
+    def liberar(self, driver):
+        """Cierra un Chrome en segundo plano (el worker no espera el quit)"""
+        if driver is None:
+            return
+        try:
+            self.executor.submit(self._cerrar, driver)
+        except RuntimeError:
+            # Executor ya cerrado
+            self._cerrar(driver)
+
+    def _cerrar(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def cerrar(self):
+        with self.lock:
+            self.cerrado = True
+        while True:
+            try:
+                self._cerrar(self.listos.get_nowait())
+            except queue.Empty:
+                break
+        self.executor.shutdown(wait=True)
+        # Chrome que terminaron de iniciarse mientras se cerraba el pool
+        while True:
+            try:
+                self._cerrar(self.listos.get_nowait())
+            except queue.Empty:
+                break
+        print(f"[Pool] Cerrado ({self.creados} Chrome iniciados, {self.fallos} fallos)")
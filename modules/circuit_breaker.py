@@ -0,0 +1,99 @@
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import config
+
+
+class CircuitBreaker:
+    """
+    Corta el trafico a SUNAT ante errores de conexion y lo reanuda solo.
+    - Cerrado: los workers trabajan (pause_event activo).
+    - Abierto: tras CIRCUIT_UMBRAL errores de conexion seguidos se pausa a todos los
+      workers y un hilo sondea SUNAT_URL con backoff exponencial (CIRCUIT_BACKOFF_INICIAL,
+      x2 por intento, hasta CIRCUIT_BACKOFF_MAX segundos).
+    - La primera sonda exitosa cierra el circuito y los workers continuan, sin ENTER.
+    """
+
+    def __init__(self, pause_event: threading.Event, url: str = None, umbral: int = None,
+                 backoff_inicial: float = None, backoff_max: float = None):
+        self.pause_event = pause_event
+        self.url = url or config.SUNAT_URL
+        self.umbral = max(1, config.CIRCUIT_UMBRAL if umbral is None else umbral)
+        self.backoff_inicial = config.CIRCUIT_BACKOFF_INICIAL if backoff_inicial is None else backoff_inicial
+        self.backoff_max = config.CIRCUIT_BACKOFF_MAX if backoff_max is None else backoff_max
+        self.lock = threading.Lock()
+        self.fallos_seguidos = 0
+        self.aperturas = 0
+        self.segundos_abierto = 0.0
+        self.abierto_desde = None
+        self.detenido = threading.Event()
+        self.sonda = None
+
+    @property
+    def abierto(self) -> bool:
+        with self.lock:
+            return self.abierto_desde is not None
+
+    def registrar_exito(self):
+        with self.lock:
+            self.fallos_seguidos = 0
+
+    def registrar_fallo(self, motivo: str = '') -> bool:
+        """Un error de conexion; retorna True si con este se abrio el circuito"""
+        with self.lock:
+            self.fallos_seguidos += 1
+            if self.abierto_desde is not None or self.fallos_seguidos < self.umbral:
+                return False
+            self.abierto_desde = time.time()
+            self.aperturas += 1
+            self.pause_event.clear()
+
+        print(f"\n{'!'*70}")
+        print(f"[Circuito] ABIERTO: {motivo or 'errores de conexion'}")
+        print(f"[Circuito] Workers en pausa; sondeando {self.url} hasta que responda")
+        print(f"{'!'*70}")
+        self.sonda = threading.Thread(target=self._sondear, name='circuito-sonda', daemon=True)
+        self.sonda.start()
+        return True
+
+    def _probar(self) -> bool:
+        """Una peticion al formulario: cualquier respuesta por debajo de 500 cuenta como servicio disponible"""
+        peticion = urllib.request.Request(self.url, headers={'User-Agent': config.HTTP_USER_AGENT})
+        try:
+            with urllib.request.urlopen(peticion, timeout=config.HTTP_TIMEOUT) as respuesta:
+                return respuesta.status < 500
+        except urllib.error.HTTPError as e:
+            return e.code < 500
+        except Exception:
+            return False
+
+    def _sondear(self):
+        espera = self.backoff_inicial
+        intento = 0
+        while not self.detenido.is_set():
+            # Jitter para no sincronizar las sondas con un reinicio del servidor
+            self.detenido.wait(espera * random.uniform(0.9, 1.1))
+            if self.detenido.is_set():
+                return
+            intento += 1
+            if self._probar():
+                self._cerrar(intento)
+                return
+            print(f"[Circuito] Sonda {intento} sin respuesta; siguiente en {min(espera * 2, self.backoff_max):.0f}s")
+            espera = min(espera * 2, self.backoff_max)
+
+    def _cerrar(self, intentos: int):
+        with self.lock:
+            abierto = time.time() - self.abierto_desde
+            self.segundos_abierto += abierto
+            self.abierto_desde = None
+            self.fallos_seguidos = 0
+            self.pause_event.set()
+        print(f"\n[Circuito] CERRADO tras {abierto:.0f}s ({intentos} sondas): reanudando workers")
+
+    def detener(self):
+        """Fin del procesamiento: corta la sonda y libera a los workers en pausa"""
+        self.detenido.set()
+        self.pause_event.set()
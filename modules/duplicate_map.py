@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+from typing import Dict, Iterable, List
+import config
+
+
+class MapaDuplicados:
+    """
+    Mapa persistente representante -> duplicados, por huella de fila (huella_registro).
+    Se guarda append-only (una linea JSON [representante, [duplicados]] por grupo
+    nuevo o ampliado) a medida que se deduplica la entrada, asi que sobrevive a una
+    interrupcion. Solo se busca y se guarda un resultado por representante; las filas
+    de los duplicados se generan recien al exportar.
+    """
+
+    def __init__(self, path: str = None, fsync: bool = None):
+        self.path = path or config.DUPLICADOS_FILE
+        self.fsync = config.JOURNAL_FSYNC if fsync is None else fsync
+        self.lock = threading.Lock()
+        self.grupos: Dict = {}  # representante -> [duplicados] (sin el representante)
+        self._file = None
+
+    def cargar(self) -> int:
+        """Lee el mapa de corridas anteriores; retorna cuantos duplicados cubre"""
+        self.grupos = {}
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    representante, duplicados = json.loads(linea)
+                except ValueError:
+                    continue  # ultima linea truncada por un corte
+                self._agregar(representante, duplicados)
+        return self.total_duplicados()
+
+    def _agregar(self, representante, miembros: Iterable) -> List:
+        """Suma miembros al grupo en memoria; retorna los que eran nuevos"""
+        grupo = self.grupos.get(representante)
+        vistos = set(grupo) if grupo else set()
+        vistos.add(representante)
+        nuevos = []
+        for miembro in miembros:
+            if miembro not in vistos:
+                vistos.add(miembro)
+                nuevos.append(miembro)
+        if nuevos:
+            self.grupos.setdefault(representante, []).extend(nuevos)
+        return nuevos
+
+    def registrar(self, mapa: Dict):
+        """
+        Registra {representante: [miembros]} con las huellas de cada grupo de la
+        deduplicacion (los grupos sin duplicados no se guardan)
+        """
+        lineas = []
+        with self.lock:
+            for representante, miembros in mapa.items():
+                nuevos = self._agregar(representante, miembros)
+                if nuevos:
+                    lineas.append(json.dumps([representante, nuevos]) + '\n')
+            if not lineas:
+                return
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(''.join(lineas))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def cubiertos(self, representantes: Iterable) -> set:
+        """Duplicados ya resueltos a traves de estos representantes (con resultado final)"""
+        cubiertos = set()
+        for representante in representantes:
+            cubiertos.update(self.grupos.get(representante, ()))
+        return cubiertos
+
+    def total_duplicados(self) -> int:
+        return sum(len(duplicados) for duplicados in self.grupos.values())
+
+    def representantes(self) -> Dict:
+        """Indice inverso para la exportacion: huella de cada duplicado -> huella de su representante"""
+        return {duplicado: representante
+                for representante, duplicados in self.grupos.items() for duplicado in duplicados}
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
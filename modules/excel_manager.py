@@ -1,15 +1,53 @@
+import numpy as np
 import pandas as pd
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Iterator
 import threading
 import config
+from modules.duplicate_map import MapaDuplicados
+from modules.input_reader import leer_encabezado, leer_por_bloques
+from modules.normalizacion import claves_deduplicacion, huella_registro, huellas_registros, limpiar_razones_sociales
+from modules.result_journal import ResultJournal
+from modules.result_store import AlmacenResultados, ResultadoCompacto
+from modules.work_queue import WorkQueue
+
+# Columna auxiliar con la huella de cada registro pendiente (no es parte de la entrada)
+COLUMNA_HUELLA = '_huella'
+
+def intentos_resultado(resultado: Dict) -> int:
+    """Corridas que ya intentaron este registro (los resultados anteriores al contador cuentan como 1)"""
+    intentos = resultado.get('intentos')
+    if intentos is None or intentos != intentos:  # ausente o NaN (resultados migrados desde Excel)
+        return 1
+    return int(intentos)
+
+def asignar_huella(resultado: Dict) -> Dict:
+    """Resultados anteriores a las huellas: se calcula a partir de los datos de entrada que guardan"""
+    if not resultado.get('huella'):
+        resultado['huella'] = huella_registro(resultado.get('razon_social_input'),
+                                              resultado.get('direccion_original'),
+                                              resultado.get('numero_original'))
+    return resultado
+
+def es_copia_antigua(resultado: Dict) -> bool:
+    """
+    Copia de un duplicado escrita antes de las huellas: guarda los datos de entrada de su
+    representante, asi que su huella calculada seria la del representante y lo pisaria
+    """
+    observacion = resultado.get('observacion')
+    return (not resultado.get('huella') and isinstance(observacion, str)
+            and '(duplicado)' in observacion)
 
 class ExcelManager:
     
-    def __init__(self, input_file: str = None, output_file: str = None):
+    def __init__(self, input_file: str = None, output_file: str = None, journal_file: str = None):
         self.input_file = input_file or config.INPUT_FILE
         self.output_file = output_file or config.OUTPUT_FILE
         self.lock = threading.Lock()
+        self.journal = ResultJournal(journal_file)
+        self.duplicados = MapaDuplicados()
+        self.intentos_previos: Dict = {}  # huella -> intentos de los fallidos que se reintentan
+        self.columns = None
         
     def load_data(self) -> pd.DataFrame:
         try:
@@ -20,21 +58,27 @@ class ExcelManager:
             print(f"ERROR cargando Excel: {e}")
             raise
     
-    def find_columns(self, df: pd.DataFrame) -> Dict[str, str]:
+    def read_header(self) -> List[str]:
+        """Columnas del archivo de entrada, sin cargar sus filas"""
+        return leer_encabezado(self.input_file)
+    
+    def find_columns(self, df) -> Dict[str, str]:
+        """Detecta las columnas a partir de un DataFrame o de la lista de nombres de columna"""
+        nombres = [str(c) for c in getattr(df, 'columns', df)]
         columns = {}
         
         columns['razon'] = next(
-            (c for c in df.columns if 'razon' in c.lower() or 'social' in c.lower()), 
+            (c for c in nombres if 'razon' in c.lower() or 'social' in c.lower()), 
             None
         )
         
         columns['direccion'] = next(
-            (c for c in df.columns if 'direccion' in c.lower()), 
+            (c for c in nombres if 'direccion' in c.lower()), 
             None
         )
         
         columns['numero'] = next(
-            (c for c in df.columns if 'numero' in c.lower()), 
+            (c for c in nombres if 'numero' in c.lower()), 
             None
         )
         
@@ -45,29 +89,107 @@ class ExcelManager:
         print(f"Columna Direccion: {columns['direccion'] or 'No encontrada'}")
         print(f"Columna Numero: {columns['numero'] or 'No encontrada'}")
         
+        self.columns = columns
         return columns
     
+    def huellas(self, df: pd.DataFrame, columns: Dict) -> pd.Series:
+        """Huella de contenido de cada fila (razon social normalizada + direccion + numero)"""
+        return huellas_registros(
+            df[columns['razon']],
+            df[columns['direccion']] if columns['direccion'] else None,
+            df[columns['numero']] if columns['numero'] else None
+        )
+    
+    def _cargar_journal(self) -> List[Dict]:
+        """Resultados del journal con huella; si una fila tiene lineas con y sin huella gana la ultima"""
+        por_huella = {}
+        for resultado in self.journal.load():
+            if es_copia_antigua(resultado):
+                continue
+            asignar_huella(resultado)
+            por_huella.pop(resultado['huella'], None)
+            por_huella[resultado['huella']] = resultado
+        return list(por_huella.values())
+    
     def load_previous_results(self) -> tuple[List[Dict], set]:
+        """
+        Retorna (resultados finales, huellas procesadas). La identidad de cada fila es su
+        huella de contenido: los resultados siguen valiendo aunque la entrada se edite,
+        se ordene o se le agreguen filas.
+        """
         resultados = []
-        procesados_indices = set()
         
-        if os.path.exists(self.output_file):
+        if self.journal.exists():
+            resultados = self._cargar_journal()
+            print(f"Recuperados {len(resultados)} registros previos desde {self.journal.path}")
+        elif os.path.exists(self.output_file):
             try:
                 df_prev = pd.read_excel(self.output_file)
-                resultados = df_prev.to_dict('records')
-                procesados_indices = set(df_prev['indice_original'])
-                print(f"Recuperados {len(resultados)} registros previos")
+                registros = df_prev.to_dict('records')
+                resultados = [asignar_huella(r) for r in registros if not es_copia_antigua(r)]
+                if len(resultados) < len(registros):
+                    print(f"Descartadas {len(registros) - len(resultados)} copias de duplicados sin huella "
+                          f"(se derivan de su representante o se vuelven a buscar una vez)")
+                # Migrar resultados del Excel al journal para no perderlos en la exportacion final
+                self.journal.append_many(resultados)
+                print(f"Recuperados {len(resultados)} registros previos desde {self.output_file}")
             except Exception as e:
                 print(f"ADVERTENCIA: No se pudo leer archivo previo: {e}")
         
-        return resultados, procesados_indices
+        # Resultados fallidos con intentos disponibles: vuelven a quedar pendientes.
+        # Sus lineas viejas siguen en el journal; la nueva escritura las reemplaza al cargar
+        reintentables = set(config.ESTADOS_REINTENTABLES)
+        finales = []
+        self.intentos_previos = {}
+        agotados = 0
+        for r in resultados:
+            if r.get('estado') not in reintentables:
+                finales.append(r)
+                continue
+            intentos = intentos_resultado(r)
+            if intentos < config.MAX_INTENTOS:
+                self.intentos_previos[r['huella']] = intentos
+            else:
+                agotados += 1
+                finales.append(r)
+        
+        if self.intentos_previos or agotados:
+            print(f"Reintentos: {len(self.intentos_previos)} registros fallidos vuelven a quedar pendientes "
+                  f"({agotados} ya agotaron sus {config.MAX_INTENTOS} intentos)")
+        
+        procesados = set(r['huella'] for r in finales)
+        
+        # Los duplicados de un representante con resultado final tambien estan resueltos,
+        # aunque la corrida anterior se haya interrumpido antes de exportarlos
+        if self.duplicados.cargar():
+            cubiertos = self.duplicados.cubiertos(procesados) - procesados
+            procesados |= cubiertos
+            print(f"Duplicados ya resueltos por su representante: {len(cubiertos)} (desde {self.duplicados.path})")
+        
+        return finales, procesados
     
-    def save_results(self, resultados: List[Dict], force: bool = False, pause_event: threading.Event = None) -> bool:
+    def export_from_journal(self, pause_event: threading.Event = None) -> bool:
+        """Genera el Excel de salida a partir del journal (bajo demanda o al final)"""
+        resultados = self._cargar_journal()
+        if not resultados:
+            print(f"No hay resultados en {self.journal.path}")
+            return False
+        self.duplicados.cargar()
+        return self.save_results(AlmacenResultados(resultados), force=True, pause_event=pause_event)
+    
+    def save_results(self, resultados, force: bool = False, pause_event: threading.Event = None) -> bool:
+        """
+        resultados: lista de dicts o AlmacenResultados. Un AlmacenResultados se exporta
+        recorriendo la entrada actual (filas_salida): una fila por registro, con sus duplicados
+        """
         with self.lock:
             intentos = 0
             while True:
                 try:
-                    df = pd.DataFrame(resultados)
+                    if isinstance(resultados, AlmacenResultados):
+                        df = resultados.a_dataframe(self.filas_salida(resultados))
+                    else:
+                        df = pd.DataFrame(resultados)
                     existing_cols = [col for col in config.OUTPUT_COLUMNS if col in df.columns]
                     df = df[existing_cols]
                     
@@ -76,7 +198,7 @@ class ExcelManager:
                         print(f"\n  Guardado exitoso despues de {intentos} intentos")
                         if pause_event:
                             pause_event.set() # Reanudar workers
-                    print(f"  Progreso guardado: {len(resultados)} registros")
+                    print(f"  Progreso guardado: {len(df)} registros")
                     return True
                     
                 except PermissionError:
@@ -103,11 +225,163 @@ class ExcelManager:
                     else:
                         return False
     
-    def get_pending_records(self, df: pd.DataFrame, procesados: set) -> pd.DataFrame:
-        pendientes = df[~df.index.isin(procesados)]
+    def filas_salida(self, resultados: AlmacenResultados) -> Iterator[ResultadoCompacto]:
+        """
+        Filas del Excel de salida en el orden de la entrada actual: cada registro toma el
+        resultado de su huella o, si es un duplicado, el de su representante. Las filas sin
+        resultado (pendientes) y los resultados de filas que ya no estan en la entrada se omiten.
+        Sin la entrada se exportan solo los resultados unicos.
+        """
+        if not os.path.exists(self.input_file):
+            print(f"ADVERTENCIA: no se encontro {self.input_file}; se exportan solo los resultados unicos")
+            yield from resultados
+            return
+        
+        columns = self.columns or self.find_columns(self.read_header())
+        columnas = [c for c in (columns['razon'], columns['direccion'], columns['numero']) if c]
+        por_huella = {r.huella: r for r in resultados}
+        representantes = self.duplicados.representantes()
+        vistas = set()
+        
+        for bloque in leer_por_bloques(self.input_file, columnas):
+            vacias = [''] * len(bloque)
+            filas = zip(
+                bloque.index.tolist(),
+                bloque[columns['razon']].tolist(),
+                bloque[columns['direccion']].tolist() if columns['direccion'] else vacias,
+                bloque[columns['numero']].tolist() if columns['numero'] else vacias,
+                self.huellas(bloque, columns).tolist()
+            )
+            for idx, razon, direccion, numero, huella in filas:
+                resultado = por_huella.get(huella)
+                duplicado = huella in vistas
+                if resultado is None:
+                    resultado = por_huella.get(representantes.get(huella))
+                    duplicado = True
+                    if resultado is None:
+                        continue
+                vistas.add(huella)
+                
+                fila = resultado.copia(indice_original=idx, huella=huella, razon_social_input=str(razon).strip(),
+                                       direccion_original=direccion, numero_original=numero)
+                if duplicado:
+                    fila.observacion = f"{resultado.observacion or ''} (duplicado)"
+                yield fila
+    
+    def _filtrar_pendientes(self, df: pd.DataFrame, columns: Dict, procesados: set,
+                            solo_huellas: set = None) -> pd.DataFrame:
+        """
+        Registros sin resultado final: diferencia de conjuntos sobre las huellas de contenido
+        (no sobre la posicion), con solo_huellas se consideran unicamente esas (p.ej. los
+        fallidos a reintentar). La huella queda en la columna COLUMNA_HUELLA.
+        """
+        huellas = self.huellas(df, columns)
+        pendiente = ~huellas.isin(procesados)
+        if solo_huellas is not None:
+            pendiente &= huellas.isin(solo_huellas)
+        return df[pendiente].assign(**{COLUMNA_HUELLA: huellas[pendiente]})
+    
+    def get_pending_records(self, df: pd.DataFrame, columns: Dict, procesados: set,
+                            solo_huellas: set = None) -> pd.DataFrame:
+        pendientes = self._filtrar_pendientes(df, columns, procesados, solo_huellas)
         print(f"Pendientes de procesar: {len(pendientes)}")
         return pendientes
     
+    @staticmethod
+    def _agrupar(codigos: np.ndarray, indices: pd.Index) -> List[List]:
+        """
+        Indices de cada grupo, para codigos 0..k-1 (p.ej. de pd.factorize).
+        Un solo argsort estable y rebanadas de lista: sin trabajo de pandas por grupo.
+        """
+        orden = np.argsort(codigos, kind='stable')
+        ordenados = np.asarray(indices)[orden].tolist()
+        limites = (np.flatnonzero(np.diff(codigos[orden])) + 1).tolist()
+        return [ordenados[a:b] for a, b in zip([0] + limites, limites + [len(ordenados)])]
+    
+    def _deduplicar_bloque(self, bloque: pd.DataFrame, col_razon: str, modo: str, estado: Dict) -> pd.DataFrame:
+        """
+        Deduplica un bloque de registros continuando el estado de los bloques anteriores.
+        estado['mapa'] queda con los grupos de este bloque, {idx_representante: [indices]}
+        (un grupo de un bloque anterior aparece solo con sus indices nuevos); el resto del
+        estado (ultima razon vista o claves ya vistas) permite procesar la entrada por partes.
+        Retorna solo los registros del bloque que son representantes nuevos.
+        Las claves se calculan por columna y los grupos con numpy: el bucle es por grupo, no por fila.
+        """
+        mapa_duplicados = estado['mapa'] = {}
+        if len(bloque) == 0:
+            return bloque
+        
+        if modo == 'consecutivo':
+            razones = bloque[col_razon].map(str).str.strip().str.upper()
+            razon_anterior, idx_representante = estado.get('anterior', (None, None))
+            # Un grupo empieza donde la razon cambia respecto de la fila anterior
+            inicio_grupo = razones.ne(razones.shift()).to_numpy(copy=True)
+            inicio_grupo[0] = razones.iloc[0] != razon_anterior
+            grupos = self._agrupar(np.cumsum(inicio_grupo) - inicio_grupo[0], bloque.index)
+            
+            if not inicio_grupo[0]:
+                # Continuacion del ultimo grupo del bloque anterior
+                mapa_duplicados[idx_representante] = grupos.pop(0)
+            for miembros in grupos:
+                mapa_duplicados[miembros[0]] = miembros
+            
+            if grupos:
+                idx_representante = grupos[-1][0]
+            estado['anterior'] = (razones.iloc[-1], idx_representante)
+            nuevos = np.flatnonzero(inicio_grupo)
+        else:
+            # El representante de cada grupo es su primera aparicion
+            representantes = estado.setdefault('claves', {})
+            codigos, claves = pd.factorize(claves_deduplicacion(bloque[col_razon]))
+            
+            nuevos = []
+            for clave, miembros in zip(claves, self._agrupar(codigos, bloque.index)):
+                idx_representante = representantes.get(clave)
+                if idx_representante is None:
+                    representantes[clave] = miembros[0]
+                    mapa_duplicados[miembros[0]] = miembros
+                    nuevos.append(miembros[0])
+                else:
+                    mapa_duplicados.setdefault(idx_representante, []).extend(miembros)
+            # factorize numera las claves por orden de aparicion: los nuevos ya estan en orden
+            return bloque.loc[nuevos]
+        
+        return bloque.iloc[nuevos]
+    
+    def to_work_items(self, registros: pd.DataFrame, columns: Dict) -> List[tuple]:
+        """
+        Registros como tuplas livianas para los workers:
+        (idx, (razon, direccion, numero, huella, razon_limpia)); razon_limpia es la clave del cache.
+        Se extraen por columna, sin crear una Series por fila.
+        """
+        vacias = [''] * len(registros)
+        razones = registros[columns['razon']].tolist()
+        limpias = limpiar_razones_sociales(registros[columns['razon']]).tolist()
+        direcciones = registros[columns['direccion']].tolist() if columns['direccion'] else vacias
+        numeros = registros[columns['numero']].tolist() if columns['numero'] else vacias
+        if COLUMNA_HUELLA in registros:
+            huellas = registros[COLUMNA_HUELLA].tolist()
+        else:
+            huellas = self.huellas(registros, columns).tolist()
+        return list(zip(registros.index.tolist(), zip(razones, direcciones, numeros, huellas, limpias)))
+    
+    def registrar_duplicados(self, mapa_duplicados: Dict, registros: pd.DataFrame, huellas_representantes: Dict = None):
+        """
+        Persiste los grupos {idx_representante: [indices]} de la deduplicacion como huellas.
+        huellas_representantes (idx -> huella) resuelve los representantes de bloques anteriores
+        al deduplicar por bloques, y se actualiza con los de este bloque.
+        """
+        huellas = registros[COLUMNA_HUELLA]
+        representantes = {} if huellas_representantes is None else huellas_representantes
+        grupos = {}
+        for rep, indices in mapa_duplicados.items():
+            huella_rep = representantes.get(rep)
+            if huella_rep is None:
+                huella_rep = representantes[rep] = huellas.at[rep]
+            if len(indices) > 1 or indices[0] != rep:
+                grupos[huella_rep] = huellas.loc[indices].tolist()
+        self.duplicados.registrar(grupos)
+    
     def deduplicate_consecutive(self, pendientes: pd.DataFrame, col_razon: str) -> tuple:
         """
         Detecta y agrupa razones sociales consecutivas duplicadas.
@@ -115,23 +389,9 @@ class ExcelManager:
         - df_unicos: DataFrame con solo registros unicos
         - mapa_duplicados: {idx_unico: [idx1, idx2, ...]} indices duplicados
         """
-        indices_unicos = []
-        mapa_duplicados = {}
-        razon_anterior = None
-        idx_representante = None
-        
-        for idx, row in pendientes.iterrows():
-            razon_actual = str(row[col_razon]).strip().upper()
-            
-            if razon_actual != razon_anterior:
-                indices_unicos.append(idx)
-                idx_representante = idx
-                mapa_duplicados[idx_representante] = [idx]
-                razon_anterior = razon_actual
-            else:
-                mapa_duplicados[idx_representante].append(idx)
-        
-        df_unicos = pendientes.loc[indices_unicos]
+        estado = {}
+        df_unicos = self._deduplicar_bloque(pendientes, col_razon, 'consecutivo', estado)
+        mapa_duplicados = estado['mapa']
         
         total_duplicados = sum(len(v) - 1 for v in mapa_duplicados.values())
         print(f"Deduplicacion: {len(pendientes)} registros -> {len(df_unicos)} unicos")
@@ -144,14 +404,75 @@ class ExcelManager:
         
         return df_unicos, mapa_duplicados
     
-    def distribute_work(self, pendientes: pd.DataFrame, num_workers: int) -> Dict[int, List[tuple]]:
-        work_distribution = {i: [] for i in range(num_workers)}
+    def deduplicate_global(self, pendientes: pd.DataFrame, col_razon: str) -> tuple:
+        """
+        Agrupa razones sociales duplicadas en cualquier posicion del archivo.
+        Usa la misma normalizacion que limpiar_razon_social como clave.
+        Retorna: (df_unicos, mapa_duplicados) con el mismo formato que deduplicate_consecutive
+        """
+        estado = {}
+        df_unicos = self._deduplicar_bloque(pendientes, col_razon, 'global', estado)
+        mapa_duplicados = estado['mapa']
+        
+        total_duplicados = len(pendientes) - len(df_unicos)
+        print(f"Deduplicacion global: {len(pendientes)} registros -> {len(df_unicos)} unicos")
+        print(f"Se evitaran {total_duplicados} busquedas duplicadas")
         
-        for i, (idx, row) in enumerate(pendientes.iterrows()):
-            worker_id = i % num_workers
-            work_distribution[worker_id].append((idx, row))
+        grupos = sorted(mapa_duplicados.items(), key=lambda item: len(item[1]), reverse=True)
+        for idx_rep, indices in grupos[:20]:
+            if len(indices) < 2:
+                break
+            razon = str(pendientes.loc[idx_rep, col_razon]).strip()
+            print(f"  '{razon}': {len(indices)} apariciones")
         
-        for worker_id, items in work_distribution.items():
-            print(f"  Worker {worker_id}: {len(items)} registros")
+        return df_unicos, mapa_duplicados
+    
+    def deduplicate(self, pendientes: pd.DataFrame, col_razon: str, modo: str = None) -> tuple:
+        modo = (modo or config.DEDUP_MODE).lower()
+        if modo == 'consecutivo':
+            return self.deduplicate_consecutive(pendientes, col_razon)
+        return self.deduplicate_global(pendientes, col_razon)
+    
+    def create_work_queue(self, pendientes: pd.DataFrame, columns: Dict) -> WorkQueue:
+        """Cola compartida de la que cada worker toma el siguiente registro libre"""
+        work_queue = WorkQueue(self.to_work_items(pendientes, columns))
+        print(f"  Cola compartida: {work_queue.total} registros")
+        return work_queue
+    
+    def stream_pending(self, columns: Dict, procesados: set, modo: str = None, tamano: int = None,
+                       solo_huellas: set = None) -> Iterator[List[tuple]]:
+        """
+        Lectura incremental de la entrada: filtra los ya procesados (por huella) y deduplica
+        bloque a bloque (con solo_huellas se consideran unicamente esos registros).
+        Retorna un generador de listas (idx, (razon, direccion, numero, huella)) con los registros
+        unicos pendientes de cada bloque; los grupos de duplicados de cada bloque se
+        registran en self.duplicados antes de entregarlo.
+        Solo se leen las columnas de razon social, direccion y numero.
+        """
+        modo = (modo or config.DEDUP_MODE).lower()
+        columnas = [c for c in (columns['razon'], columns['direccion'], columns['numero']) if c]
+        estado = {}
+        huellas_representantes = {}
+        
+        def bloques() -> Iterator[List[tuple]]:
+            leidos = pendientes_total = unicos = 0
+            for bloque in leer_por_bloques(self.input_file, columnas, tamano):
+                leidos += len(bloque)
+                pendientes = self._filtrar_pendientes(bloque, columns, procesados, solo_huellas)
+                pendientes_total += len(pendientes)
+                df_unicos = self._deduplicar_bloque(pendientes, columns['razon'], modo, estado)
+                self.registrar_duplicados(estado['mapa'], pendientes, huellas_representantes)
+                if modo == 'consecutivo' and huellas_representantes:
+                    # Solo el ultimo grupo puede continuar en el bloque siguiente
+                    idx_rep = estado['anterior'][1]
+                    huella_rep = huellas_representantes.get(idx_rep)
+                    huellas_representantes.clear()
+                    if huella_rep is not None:
+                        huellas_representantes[idx_rep] = huella_rep
+                unicos += len(df_unicos)
+                yield self.to_work_items(df_unicos, columns)
+            
+            print(f"\nEntrada leida: {leidos} registros, {pendientes_total} pendientes, "
+                  f"{unicos} unicos (deduplicacion {modo})")
         
-        return work_distribution
+        return bloques()
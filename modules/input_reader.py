@@ -0,0 +1,104 @@
+import os
+from typing import Iterator, List
+import pandas as pd
+from openpyxl import load_workbook
+import config
+
+try:
+    import pyarrow.parquet as pq  # opcional: solo para entradas .parquet
+except ImportError:
+    pq = None
+
+EXTENSIONES_EXCEL = ('.xlsx', '.xlsm')
+NAN = float('nan')
+
+
+def _extension(path: str) -> str:
+    return os.path.splitext(path)[1].lower()
+
+
+def _parquet(path: str):
+    if pq is None:
+        raise ImportError("Para leer archivos .parquet instala pyarrow (pip install pyarrow)")
+    return pq.ParquetFile(path)
+
+
+def leer_encabezado(path: str) -> List[str]:
+    """Nombres de columna de la entrada sin cargar sus filas"""
+    extension = _extension(path)
+    if extension in EXTENSIONES_EXCEL:
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            encabezado = next(wb.active.iter_rows(max_row=1, values_only=True), ())
+        finally:
+            wb.close()
+        return [str(c) if c is not None else f'Unnamed: {i}' for i, c in enumerate(encabezado)]
+    if extension == '.csv':
+        return list(pd.read_csv(path, nrows=0, sep=config.INPUT_CSV_SEP, encoding=config.INPUT_CSV_ENCODING).columns)
+    if extension == '.parquet':
+        return list(_parquet(path).schema_arrow.names)
+    return list(pd.read_excel(path, nrows=0).columns)
+
+
+def _bloques_excel(path: str, columnas: List[str], tamano: int) -> Iterator[pd.DataFrame]:
+    """openpyxl en modo read-only: las filas se leen del xml a medida que se piden"""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        filas = wb.active.iter_rows(values_only=True)
+        encabezado = [str(c) if c is not None else f'Unnamed: {i}' for i, c in enumerate(next(filas, ()))]
+        posiciones = [encabezado.index(c) for c in columnas]
+
+        bloque = []
+        vacias = 0  # filas vacias pendientes: se descartan si estan al final de la hoja (como pandas)
+        inicio = 0
+        for fila in filas:
+            valores = tuple(fila[p] if p < len(fila) and fila[p] is not None else NAN for p in posiciones)
+            if not any(v is not None for v in fila):
+                vacias += 1
+                continue
+            if vacias:
+                bloque.extend([(NAN,) * len(columnas)] * vacias)
+                vacias = 0
+            bloque.append(valores)
+
+            if len(bloque) >= tamano:
+                yield pd.DataFrame(bloque, columns=columnas, index=pd.RangeIndex(inicio, inicio + len(bloque)))
+                inicio += len(bloque)
+                bloque = []
+
+        if bloque:
+            yield pd.DataFrame(bloque, columns=columnas, index=pd.RangeIndex(inicio, inicio + len(bloque)))
+    finally:
+        wb.close()
+
+
+def _bloques_parquet(path: str, columnas: List[str], tamano: int) -> Iterator[pd.DataFrame]:
+    inicio = 0
+    for lote in _parquet(path).iter_batches(batch_size=tamano, columns=columnas):
+        bloque = lote.to_pandas()
+        bloque.index = pd.RangeIndex(inicio, inicio + len(bloque))
+        inicio += len(bloque)
+        yield bloque
+
+
+def leer_por_bloques(path: str, columnas: List[str], tamano: int = None) -> Iterator[pd.DataFrame]:
+    """
+    Lee solo las columnas indicadas de la entrada (xlsx, csv o parquet) en bloques de
+    `tamano` filas. El indice de cada bloque es la posicion de la fila en el archivo,
+    igual que el de pd.read_excel, para que indice_original no cambie.
+    """
+    tamano = tamano or config.INPUT_CHUNK_SIZE
+    extension = _extension(path)
+
+    if extension in EXTENSIONES_EXCEL:
+        yield from _bloques_excel(path, columnas, tamano)
+    elif extension == '.csv':
+        yield from pd.read_csv(path, usecols=columnas, chunksize=tamano,
+                               sep=config.INPUT_CSV_SEP, encoding=config.INPUT_CSV_ENCODING)
+    elif extension == '.parquet':
+        yield from _bloques_parquet(path, columnas, tamano)
+    else:
+        # Formatos sin lectura incremental (p.ej. .xls): se cargan completos y se entregan por bloques
+        df = pd.read_excel(path, usecols=columnas)
+        for inicio in range(0, len(df), tamano):
+            yield df.iloc[inicio:inicio + tamano]
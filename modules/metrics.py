@@ -0,0 +1,185 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque, Counter
+from typing import Dict, List
+import config
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango mas cercano (valores ya ordenados); 0 si no hay valores"""
+    if not valores:
+        return 0.0
+    posicion = max(0, math.ceil(p / 100 * len(valores)) - 1)
+    return valores[posicion]
+
+
+def formatear_duracion(segundos: float) -> str:
+    if segundos is None:
+        return '--'
+    segundos = int(segundos)
+    horas, resto = divmod(segundos, 3600)
+    minutos, segundos = divmod(resto, 60)
+    if horas:
+        return f"{horas}h{minutos:02d}m"
+    return f"{minutos}m{segundos:02d}s"
+
+
+class MetricasBusqueda:
+    """
+    Metricas de las busquedas, compartidas por todos los workers:
+    - latencia total y por fase (p50/p95/p99) sobre las ultimas METRICS_VENTANA busquedas
+    - busquedas por minuto (ultimos METRICS_VENTANA_TASA segundos) y ETA
+    - conteo por estado y por worker, y recargas completas del formulario (SUNAT_URL)
+    Se exportan periodicamente a METRICS_FILE en JSON o en texto de Prometheus (.prom).
+    """
+
+    def __init__(self, ventana: int = None, ventana_tasa: float = None):
+        self.lock = threading.Lock()
+        self.ventana = ventana or config.METRICS_VENTANA
+        self.ventana_tasa = ventana_tasa or config.METRICS_VENTANA_TASA
+        self.inicio = time.time()
+        self.latencias = deque(maxlen=self.ventana)
+        self.fases: Dict[str, deque] = {}
+        self.terminadas = deque()  # instantes de cada registro completado (para la tasa)
+        self.por_estado = Counter()
+        self.por_worker: Dict = {}
+        self.busquedas = 0
+        self.desde_cache = 0
+        self.recargas_completas = 0
+
+    def registrar(self, worker_id, duracion: float, tiempos_fases: Dict[str, float], estado: str,
+                  recargas: int = 0):
+        """
+        Una busqueda real terminada (duracion de punta a punta y segundos por fase);
+        recargas: recargas completas del formulario desde la busqueda anterior del worker
+        """
+        ahora = time.time()
+        with self.lock:
+            self.busquedas += 1
+            self.recargas_completas += recargas
+            self.por_estado[estado] += 1
+            self.latencias.append(duracion)
+            for fase, segundos in tiempos_fases.items():
+                if fase not in self.fases:
+                    self.fases[fase] = deque(maxlen=self.ventana)
+                self.fases[fase].append(segundos)
+
+            worker = self.por_worker.setdefault(worker_id, {'busquedas': 0, 'segundos': 0.0})
+            worker['busquedas'] += 1
+            worker['segundos'] += duracion
+            self._terminada(ahora)
+
+    def registrar_cache(self, estado: str):
+        """Un registro resuelto desde el cache (cuenta para la tasa y la ETA, no para la latencia)"""
+        with self.lock:
+            self.desde_cache += 1
+            self.por_estado[estado] += 1
+            self._terminada(time.time())
+
+    def _terminada(self, ahora: float):
+        self.terminadas.append(ahora)
+        limite = ahora - self.ventana_tasa
+        while self.terminadas and self.terminadas[0] < limite:
+            self.terminadas.popleft()
+
+    def _por_minuto(self, ahora: float) -> float:
+        limite = ahora - self.ventana_tasa
+        while self.terminadas and self.terminadas[0] < limite:
+            self.terminadas.popleft()
+        # Al arrancar la ventana es el tiempo transcurrido (minimo 1s para no disparar la tasa)
+        transcurrido = max(1.0, min(self.ventana_tasa, ahora - self.inicio))
+        return len(self.terminadas) / transcurrido * 60
+
+    def resumen(self, pendientes: int = None) -> Dict:
+        ahora = time.time()
+        with self.lock:
+            latencias = sorted(self.latencias)
+            fases = {fase: sorted(valores) for fase, valores in self.fases.items()}
+            por_minuto = self._por_minuto(ahora)
+            resumen = {
+                'timestamp': ahora,
+                'transcurrido_s': round(ahora - self.inicio, 1),
+                'busquedas': self.busquedas,
+                'desde_cache': self.desde_cache,
+                'recargas_completas': self.recargas_completas,
+                'por_minuto': round(por_minuto, 2),
+                'por_estado': dict(self.por_estado),
+                'latencia_s': {f'p{p}': round(percentil(latencias, p), 3) for p in PERCENTILES},
+                'fases_s': {
+                    fase: {f'p{p}': round(percentil(valores, p), 3) for p in PERCENTILES}
+                    for fase, valores in fases.items()
+                },
+                'workers': {
+                    str(worker_id): {
+                        'busquedas': datos['busquedas'],
+                        'latencia_media_s': round(datos['segundos'] / datos['busquedas'], 3)
+                    }
+                    for worker_id, datos in self.por_worker.items()
+                },
+            }
+
+        resumen['pendientes'] = pendientes
+        resumen['eta_s'] = round(pendientes / por_minuto * 60) if pendientes is not None and por_minuto > 0 else None
+        return resumen
+
+    def linea_monitor(self, pendientes: int = None) -> str:
+        r = self.resumen(pendientes)
+        latencia = r['latencia_s']
+        linea = (f"{r['por_minuto']:.1f} registros/min | latencia p50 {latencia['p50']:.2f}s "
+                 f"p95 {latencia['p95']:.2f}s p99 {latencia['p99']:.2f}s")
+        if r['recargas_completas']:
+            linea += f" | recargas {r['recargas_completas']}"
+        if pendientes is not None:
+            linea += f" | pendientes {pendientes} | ETA {formatear_duracion(r['eta_s'])}"
+        return linea
+
+    def _texto_prometheus(self, r: Dict) -> str:
+        lineas = [
+            '# TYPE sunat_busquedas_total counter',
+            f"sunat_busquedas_total {r['busquedas']}",
+            '# TYPE sunat_cache_total counter',
+            f"sunat_cache_total {r['desde_cache']}",
+            '# TYPE sunat_recargas_completas_total counter',
+            f"sunat_recargas_completas_total {r['recargas_completas']}",
+            '# TYPE sunat_registros_total counter',
+        ]
+        lineas += [f'sunat_registros_total{{estado="{estado}"}} {n}' for estado, n in r['por_estado'].items()]
+        lineas += ['# TYPE sunat_registros_por_minuto gauge', f"sunat_registros_por_minuto {r['por_minuto']}"]
+        if r['pendientes'] is not None:
+            lineas += ['# TYPE sunat_pendientes gauge', f"sunat_pendientes {r['pendientes']}"]
+        if r['eta_s'] is not None:
+            lineas += ['# TYPE sunat_eta_segundos gauge', f"sunat_eta_segundos {r['eta_s']}"]
+
+        lineas.append('# TYPE sunat_busqueda_segundos summary')
+        lineas += [f'sunat_busqueda_segundos{{quantile="{p / 100}"}} {r["latencia_s"][f"p{p}"]}' for p in PERCENTILES]
+        lineas.append('# TYPE sunat_fase_segundos summary')
+        for fase, valores in r['fases_s'].items():
+            lineas += [f'sunat_fase_segundos{{fase="{fase}",quantile="{p / 100}"}} {valores[f"p{p}"]}' for p in PERCENTILES]
+        lineas.append('# TYPE sunat_worker_busquedas_total counter')
+        lineas += [f'sunat_worker_busquedas_total{{worker="{w}"}} {d["busquedas"]}' for w, d in r['workers'].items()]
+        return '\n'.join(lineas) + '\n'
+
+    def exportar(self, path: str = None, pendientes: int = None):
+        """Escribe las metricas (JSON, o formato de Prometheus si el archivo termina en .prom)"""
+        path = config.METRICS_FILE if path is None else path
+        if not path:
+            return
+        r = self.resumen(pendientes)
+        if path.endswith('.prom'):
+            contenido = self._texto_prometheus(r)
+        else:
+            contenido = json.dumps(r, ensure_ascii=False, indent=2)
+
+        # Reemplazo atomico: quien lea el archivo nunca ve una escritura a medias
+        temporal = path + '.tmp'
+        try:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                f.write(contenido)
+            os.replace(temporal, path)
+        except OSError as e:
+            print(f"[Metricas] No se pudo escribir {path}: {e}")
@@ -0,0 +1,289 @@
+import argparse
+import hashlib
+import html
+import random
+import socket
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, quote, urlsplit
+from modules.normalizacion import validar_ruc
+
+RUTA = '/cl-ti-itmrconsruc/jcrS00Alias'
+ESTADOS = ('ACTIVO', 'ACTIVO', 'ACTIVO', 'BAJA DE OFICIO', 'SUSPENSION TEMPORAL')
+UBICACIONES = ('LIMA - LIMA - MIRAFLORES', 'AREQUIPA - AREQUIPA - CAYMA', 'LA LIBERTAD - TRUJILLO - TRUJILLO')
+SUFIJOS = ('S.A.C.', 'E.I.R.L.', 'S.A.', 'S.R.L.')
+
+# Formulario con la misma estructura que jcrS00Alias: pestana "Por Nombre/Razon Social",
+# txtNombreRazonSocial + search3, btnAceptar y CAPTCHA opcional (txtCodigo)
+PAGINA_FORMULARIO = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Consulta RUC</title></head>
+<body>
+<form id="form01" name="form01" method="post" action="{ruta}">
+  <input type="hidden" name="accion" value="consPorRazonSoc">
+  <input type="hidden" name="contexto" value="ti-it">
+  <input type="hidden" name="modo" value="1">
+  <input type="hidden" name="rbtnTipo" value="3">
+  <input type="hidden" name="razSoc" id="razSoc" value="">
+  <input type="hidden" name="token" id="token" value="">
+  <button type="button" id="btnPorRuc">Por RUC</button>
+  <button type="button" id="btnPorRazonSocial"
+          onclick="document.getElementById('divRazonSocial').style.display='block'">Por Nombre/Raz&oacute;n Social</button>
+  <div id="divRazonSocial" style="display:none">
+    <input type="text" id="txtNombreRazonSocial" name="search3" maxlength="150">
+  </div>
+  <div id="divCaptcha" style="display:{captcha}">
+    <img id="imgCodigo" src="{ruta}?accion=captcha" alt="codigo">
+    <input type="text" id="txtCodigo" name="codigo" maxlength="4">
+  </div>
+  <button type="button" id="btnAceptar" onclick="enviar()">Buscar</button>
+</form>
+<script>
+function enviar() {{
+  var razon = document.getElementById('txtNombreRazonSocial').value.trim();
+  if (razon.length < 4) {{ alert('Ingrese al menos 4 caracteres de la razon social'); return; }}
+  document.getElementById('razSoc').value = razon;
+  var token = '';
+  while (token.length < 52) {{ token += Math.random().toString(36).slice(2); }}
+  document.getElementById('token').value = token.slice(0, 52);
+  document.getElementById('form01').submit();
+}}
+</script>
+</body></html>"""
+
+PAGINA_RESULTADOS = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Consulta RUC - Resultados</title></head>
+<body><div class="panel panel-primary"><div class="panel-heading">Relaci&oacute;n de contribuyentes</div>
+{contenido}
+</div></body></html>"""
+
+ITEM_RESULTADO = """<a class="aRucs list-group-item clearfix" data-ruc="{ruc}">
+  <h4 class="list-group-item-heading">RUC: {ruc}</h4>
+  <h4 class="list-group-item-heading">{razon}</h4>
+  <p class="list-group-item-text">Ubicaci&oacute;n: {ubicacion}</p>
+  <p class="list-group-item-text">Estado: <strong>{estado}</strong></p>
+</a>"""
+
+SIN_RESULTADOS = '<div class="alert alert-warning">No se encontr&oacute; ning&uacute;n contribuyente con ese nombre.</div>'
+
+
+def _ruc_valido(prefijo: str, semilla: int) -> str:
+    """RUC de 11 digitos con digito verificador correcto a partir de una semilla"""
+    base = f"{prefijo}{semilla % 10 ** 8:08d}"
+    return next(base + str(d) for d in range(10) if validar_ruc(base + str(d)))
+
+
+def contribuyentes(consulta: str) -> List[Dict]:
+    """
+    Resultados deterministas para una consulta: el primero coincide con la razon
+    buscada y el resto son homonimos parciales. Las consultas con la palabra
+    INEXISTENTE no tienen resultados.
+    """
+    consulta = ' '.join(consulta.upper().split())
+    palabras = consulta.split()
+    if not palabras or 'INEXISTENTE' in palabras:
+        return []
+
+    semilla = int(hashlib.md5(consulta.encode('utf-8')).hexdigest(), 16)
+    filas = [{
+        'ruc': _ruc_valido('20', semilla),
+        'razon': f"{consulta} {SUFIJOS[semilla % len(SUFIJOS)]}",
+        'ubicacion': UBICACIONES[semilla % len(UBICACIONES)],
+        'estado': ESTADOS[semilla % len(ESTADOS)],
+    }]
+    for i in range(semilla % 3):
+        semilla //= 97
+        filas.append({
+            'ruc': _ruc_valido('10' if i % 2 else '20', semilla),
+            'razon': f"{palabras[0]} {('GRUPO', 'INVERSIONES', 'SERVICIOS')[i]} {SUFIJOS[i]}",
+            'ubicacion': UBICACIONES[semilla % len(UBICACIONES)],
+            'estado': ESTADOS[semilla % len(ESTADOS)],
+        })
+    return filas
+
+
+class _ManejadorSunat(BaseHTTPRequestHandler):
+    server_version = 'MockSUNAT/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        if self.server.opciones['verbose']:
+            super().log_message(formato, *args)
+
+    def _responder(self, cuerpo: str, estado: int = 200):
+        datos = cuerpo.encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _simular_servidor(self) -> bool:
+        """Latencia y fallos inyectados; retorna False si la respuesta ya fue enviada (o cortada)"""
+        opciones = self.server.opciones
+        with self.server.capacidad:
+            demora = opciones['latencia'] + random.uniform(0, opciones['jitter'])
+            if demora > 0:
+                time.sleep(demora)
+
+        sorteo = random.random()
+        if sorteo < opciones['tasa_corte']:
+            # Conexion cerrada sin respuesta (como un reset del balanceador)
+            self.close_connection = True
+            self.connection.close()
+            return False
+        if sorteo < opciones['tasa_corte'] + opciones['tasa_error']:
+            self._responder('<html><body><h1>Error interno del servidor</h1></body></html>', 500)
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if not url.path.startswith(RUTA):
+            self._responder('<html><body>No encontrado</body></html>', 404)
+            return
+
+        parametros = parse_qs(url.query)
+        if 'frame' in parametros:
+            self._responder(PAGINA_RESULTADOS.format(contenido=self._contenido(parametros['frame'][0])))
+            return
+        if parametros.get('accion') == ['captcha']:
+            self._responder('')
+            return
+
+        captcha = 'block' if self.server.opciones['captcha'] else 'none'
+        self._responder(PAGINA_FORMULARIO.format(ruta=RUTA, captcha=captcha))
+
+    def do_POST(self):
+        largo = int(self.headers.get('Content-Length') or 0)
+        datos = parse_qs(self.rfile.read(largo).decode('utf-8'), keep_blank_values=True)
+        consulta = (datos.get('search3') or datos.get('razSoc') or [''])[0]
+
+        with self.server.lock:
+            self.server.consultas += 1
+
+        if not self._simular_servidor():
+            return
+
+        opciones = self.server.opciones
+        if random.random() < opciones['tasa_alert']:
+            # SUNAT responde a veces con un alert y la pagina vacia
+            self._responder(PAGINA_RESULTADOS.format(
+                contenido="<script>alert('Servicio temporalmente no disponible, intente nuevamente');</script>"))
+            return
+
+        if opciones['iframe']:
+            contenido = f'<iframe id="ifrResultados" src="{RUTA}?frame={quote(consulta)}"></iframe>'
+        else:
+            contenido = self._contenido(consulta)
+        self._responder(PAGINA_RESULTADOS.format(contenido=contenido))
+
+    def _contenido(self, consulta: str) -> str:
+        filas = contribuyentes(consulta)
+        if not filas:
+            return SIN_RESULTADOS
+        items = ''.join(ITEM_RESULTADO.format(**{k: html.escape(v) for k, v in fila.items()}) for fila in filas)
+        return f'<div class="list-group">{items}</div>'
+
+
+class ServidorSunatSimulado(ThreadingHTTPServer):
+    """
+    Servidor local que imita el flujo de busqueda por razon social de jcrS00Alias,
+    para medir el scraper sin consultar SUNAT:
+    - GET: formulario (pestana btnPorRazonSocial, txtNombreRazonSocial/search3, btnAceptar, txtCodigo opcional)
+    - POST: lista de resultados (a.aRucs), mensaje de sin resultados, alert o resultados dentro de un iframe
+    - latencia configurable (fija + jitter) y capacidad maxima de peticiones atendidas a la vez
+    - inyeccion de errores HTTP 500, conexiones cortadas y alerts
+    """
+
+    daemon_threads = True
+
+    def __init__(self, puerto: int = 0, host: str = '127.0.0.1', latencia: float = 0.3, jitter: float = 0.2,
+                 capacidad: int = 0, tasa_error: float = 0.0, tasa_corte: float = 0.0, tasa_alert: float = 0.0,
+                 captcha: bool = False, iframe: bool = False, verbose: bool = False):
+        super().__init__((host, puerto), _ManejadorSunat)
+        self.opciones = {
+            'latencia': latencia, 'jitter': jitter, 'tasa_error': tasa_error, 'tasa_corte': tasa_corte,
+            'tasa_alert': tasa_alert, 'captcha': captcha, 'iframe': iframe, 'verbose': verbose,
+        }
+        # Sin capacidad (0) cada peticion se atiende de inmediato; con capacidad las demas esperan turno
+        self.capacidad = threading.BoundedSemaphore(capacidad) if capacidad > 0 else nullcontext()
+        self.lock = threading.Lock()
+        self.consultas = 0
+        self.conexiones = set()  # conexiones keep-alive abiertas (se cortan al detener)
+        self.hilo = None
+
+    def get_request(self):
+        conexion, direccion = super().get_request()
+        with self.lock:
+            self.conexiones.add(conexion)
+        return conexion, direccion
+
+    def handle_error(self, request, client_address):
+        # Clientes que cortan la conexion (o el propio detener) no son errores del servidor
+        if not self.opciones['verbose']:
+            return
+        super().handle_error(request, client_address)
+
+    def shutdown_request(self, request):
+        with self.lock:
+            self.conexiones.discard(request)
+        super().shutdown_request(request)
+
+    @property
+    def url(self) -> str:
+        host, puerto = self.server_address[:2]
+        return f"http://{host}:{puerto}{RUTA}"
+
+    def iniciar(self) -> str:
+        """Atiende peticiones en un hilo de fondo; retorna la URL a usar como SUNAT_URL"""
+        self.hilo = threading.Thread(target=self.serve_forever, name='mock-sunat', daemon=True)
+        self.hilo.start()
+        return self.url
+
+    def detener(self):
+        """Deja de aceptar conexiones y corta las keep-alive abiertas (simula una caida)"""
+        self.shutdown()
+        with self.lock:
+            for conexion in self.conexiones:
+                try:
+                    conexion.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que simula la consulta RUC de SUNAT")
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--latencia', type=float, default=0.3, help="Segundos fijos por busqueda (default: 0.3)")
+    parser.add_argument('--jitter', type=float, default=0.2, help="Segundos aleatorios extra por busqueda (default: 0.2)")
+    parser.add_argument('--capacidad', type=int, default=0, help="Busquedas atendidas a la vez, 0 = sin limite")
+    parser.add_argument('--tasa-error', type=float, default=0.0, help="Fraccion de respuestas HTTP 500")
+    parser.add_argument('--tasa-corte', type=float, default=0.0, help="Fraccion de conexiones cerradas sin respuesta")
+    parser.add_argument('--tasa-alert', type=float, default=0.0, help="Fraccion de respuestas con alert")
+    parser.add_argument('--captcha', action='store_true', help="Mostrar el campo txtCodigo en el formulario")
+    parser.add_argument('--iframe', action='store_true', help="Entregar los resultados dentro de un iframe")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    servidor = ServidorSunatSimulado(
+        puerto=args.puerto, latencia=args.latencia, jitter=args.jitter, capacidad=args.capacidad,
+        tasa_error=args.tasa_error, tasa_corte=args.tasa_corte, tasa_alert=args.tasa_alert,
+        captcha=args.captcha, iframe=args.iframe, verbose=args.verbose
+    )
+    print(f"SUNAT simulado en {servidor.url}")
+    print(f"Usa SUNAT_URL={servidor.url}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        print(f"Consultas atendidas: {servidor.consultas}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import hashlib
+import re
+import numpy as np
+import pandas as pd
+import config
+
+PATRON_NO_ALFANUMERICO = re.compile(r'[^A-Z0-9\s]')
+# Un solo regex para todos los sufijos en lugar de recorrer la lista (se elimina uno solo, al final)
+PATRON_SUFIJOS = re.compile('(?:' + '|'.join(re.escape(s) for s in config.SUFIJOS_EMPRESAS) + r')\Z')
+
+
+def limpiar_razon_social(texto: str) -> str:
+    texto = PATRON_NO_ALFANUMERICO.sub('', texto.upper())
+    texto = ' '.join(texto.split())
+    texto = PATRON_SUFIJOS.sub('', texto, count=1)
+    return texto.strip()
+
+
+def clave_deduplicacion(razon) -> str:
+    """Clave para agrupar razones sociales equivalentes ("ACME S.A.C." == "ACME SAC")"""
+    razon = str(razon).strip()
+    return limpiar_razon_social(razon) or razon.upper()
+
+
+def _por_valor_distinto(razones: pd.Series, funcion) -> pd.Series:
+    """Aplica la funcion una sola vez por valor distinto de la columna y replica el resultado"""
+    codigos, distintos = pd.factorize(razones.map(str))
+    valores = np.array([funcion(valor) for valor in distintos], dtype=object)
+    return pd.Series(valores[codigos], index=razones.index)
+
+
+def limpiar_razones_sociales(razones: pd.Series) -> pd.Series:
+    """limpiar_razon_social para una columna completa"""
+    return _por_valor_distinto(razones, limpiar_razon_social)
+
+
+def claves_deduplicacion(razones: pd.Series) -> pd.Series:
+    """clave_deduplicacion para una columna completa"""
+    return _por_valor_distinto(razones, clave_deduplicacion)
+
+
+def _texto_huella(valor) -> str:
+    if valor is None or valor != valor:  # None o NaN (celda vacia)
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # 123.0 (columna con vacios leida como float) == 123
+    return ' '.join(str(valor).upper().split())
+
+
+def _digerir(clave: str, direccion, numero) -> str:
+    texto = '\x1f'.join((clave, _texto_huella(direccion), _texto_huella(numero)))
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def huella_registro(razon, direccion, numero) -> str:
+    """
+    Identidad de una fila de la entrada por su contenido, no por su posicion:
+    hash de la razon social normalizada (misma clave que la deduplicacion),
+    la direccion y el numero. No cambia si se insertan, ordenan o borran filas.
+    """
+    return _digerir(clave_deduplicacion(razon), direccion, numero)
+
+
+def huellas_registros(razones: pd.Series, direcciones=None, numeros=None) -> pd.Series:
+    """huella_registro para columnas completas (la clave de la razon se calcula una vez por valor distinto)"""
+    claves = claves_deduplicacion(razones)
+    vacias = [''] * len(razones)
+    direcciones = vacias if direcciones is None else direcciones.tolist()
+    numeros = vacias if numeros is None else numeros.tolist()
+    return pd.Series(
+        [_digerir(c, d, n) for c, d, n in zip(claves.tolist(), direcciones, numeros)],
+        index=razones.index, dtype=object
+    )
+
+
+PESOS_RUC = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+
+
+def validar_ruc(ruc: str) -> bool:
+    """Valida el digito verificador del RUC (modulo 11)"""
+    if not ruc or len(ruc) != 11 or not ruc.isdigit():
+        return False
+    
+    suma = sum(int(d) * p for d, p in zip(ruc[:10], PESOS_RUC))
+    digito = 11 - (suma % 11)
+    if digito == 10:
+        digito = 0
+    elif digito == 11:
+        digito = 1
+    
+    return digito == int(ruc[10])
+
+
+def similitud_razon_social(razon_limpia: str, candidato: str) -> float:
+    """
+    Similitud por tokens (coeficiente de Dice) entre la razon social buscada
+    (ya limpia) y la razon social de un resultado. 1.0 = mismos tokens.
+    """
+    tokens_a = set(razon_limpia.split())
+    tokens_b = set(limpiar_razon_social(candidato or '').split())
+    if not tokens_a or not tokens_b:
+        return 0.0
+    
+    return 2 * len(tokens_a & tokens_b) / (len(tokens_a) + len(tokens_b))
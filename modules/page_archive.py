@@ -0,0 +1,159 @@
+import argparse
+import sqlite3
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Iterator, Optional, Tuple
+import config
+
+
+class ArchivoPaginas:
+    """
+    Archivo local de las paginas de resultado de SUNAT.
+    Clave: la variante exacta enviada en el formulario; valor: el HTML crudo de la
+    respuesta (pagina principal + iframes) comprimido con zlib. Sirve para volver a
+    parsear y seleccionar RUCs sin red (SCRAPER_BACKEND=replay).
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or config.ARCHIVO_PAGINAS
+        self.lock = threading.Lock()
+        self.guardadas = 0
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS paginas (
+                variante TEXT PRIMARY KEY,
+                html BLOB,
+                bytes INTEGER,
+                guardado REAL
+            )
+        """)
+        self.conn.commit()
+
+    def guardar(self, variante: str, html: str):
+        """Guarda (o reemplaza) la pagina de una variante"""
+        if not variante:
+            return
+        datos = (html or '').encode('utf-8')
+        comprimido = zlib.compress(datos, config.ARCHIVO_PAGINAS_COMPRESION)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO paginas (variante, html, bytes, guardado) VALUES (?, ?, ?, ?)",
+                (variante, comprimido, len(datos), time.time())
+            )
+            self.conn.commit()
+            self.guardadas += 1
+
+    def obtener(self, variante: str) -> Optional[str]:
+        """HTML guardado para la variante, o None si nunca se grabo"""
+        with self.lock:
+            fila = self.conn.execute("SELECT html FROM paginas WHERE variante = ?", (variante,)).fetchone()
+        if fila is None:
+            return None
+        return zlib.decompress(fila[0]).decode('utf-8')
+
+    def paginas(self) -> Iterator[Tuple[str, str]]:
+        """Recorre todas las paginas guardadas como (variante, html)"""
+        with self.lock:
+            filas = self.conn.execute("SELECT variante, html FROM paginas ORDER BY variante").fetchall()
+        for variante, comprimido in filas:
+            yield variante, zlib.decompress(comprimido).decode('utf-8')
+
+    def estadisticas(self) -> dict:
+        with self.lock:
+            total, original = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM paginas").fetchone()
+            comprimido = self.conn.execute("SELECT COALESCE(SUM(LENGTH(html)), 0) FROM paginas").fetchone()[0]
+        return {'paginas': total, 'bytes': original, 'bytes_comprimidos': comprimido}
+
+    def size(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM paginas").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            try:
+                self.conn.close()
+            except sqlite3.Error:
+                pass
+
+
+@lru_cache(maxsize=1)
+def abrir_archivo_paginas() -> ArchivoPaginas:
+    """Archivo de paginas compartido por todos los workers del proceso (se abre una sola vez)"""
+    archivo = ArchivoPaginas()
+    print(f"Archivo de paginas: {archivo.size()} paginas en {archivo.db_path}")
+    return archivo
+
+
+def main():
+    """
+    Repite la seleccion de RUC de cada razon social grabada, sin red: recorre sus
+    variantes con las paginas del archivo, igual que SCRAPER_BACKEND=replay, y
+    reporta el RUC elegido. Tambien mide el parser.
+    """
+    from modules.result_parser import parsear_resultados
+    from modules.sunat_scraper import EstadoBusqueda, SunatScraper
+
+    parser = argparse.ArgumentParser(
+        description="Repite la seleccion de RUC sobre las paginas grabadas de SUNAT y mide el parser")
+    parser.add_argument('archivo', nargs='?', default=None, help="Archivo de paginas (default: ARCHIVO_PAGINAS)")
+    args = parser.parse_args()
+
+    archivo = ArchivoPaginas(args.archivo)
+    stats = archivo.estadisticas()
+    print(f"Paginas: {stats['paginas']} | {stats['bytes'] / 1024 / 1024:.1f} MB "
+          f"({stats['bytes_comprimidos'] / 1024 / 1024:.1f} MB comprimidos)")
+
+    paginas = dict(archivo.paginas())
+    archivo.close()
+
+    inicio = time.perf_counter()
+    filas_por_variante = {variante: parsear_resultados(html) for variante, html in paginas.items()}
+    segundos = time.perf_counter() - inicio
+
+    no_vacias = sum(1 for html in paginas.values() if html)
+    filas = sum(len(f) for f in filas_por_variante.values())
+    print(f"Filas extraidas: {filas} de {no_vacias} paginas no vacias")
+    if paginas:
+        print(f"Parseo: {segundos:.2f}s ({segundos / len(paginas) * 1000:.3f} ms por pagina)")
+
+    # La clave del archivo es la variante enviada: las variantes cortas de otra clave
+    # no son razones sociales propias
+    scraper = SunatScraper(worker_id=0)
+    derivadas = set()
+    for variante in paginas:
+        derivadas.update(scraper.obtener_variantes_busqueda(variante)[1:])
+    razones = [variante for variante in paginas if variante not in derivadas]
+
+    conteo = {'encontrados': 0, 'descartados': 0, 'no_encontrados': 0}
+    inicio = time.perf_counter()
+    for razon in razones:
+        busqueda = EstadoBusqueda(scraper, razon)
+        while not busqueda.terminado:
+            # Variante nunca grabada: sin resultados, como en el replay
+            busqueda.registrar(filas_por_variante.get(busqueda.variante_actual(), []))
+
+        if busqueda.ruc and busqueda.similitud >= config.SIMILITUD_MINIMA:
+            conteo['encontrados'] += 1
+            print(f"{razon} -> {busqueda.ruc} ({busqueda.estado}, similitud {busqueda.similitud:.2f}, "
+                  f"variante: {busqueda.variante_exitosa})")
+        elif busqueda.ruc:
+            conteo['descartados'] += 1
+            print(f"{razon} -> descartado {busqueda.ruc} (similitud {busqueda.similitud:.2f})")
+        else:
+            conteo['no_encontrados'] += 1
+            print(f"{razon} -> no encontrado")
+    segundos = time.perf_counter() - inicio
+
+    print(f"Razones sociales: {len(razones)} | con RUC: {conteo['encontrados']} | "
+          f"descartados por similitud: {conteo['descartados']} | no encontrados: {conteo['no_encontrados']}")
+    if razones:
+        print(f"Seleccion: {segundos:.2f}s ({segundos / len(razones) * 1000:.3f} ms por razon social)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Limitador global de peticiones por segundo (token bucket).
+    Es seguro entre hilos y puede usarse desde codigo sincrono (acquire)
+    o desde asyncio (acquire_async, espera sin ocupar un hilo). rate <= 0 desactiva el limite.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.lock = threading.Lock()
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.ultimo = time.monotonic()
+
+    def _reservar(self) -> float:
+        """Reserva un token y retorna cuantos segundos hay que esperar para usarlo"""
+        with self.lock:
+            if self.rate <= 0:
+                return 0.0
+            ahora = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (ahora - self.ultimo) * self.rate)
+            self.ultimo = ahora
+            # Se permite saldo negativo: cada reserva queda en fila detras de las anteriores
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        espera = self._reservar()
+        if espera > 0:
+            time.sleep(espera)
+
+    async def acquire_async(self):
+        espera = self._reservar()
+        if espera > 0:
+            await asyncio.sleep(espera)
@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+from typing import Dict, List
+import config
+
+
+def _json_default(valor):
+    # Tipos de numpy/pandas (int64, Timestamp, ...) que json no serializa directamente
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return str(valor)
+
+
+class ResultJournal:
+    """
+    Journal de resultados append-only (una linea JSON por resultado).
+    Cada resultado se escribe en O(1) apenas termina su busqueda; el Excel
+    final se genera a partir de este archivo.
+    """
+
+    def __init__(self, path: str = None, fsync: bool = None):
+        self.path = path or config.JOURNAL_FILE
+        self.fsync = config.JOURNAL_FSYNC if fsync is None else fsync
+        self.lock = threading.Lock()
+        self._file = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def _abrir(self):
+        if self._file is None:
+            termina_incompleto = False
+            if self.exists():
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    termina_incompleto = f.read(1) != b'\n'
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if termina_incompleto:
+                # Cerrar la linea truncada para no corromper la siguiente escritura
+                self._file.write('\n')
+        return self._file
+
+    def append(self, resultado: Dict):
+        self.append_many([resultado])
+
+    def append_many(self, resultados: List[Dict]):
+        if not resultados:
+            return
+        lineas = ''.join(
+            json.dumps(r, ensure_ascii=False, default=_json_default) + '\n'
+            for r in resultados
+        )
+        with self.lock:
+            f = self._abrir()
+            f.write(lineas)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def load(self) -> List[Dict]:
+        """
+        Lee el journal completo. Si una fila (huella, o indice en journals anteriores
+        a las huellas) aparece varias veces gana la ultima escritura. Una ultima linea
+        truncada (corte de luz, kill) se ignora.
+        """
+        if not self.exists():
+            return []
+
+        por_indice = {}
+        descartadas = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for linea in f:
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    descartadas += 1
+                    continue
+                por_indice[registro.get('huella') or registro.get('indice_original')] = registro
+
+        if descartadas:
+            print(f"ADVERTENCIA: {descartadas} lineas corruptas ignoradas en {self.path}")
+
+        return list(por_indice.values())
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
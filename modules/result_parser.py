@@ -0,0 +1,167 @@
+import re
+from html.parser import HTMLParser
+from typing import Dict, List
+
+PATRON_RUC = re.compile(r'\b(?:10|20)\d{9}\b')
+
+# Clases de los items de la lista de resultados de jcrS00Alias
+CLASES_ITEM = ('aRucs', 'list-group-item')
+CLASES_NO_ITEM = ('list-group-item-heading', 'list-group-item-text')
+TAGS_ITEM = ('a', 'div', 'li', 'tr')
+TAGS_IGNORADOS = ('script', 'style', 'noscript')
+
+
+def normalizar_estado(texto: str) -> str:
+    texto_upper = (texto or '').upper()
+    if "ACTIVO" in texto_upper:
+        return "ACTIVO"
+    elif "BAJA" in texto_upper:
+        return "BAJA"
+    elif "SUSPEN" in texto_upper:  # "SUSPENSION TEMPORAL" o el estado ya normalizado
+        return "SUSPENDIDO"
+    else:
+        return "DESCONOCIDO"
+
+
+class _ParserResultados(HTMLParser):
+    """
+    Recorre el HTML una sola vez separando el texto de cada item de resultado.
+    Un <tr> solo es item si no contiene items marcados por clase: en una tabla de
+    maquetacion gana el item mas interno y cada resultado queda en su propia fila.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items: List[List[str]] = []
+        self.textos: List[str] = []
+        self._abiertos = []  # items abiertos, el ultimo es el mas interno: [tag, profundidad, textos, con_items]
+        self._ignorar = 0
+
+    def _es_item(self, tag: str, attrs) -> bool:
+        if tag not in TAGS_ITEM:
+            return False
+        if tag == 'tr':
+            return True
+        clases = (dict(attrs).get('class') or '').split()
+        if any(c in CLASES_NO_ITEM for c in clases):
+            return False
+        return any(c in CLASES_ITEM for c in clases)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in TAGS_IGNORADOS:
+            self._ignorar += 1
+            return
+
+        actual = self._abiertos[-1] if self._abiertos else None
+        # Dentro de un item marcado por clase todo es parte de ese item; dentro de un <tr>
+        # puede empezar un item mas interno
+        if (actual is None or actual[0] == 'tr') and self._es_item(tag, attrs):
+            if actual is not None:
+                actual[3] = True
+            self._abiertos.append([tag, 1, [], False])
+        elif actual is not None and tag == actual[0]:
+            actual[1] += 1
+
+    def handle_endtag(self, tag):
+        if tag in TAGS_IGNORADOS:
+            self._ignorar = max(0, self._ignorar - 1)
+            return
+
+        if not any(item[0] == tag for item in self._abiertos):
+            return
+        # Items internos sin cerrar (HTML mal formado) terminan con el que los contiene
+        while self._abiertos[-1][0] != tag:
+            self._cerrar_item()
+        self._abiertos[-1][1] -= 1
+        if self._abiertos[-1][1] == 0:
+            self._cerrar_item()
+
+    def _cerrar_item(self):
+        _, _, textos, con_items = self._abiertos.pop()
+        if not con_items:  # un <tr> que contenia items es solo maquetacion
+            self.items.append(textos)
+
+    def handle_data(self, data):
+        if self._ignorar:
+            return
+        texto = ' '.join(data.split())
+        if not texto:
+            return
+        self.textos.append(texto)
+        if self._abiertos:
+            self._abiertos[-1][2].append(texto)
+
+
+def _valor_etiqueta(partes: List[str], i: int) -> str:
+    """Valor de 'Etiqueta: valor' (en la misma parte o en la siguiente)"""
+    valor = partes[i].split(':', 1)[1].strip() if ':' in partes[i] else ''
+    if not valor and i + 1 < len(partes):
+        valor = partes[i + 1]
+    return valor
+
+
+def _fila_desde_partes(partes: List[str]) -> Dict:
+    texto = ' '.join(partes)
+    match = PATRON_RUC.search(texto)
+    if not match:
+        return None
+
+    fila = {'ruc': match.group(0), 'razon_social': '', 'estado': 'DESCONOCIDO', 'ubicacion': ''}
+    estado_texto = ''
+
+    for i, parte in enumerate(partes):
+        etiqueta = parte.upper()
+        if etiqueta.startswith('UBICACI'):
+            fila['ubicacion'] = _valor_etiqueta(partes, i)
+        elif etiqueta.startswith('ESTADO'):
+            estado_texto = _valor_etiqueta(partes, i)
+        elif not fila['razon_social'] and not PATRON_RUC.search(parte) and not etiqueta.startswith('RUC'):
+            fila['razon_social'] = parte
+
+    # Filas de tabla sin etiquetas: buscar el estado en cualquier celda
+    fila['estado'] = normalizar_estado(estado_texto or texto)
+    return fila
+
+
+def _filas_desde_texto(texto: str) -> List[Dict]:
+    """Respaldo para paginas sin items reconocibles: un segmento de texto por RUC encontrado"""
+    filas = []
+    matches = list(PATRON_RUC.finditer(texto))
+    for i, match in enumerate(matches):
+        fin = matches[i + 1].start() if i + 1 < len(matches) else len(texto)
+        segmento = texto[match.end():fin]
+        razon = re.split(r'(?i)ubicaci|estado', segmento, maxsplit=1)[0]
+        ubicacion = re.search(r'(?i)ubicaci\S*\s*:?\s*(.*?)(?=estado|$)', segmento)
+        filas.append({
+            'ruc': match.group(0),
+            'razon_social': razon.strip(' -:'),
+            'estado': normalizar_estado(segmento),
+            'ubicacion': ubicacion.group(1).strip() if ubicacion else ''
+        })
+    return filas
+
+
+def parsear_resultados(html: str) -> List[Dict]:
+    """
+    Convierte el HTML de la pagina de resultados en filas estructuradas:
+    [{'ruc', 'razon_social', 'estado', 'ubicacion'}, ...]
+    """
+    if not html:
+        return []
+
+    parser = _ParserResultados()
+    parser.feed(html)
+    parser.close()
+
+    filas = []
+    vistos = set()
+    for partes in parser.items:
+        fila = _fila_desde_partes(partes)
+        if fila and fila['ruc'] not in vistos:
+            vistos.add(fila['ruc'])
+            filas.append(fila)
+
+    if not filas:
+        filas = _filas_desde_texto(' '.join(parser.textos))
+
+    return filas
@@ -0,0 +1,85 @@
+import sys
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Iterator
+import pandas as pd
+import config
+
+
+class ResultadoCompacto:
+    """Un resultado con solo las columnas de salida (OUTPUT_COLUMNS), sin el dict por registro"""
+
+    __slots__ = tuple(config.OUTPUT_COLUMNS)
+
+    def __init__(self, resultado: Dict):
+        for campo in self.__slots__:
+            setattr(self, campo, resultado.get(campo))
+        if isinstance(self.estado, str):
+            # Pocos estados distintos repetidos en millones de filas: una sola copia de cada uno
+            self.estado = sys.intern(self.estado)
+
+    def copia(self, **cambios) -> 'ResultadoCompacto':
+        nuevo = object.__new__(ResultadoCompacto)
+        for campo in self.__slots__:
+            setattr(nuevo, campo, getattr(self, campo))
+        for campo, valor in cambios.items():
+            setattr(nuevo, campo, valor)
+        return nuevo
+
+    def como_tupla(self) -> tuple:
+        return tuple(getattr(self, campo) for campo in self.__slots__)
+
+
+class AlmacenResultados:
+    """
+    Resultados de la corrida en registros compactos, con los conteos por estado
+    mantenidos al agregar: el monitor y las estadisticas finales no recorren la lista.
+    """
+
+    def __init__(self, resultados: Iterable[Dict] = ()):
+        self.lock = threading.Lock()
+        self.registros = []
+        self.por_estado = Counter()
+        self.exitosos = 0  # resultados con RUC
+        self.extend(resultados)
+
+    def _contar(self, registro: ResultadoCompacto):
+        self.por_estado[registro.estado] += 1
+        if registro.ruc and registro.ruc == registro.ruc:  # descarta None, '' y NaN
+            self.exitosos += 1
+
+    def agregar(self, resultado: Dict):
+        registro = resultado if isinstance(resultado, ResultadoCompacto) else ResultadoCompacto(resultado)
+        with self.lock:
+            self.registros.append(registro)
+            self._contar(registro)
+
+    def extend(self, resultados: Iterable[Dict]):
+        registros = [r if isinstance(r, ResultadoCompacto) else ResultadoCompacto(r) for r in resultados]
+        with self.lock:
+            self.registros.extend(registros)
+            for registro in registros:
+                self._contar(registro)
+
+    def conteo(self, estado: str) -> int:
+        return self.por_estado.get(estado, 0)
+
+    @property
+    def hay_error_conexion(self) -> bool:
+        return self.por_estado.get('ERROR_CONEXION', 0) > 0
+
+    def __len__(self) -> int:
+        return len(self.registros)
+
+    def __iter__(self) -> Iterator[ResultadoCompacto]:
+        return iter(list(self.registros))
+
+    def a_dataframe(self, registros: Iterable[ResultadoCompacto] = None) -> pd.DataFrame:
+        """
+        DataFrame con las columnas de salida, construido por tuplas (sin un dict por fila).
+        registros: las filas a exportar si no son las del almacen (p.ej. generadas sobre la marcha)
+        """
+        registros = self if registros is None else registros
+        return pd.DataFrame.from_records(
+            (r.como_tupla() for r in registros), columns=list(ResultadoCompacto.__slots__)
+        )
@@ -0,0 +1,140 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+import config
+
+
+class RucCache:
+    """
+    Cache persistente de busquedas en SUNAT.
+    Clave: razon social normalizada (salida de limpiar_razon_social).
+    Guarda ruc, estado, observacion y la variante exitosa.
+    """
+
+    # Solo se cachean respuestas definitivas de la web (nunca errores)
+    ESTADOS_NO_CACHEABLES = {config.STATUS['ERROR'], config.STATUS['PENDING'], 'ERROR_CONEXION', 'CAPTCHA'}
+
+    def __init__(self, db_path: str = None, ttl_dias: float = None, max_entradas: int = None):
+        self.db_path = db_path or config.CACHE_FILE
+        self.ttl_segundos = (ttl_dias if ttl_dias is not None else config.CACHE_TTL_DIAS) * 86400
+        self.max_entradas = max_entradas if max_entradas is not None else config.CACHE_MAX_ENTRADAS
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._escrituras = 0
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS ruc_cache (
+                razon_limpia TEXT PRIMARY KEY,
+                ruc TEXT,
+                estado TEXT,
+                observacion TEXT,
+                variante TEXT,
+                creado REAL,
+                accedido REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ruc_cache_accedido ON ruc_cache(accedido)")
+        self.conn.commit()
+
+        expirados = self.purgar_expirados()
+        total = self.size()
+        print(f"Cache de RUCs: {total} entradas en {self.db_path} ({expirados} expiradas eliminadas)")
+
+    def get(self, razon_limpia: str) -> Optional[Dict]:
+        if not razon_limpia:
+            return None
+
+        ahora = time.time()
+        with self.lock:
+            fila = self.conn.execute(
+                "SELECT ruc, estado, observacion, variante, creado FROM ruc_cache WHERE razon_limpia = ?",
+                (razon_limpia,)
+            ).fetchone()
+
+            if fila is None or (self.ttl_segundos > 0 and ahora - fila[4] > self.ttl_segundos):
+                self.misses += 1
+                return None
+
+            self.conn.execute(
+                "UPDATE ruc_cache SET accedido = ? WHERE razon_limpia = ?",
+                (ahora, razon_limpia)
+            )
+            self.conn.commit()
+            self.hits += 1
+
+        return {
+            'ruc': fila[0],
+            'estado': fila[1],
+            'observacion': fila[2] or '',
+            'variante': fila[3]
+        }
+
+    def put(self, razon_limpia: str, resultado: Dict) -> bool:
+        if not razon_limpia or resultado.get('estado') in self.ESTADOS_NO_CACHEABLES:
+            return False
+
+        ahora = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ruc_cache "
+                "(razon_limpia, ruc, estado, observacion, variante, creado, accedido) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    razon_limpia,
+                    resultado.get('ruc'),
+                    resultado.get('estado'),
+                    resultado.get('observacion', ''),
+                    resultado.get('variante'),
+                    ahora,
+                    ahora
+                )
+            )
+            self.conn.commit()
+
+            self._escrituras += 1
+            # Revisar el tamano cada cierto numero de escrituras (COUNT(*) no es gratis)
+            if self._escrituras % 1000 == 0:
+                self._evict()
+
+        return True
+
+    def _evict(self):
+        """Elimina las entradas menos usadas recientemente si se supera max_entradas"""
+        if self.max_entradas <= 0:
+            return
+        total = self.conn.execute("SELECT COUNT(*) FROM ruc_cache").fetchone()[0]
+        exceso = total - self.max_entradas
+        if exceso > 0:
+            self.conn.execute(
+                "DELETE FROM ruc_cache WHERE razon_limpia IN "
+                "(SELECT razon_limpia FROM ruc_cache ORDER BY accedido ASC LIMIT ?)",
+                (exceso,)
+            )
+            self.conn.commit()
+
+    def purgar_expirados(self) -> int:
+        if self.ttl_segundos <= 0:
+            return 0
+        limite = time.time() - self.ttl_segundos
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM ruc_cache WHERE creado < ?", (limite,))
+            self._evict()
+            self.conn.commit()
+            return cursor.rowcount
+
+    def size(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM ruc_cache").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            try:
+                self._evict()
+                self.conn.close()
+            except sqlite3.Error:
+                pass
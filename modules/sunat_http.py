@@ -0,0 +1,99 @@
+import random
+import string
+import requests
+from requests.adapters import HTTPAdapter
+import config
+from modules.result_parser import parsear_resultados
+from modules.sunat_scraper import SunatScraper
+
+
+class SunatHttpScraper(SunatScraper):
+    """
+    Backend sin navegador: envia la busqueda por razon social directamente a
+    config.SUNAT_URL usando una sesion HTTP con keep-alive y pool de conexiones.
+    Comparte la interfaz de SunatScraper (initialize_driver, buscar_ruc, close_driver).
+    """
+
+    NOMBRE_BACKEND = 'Sesion HTTP'
+
+    def __init__(self, worker_id: int = 0):
+        super().__init__(worker_id)
+        self.session = None
+        self._trafico = {'peticiones': 0, 'bytes': 0, 'bloqueadas': 0}
+
+    def initialize_driver(self) -> bool:
+        try:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=config.HTTP_POOL_SIZE,
+                max_retries=0
+            )
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+            self.session.headers.update({
+                'User-Agent': config.HTTP_USER_AGENT,
+                'Accept': 'text/html,application/xhtml+xml',
+                'Accept-Language': 'es-PE,es;q=0.9',
+                'Connection': 'keep-alive',
+            })
+
+            # Primera visita para obtener las cookies de sesion del formulario
+            respuesta = self.session.get(config.SUNAT_URL, timeout=config.HTTP_TIMEOUT)
+            respuesta.raise_for_status()
+
+            print(f"[Worker {self.worker_id}] Sesion HTTP inicializada")
+            return True
+
+        except Exception as e:
+            print(f"[Worker {self.worker_id}] ERROR inicializando sesion HTTP: {e}")
+            self.close_driver()
+            return False
+
+    def close_driver(self):
+        if self.session:
+            try:
+                self.session.close()
+                print(f"[Worker {self.worker_id}] Sesion HTTP cerrada")
+            except Exception:
+                pass
+            finally:
+                self.session = None
+
+    def is_ready(self) -> bool:
+        return self.session is not None
+
+    def is_driver_alive(self) -> bool:
+        return self.session is not None
+
+    def _leer_trafico(self) -> dict:
+        trafico = self._trafico
+        self._trafico = {'peticiones': 0, 'bytes': 0, 'bloqueadas': 0}
+        return trafico if trafico['peticiones'] else {}
+
+    def _generar_token(self) -> str:
+        # El formulario de SUNAT genera en JS un token aleatorio de 52 caracteres
+        return ''.join(random.choices(string.ascii_lowercase + string.digits, k=52))
+
+    def _consultar_variante(self, variante: str) -> list:
+        datos = dict(config.SUNAT_HTTP_FORM)
+        datos['razSoc'] = variante
+        datos['search3'] = variante
+        datos['token'] = self._generar_token()
+
+        with self._fase('peticion'):
+            respuesta = self.session.post(
+                config.SUNAT_URL,
+                data=datos,
+                headers={'Referer': config.SUNAT_URL},
+                timeout=config.HTTP_TIMEOUT
+            )
+            respuesta.raise_for_status()
+
+        self._trafico['peticiones'] += 1
+        self._trafico['bytes'] += len(respuesta.content)
+
+        self._archivar_pagina(variante, respuesta.text)
+
+        with self._fase('extraccion'):
+            return parsear_resultados(respuesta.text)
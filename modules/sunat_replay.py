@@ -0,0 +1,54 @@
+from modules.page_archive import abrir_archivo_paginas
+from modules.result_parser import parsear_resultados
+from modules.sunat_scraper import SunatScraper
+
+
+class SunatReplayScraper(SunatScraper):
+    """
+    Backend sin red: responde cada variante con la pagina grabada en ARCHIVO_PAGINAS
+    (GRABAR_PAGINAS=true en una corrida anterior) y la pasa por el mismo parser y la
+    misma seleccion de candidatos que los backends reales. Sirve para medir cambios
+    de extraccion o de seleccion sobre muchas paginas en segundos.
+    Las variantes que nunca se grabaron se responden como sin resultados.
+    """
+
+    NOMBRE_BACKEND = 'Replay'
+
+    def __init__(self, worker_id: int = 0):
+        super().__init__(worker_id)
+        self.paginas = None
+        self.encontradas = 0
+        self.faltantes = 0
+
+    def initialize_driver(self) -> bool:
+        try:
+            self.paginas = abrir_archivo_paginas()
+            return True
+        except Exception as e:
+            print(f"[Worker {self.worker_id}] ERROR abriendo el archivo de paginas: {e}")
+            return False
+
+    def close_driver(self):
+        if self.paginas is not None:
+            print(f"[Worker {self.worker_id}] Replay: {self.encontradas} paginas leidas, "
+                  f"{self.faltantes} variantes sin grabar")
+            self.paginas = None
+
+    def is_ready(self) -> bool:
+        return self.paginas is not None
+
+    def is_driver_alive(self) -> bool:
+        return self.paginas is not None
+
+    def _consultar_variante(self, variante: str) -> list:
+        with self._fase('archivo'):
+            html = self.paginas.obtener(variante)
+
+        if html is None:
+            self.faltantes += 1
+            print(f"[Worker {self.worker_id}] Variante sin grabar: {variante}")
+            return []
+        self.encontradas += 1
+
+        with self._fase('extraccion'):
+            return parsear_resultados(html)
@@ -4,76 +4,197 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import NoAlertPresentException, StaleElementReferenceException, TimeoutException
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+import json
 import time
-import re
 import config
+from modules.normalizacion import limpiar_razon_social, similitud_razon_social, validar_ruc
+from modules.result_parser import PATRON_RUC, normalizar_estado, parsear_resultados
+
+try:
+    import psutil  # opcional: solo para reciclar Chrome por consumo de memoria
+except ImportError:
+    psutil = None
+
+
+@lru_cache(maxsize=1)
+def buscar_chromedriver():
+    """Primer chromedriver existente de CHROMEDRIVER_PATHS (se busca una sola vez por proceso)"""
+    for path_str in config.CHROMEDRIVER_PATHS:
+        path = Path(path_str)
+        if path.exists():
+            return path
+    return None
+
+
+def crear_driver_chrome(headless: bool):
+    """Lanza un Chrome con las opciones optimizadas del scraper (lanza excepcion si falla)"""
+    chromedriver_path = buscar_chromedriver()
+    if not chromedriver_path:
+        raise FileNotFoundError("No se encontro chromedriver (configura CHROMEDRIVER_PATH)")
+    
+    options = Options()
+    if headless:
+        options.add_argument('--headless=new')
+    
+    # Optimizaciones de rendimiento
+    options.add_argument('--start-maximized')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    
+    # Deshabilitar carga de recursos innecesarios (pero mantener JS para SUNAT)
+    options.add_argument('--disable-plugins')
+    options.add_argument('--disable-extensions')
+    
+    # Deshabilitar GPU y aceleracion
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-software-rasterizer')
+    
+    # Optimizaciones de red
+    options.add_argument('--disable-background-networking')
+    options.add_argument('--disable-default-apps')
+    options.add_argument('--disable-sync')
+    
+    # Preferencias para bloquear recursos pesados (pero permitir JS)
+    prefs = {
+        'profile.managed_default_content_settings.images': 2,
+        'profile.managed_default_content_settings.stylesheets': 2,
+        'profile.managed_default_content_settings.javascript': 1,  # 1 = permitir
+        'profile.managed_default_content_settings.plugins': 2,
+        'profile.managed_default_content_settings.popups': 2,
+        'profile.managed_default_content_settings.geolocation': 2,
+        'profile.managed_default_content_settings.media_stream': 2,
+    }
+    options.add_experimental_option('prefs', prefs)
+    options.add_experimental_option('excludeSwitches', ['enable-logging', 'enable-automation'])
+    options.add_experimental_option('useAutomationExtension', False)
+    
+    if config.CONTADORES_RED:
+        # Solo eventos de red: son los que se usan para contar peticiones y bytes
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+    
+    service = Service(executable_path=str(chromedriver_path))
+    driver = webdriver.Chrome(service=service, options=options)
+    aplicar_bloqueo_red(driver)
+    return driver
+
+
+def aplicar_bloqueo_red(driver):
+    """Bloquea via DevTools las URLs de URLS_BLOQUEADAS en la pestana activa"""
+    if not config.URLS_BLOQUEADAS:
+        return
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': config.URLS_BLOQUEADAS})
+    except Exception as e:
+        print(f"[Chrome] No se pudo aplicar el bloqueo de URLs: {e}")
+
+
+EVENTOS_RED = ('Network.requestWillBeSent', 'Network.loadingFinished', 'Network.loadingFailed')
+
+
+def leer_trafico_red(driver) -> dict:
+    """Peticiones, bytes recibidos y peticiones bloqueadas desde la ultima lectura del log de performance"""
+    trafico = {'peticiones': 0, 'bytes': 0, 'bloqueadas': 0}
+    for entrada in driver.get_log('performance'):
+        texto = entrada.get('message', '')
+        # Descartar sin parsear los eventos que no se cuentan
+        if not any(evento in texto for evento in EVENTOS_RED):
+            continue
+        mensaje = json.loads(texto).get('message', {})
+        metodo = mensaje.get('method')
+        params = mensaje.get('params', {})
+        if metodo == 'Network.requestWillBeSent':
+            trafico['peticiones'] += 1
+        elif metodo == 'Network.loadingFinished':
+            trafico['bytes'] += int(params.get('encodedDataLength', 0))
+        elif metodo == 'Network.loadingFailed' and params.get('blockedReason'):
+            trafico['bloqueadas'] += 1
+    return trafico
+
+
+def rss_chrome_mb(driver) -> float:
+    """Memoria residente (MB) de chromedriver y todos sus procesos Chrome; 0 si no se puede medir"""
+    if psutil is None:
+        return 0.0
+    try:
+        proceso = psutil.Process(driver.service.process.pid)
+        procesos = [proceso] + proceso.children(recursive=True)
+        return sum(p.memory_info().rss for p in procesos) / (1024 * 1024)
+    except Exception:
+        return 0.0
+
+
+def motivo_reciclaje(driver, busquedas: int) -> str:
+    """Motivo para reemplazar un Chrome de larga vida ('' si puede seguir en uso)"""
+    if config.DRIVER_MAX_BUSQUEDAS > 0 and busquedas >= config.DRIVER_MAX_BUSQUEDAS:
+        return f"{busquedas} busquedas"
+    # Medir el arbol de procesos cuesta algunos ms: solo cada 10 busquedas
+    if config.DRIVER_MAX_RSS_MB > 0 and busquedas % 10 == 0:
+        rss = rss_chrome_mb(driver)
+        if rss > config.DRIVER_MAX_RSS_MB:
+            return f"memoria {rss:.0f} MB"
+    return ''
+
+
+class CaptchaRequerido(Exception):
+    """La pagina pide CAPTCHA y este scraper no lo resuelve (solo lo hace la sesion visible dedicada)"""
+
 
 class SunatScraper:
     
+    NOMBRE_BACKEND = 'Chrome'
+    
     def __init__(self, worker_id: int = 0):
         self.worker_id = worker_id
         self.driver = None
         self.wait = None
+        self.tiempos_fases = {}  # segundos por fase de la ultima busqueda
+        self.duracion_busqueda = 0.0  # segundos de punta a punta de la ultima busqueda
+        self.pestana_actual = None  # handle de la pestana activa (pipeline de varias pestanas)
+        self.formularios_cargados = set()  # pestanas con la pagina de busqueda ya cargada
+        self.recargas_completas = 0
+        self.formularios_reutilizados = 0
+        self.pool = None  # BrowserPool opcional que entrega Chrome ya iniciados
+        self.busquedas_driver = 0
+        self.trafico_red = {}  # peticiones/bytes/bloqueadas de la ultima busqueda
+        self.trafico_total = {'peticiones': 0, 'bytes': 0, 'bloqueadas': 0}
+        self.alertas = 0  # acumulados del worker (senales para el control adaptativo)
+        self.captchas = 0
+        self.archivo = None  # ArchivoPaginas opcional: graba el HTML de cada respuesta (GRABAR_PAGINAS)
+        self.html_respuesta = ''  # HTML de la ultima respuesta atendida
+        self.resolver_captcha = False  # True solo en la sesion visible que espera al operador
         
     def initialize_driver(self) -> bool:
         try:
-            chromedriver_path = None
-            for path_str in config.CHROMEDRIVER_PATHS:
-                path = Path(path_str)
-                if path.exists():
-                    chromedriver_path = path
-                    break
-            
-            if not chromedriver_path:
-                print(f"[Worker {self.worker_id}] ERROR: No se encontro chromedriver.exe")
-                return False
-            
-            options = Options()
-            
             # Modo headless (solo Workers 1-4, Worker 0 visible para debugging)
-            if config.HEADLESS_MODE and self.worker_id != 0:
-                options.add_argument('--headless=new')
-                print(f"[Worker {self.worker_id}] Modo headless activado")
-            elif self.worker_id == 0:
-                print(f"[Worker {self.worker_id}] Modo VISIBLE para debugging")
-            
-            # Optimizaciones de rendimiento
-            options.add_argument('--start-maximized')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            
-            # Deshabilitar carga de recursos innecesarios (pero mantener JS para SUNAT)
-            options.add_argument('--disable-plugins')
-            options.add_argument('--disable-extensions')
-            
-            # Deshabilitar GPU y aceleracion
-            options.add_argument('--disable-gpu')
-            options.add_argument('--disable-software-rasterizer')
-            
-            # Optimizaciones de red
-            options.add_argument('--disable-background-networking')
-            options.add_argument('--disable-default-apps')
-            options.add_argument('--disable-sync')
-            
-            # Preferencias para bloquear recursos pesados (pero permitir JS)
-            prefs = {
-                'profile.managed_default_content_settings.images': 2,
-                'profile.managed_default_content_settings.stylesheets': 2,
-                'profile.managed_default_content_settings.javascript': 1,  # 1 = permitir
-                'profile.managed_default_content_settings.plugins': 2,
-                'profile.managed_default_content_settings.popups': 2,
-                'profile.managed_default_content_settings.geolocation': 2,
-                'profile.managed_default_content_settings.media_stream': 2,
-            }
-            options.add_experimental_option('prefs', prefs)
-            options.add_experimental_option('excludeSwitches', ['enable-logging', 'enable-automation'])
-            options.add_experimental_option('useAutomationExtension', False)
+            headless = config.HEADLESS_MODE and self.worker_id != 0 and not self.resolver_captcha
+            if self.pool and self.pool.headless == headless:
+                # Chrome ya iniciado en segundo plano por el pool
+                driver = self.pool.obtener()
+                if not driver:
+                    print(f"[Worker {self.worker_id}] ERROR: El pool no entrego un Chrome a tiempo")
+                    return False
+                self.driver = driver
+            else:
+                # Sin pool, o sesion visible con un pool headless: Chrome propio
+                if headless:
+                    print(f"[Worker {self.worker_id}] Modo headless activado")
+                elif self.resolver_captcha:
+                    print(f"[Worker {self.worker_id}] Modo VISIBLE para resolver CAPTCHA")
+                elif self.worker_id == 0:
+                    print(f"[Worker {self.worker_id}] Modo VISIBLE para debugging")
+                self.driver = crear_driver_chrome(headless)
             
-            service = Service(executable_path=str(chromedriver_path))
-            self.driver = webdriver.Chrome(service=service, options=options)
             self.wait = WebDriverWait(self.driver, config.SELENIUM_TIMEOUT)
+            self.pestana_actual = None
+            self.formularios_cargados.clear()
+            self.busquedas_driver = 0
             
             print(f"[Worker {self.worker_id}] Chrome inicializado (modo optimizado)")
             return True
@@ -85,14 +206,49 @@ class SunatScraper:
     def close_driver(self):
         if self.driver:
             try:
-                self.driver.quit()
-                print(f"[Worker {self.worker_id}] Chrome cerrado")
+                if self.pool:
+                    # El cierre lo hace el pool en segundo plano
+                    self.pool.liberar(self.driver)
+                else:
+                    self.driver.quit()
+                print(f"[Worker {self.worker_id}] Chrome cerrado (recargas completas: {self.recargas_completas}, "
+                      f"formularios reutilizados: {self.formularios_reutilizados})")
+                if self.trafico_total['peticiones']:
+                    print(f"[Worker {self.worker_id}] Red acumulada: {self.trafico_total['peticiones']} peticiones, "
+                          f"{self.trafico_total['bytes'] / 1024:.1f} KB, {self.trafico_total['bloqueadas']} bloqueadas")
             except:
                 pass
             finally:
                 self.driver = None
                 self.wait = None
     
+    def reciclar_si_necesario(self):
+        """Reemplaza el Chrome tras DRIVER_MAX_BUSQUEDAS busquedas o si su memoria supera DRIVER_MAX_RSS_MB"""
+        if not self.driver:
+            return
+        
+        motivo = motivo_reciclaje(self.driver, self.busquedas_driver)
+        if motivo:
+            print(f"[Worker {self.worker_id}] Reciclando Chrome ({motivo})")
+            self.close_driver()
+            self.initialize_driver()
+    
+    @property
+    def formulario_cargado(self) -> bool:
+        """La pagina de busqueda ya fue cargada en la pestana activa"""
+        return self.pestana_actual in self.formularios_cargados
+    
+    @formulario_cargado.setter
+    def formulario_cargado(self, cargado: bool):
+        if cargado:
+            self.formularios_cargados.add(self.pestana_actual)
+        else:
+            self.formularios_cargados.discard(self.pestana_actual)
+    
+    def is_ready(self) -> bool:
+        """Indica si el backend ya fue inicializado (sin round trip al navegador)"""
+        return self.driver is not None
+    
     def is_driver_alive(self) -> bool:
         """Verifica si el driver sigue activo y funcional"""
         if not self.driver:
@@ -105,16 +261,7 @@ class SunatScraper:
             return False
     
     def limpiar_razon_social(self, texto: str) -> str:
-        texto = texto.upper()
-        texto = re.sub(r'[^A-Z0-9\s]', '', texto)
-        texto = ' '.join(texto.split())
-        
-        for sufijo in config.SUFIJOS_EMPRESAS:
-            if texto.endswith(sufijo):
-                texto = texto[:-len(sufijo)].strip()
-                break
-        
-        return texto.strip()
+        return limpiar_razon_social(texto)
     
     def obtener_variantes_busqueda(self, texto: str) -> list:
         palabras = texto.split()
@@ -130,194 +277,562 @@ class SunatScraper:
         return variantes
     
     def extraer_todos_los_rucs(self, texto: str) -> list:
-        return re.findall(r'\b(?:10|20)\d{9}\b', texto)
+        return PATRON_RUC.findall(texto)
     
-    def seleccionar_mejor_ruc(self, rucs: list, texto_completo: str) -> tuple:
-        if not rucs:
-            return None, config.STATUS['NOT_FOUND']
+    def puntuar_candidatos(self, filas: list, razon_limpia: str) -> list:
+        """
+        Descarta RUCs con digito verificador invalido y ordena las filas por
+        similitud con la razon social buscada. Retorna [(similitud, fila), ...]
+        """
+        candidatos = [
+            (similitud_razon_social(razon_limpia, fila.get('razon_social', '')), fila)
+            for fila in filas
+            if validar_ruc(fila['ruc'])
+        ]
+        # A igual similitud se prefieren personas juridicas (RUC 20)
+        candidatos.sort(key=lambda c: (c[0], c[1]['ruc'].startswith('20')), reverse=True)
+        return candidatos
+    
+    def seleccionar_mejor_ruc(self, filas: list, razon_limpia: str) -> tuple:
+        """Elige la fila mas parecida a la razon social y retorna (ruc, estado, similitud) de esa fila"""
+        candidatos = self.puntuar_candidatos(filas, razon_limpia)
+        if not candidatos:
+            return None, config.STATUS['NOT_FOUND'], 0.0
         
-        if len(rucs) == 1:
-            estado = self._extraer_estado(texto_completo)
-            return rucs[0], estado
+        similitud, mejor = candidatos[0]
+        return mejor['ruc'], self._extraer_estado(mejor), similitud
+    
+    def _extraer_estado(self, fila: dict) -> str:
+        return normalizar_estado(fila.get('estado'))
+    
+    def _leer_trafico(self) -> dict:
+        """Trafico de red desde la ultima lectura ({} si no se mide)"""
+        if not config.CONTADORES_RED or not self.driver:
+            return {}
+        try:
+            return leer_trafico_red(self.driver)
+        except Exception:
+            return {}
+    
+    def _registrar_trafico(self):
+        trafico = self._leer_trafico()
+        if not trafico:
+            return
+        self.trafico_red = trafico
+        for clave, valor in trafico.items():
+            self.trafico_total[clave] = self.trafico_total.get(clave, 0) + valor
+        print(f"[Worker {self.worker_id}] Red: {trafico['peticiones']} peticiones, "
+              f"{trafico['bytes'] / 1024:.1f} KB, {trafico['bloqueadas']} bloqueadas")
+    
+    @contextmanager
+    def _fase(self, nombre: str):
+        """Acumula el tiempo de una fase de la busqueda en self.tiempos_fases"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tiempos_fases[nombre] = self.tiempos_fases.get(nombre, 0.0) + time.perf_counter() - inicio
+    
+    def _detectar_resultado(self, driver, boton_buscar):
+        """
+        Condicion para WebDriverWait: retorna el tipo de respuesta apenas esta disponible
+        ('alert', 'resultados', 'sin_resultados', 'pagina_cargada') o False si aun no hay nada.
+        """
+        try:
+            _ = driver.switch_to.alert.text
+            return 'alert'
+        except NoAlertPresentException:
+            pass
+        
+        if driver.find_elements(By.CSS_SELECTOR, config.SELECTOR_RESULTADOS):
+            return 'resultados'
         
-        rucs_20 = [r for r in rucs if r.startswith('20')]
-        if rucs_20:
-            rucs = rucs_20
+        if driver.find_elements(By.XPATH, config.XPATH_SIN_RESULTADOS):
+            return 'sin_resultados'
         
-        mejor_ruc = rucs[0]
-        estado = self._extraer_estado(texto_completo)
+        # Pagina nueva ya cargada pero sin ninguno de los marcadores conocidos
+        try:
+            boton_buscar.is_enabled()
+        except StaleElementReferenceException:
+            if driver.execute_script("return document.readyState") == 'complete':
+                return 'pagina_cargada'
         
-        return mejor_ruc, estado
+        return False
+    
+    def _input_razon_visible(self):
+        """Campo de razon social si esta visible; abre la pestana 'Por Razon Social' si hace falta"""
+        for intento in range(2):
+            for by, valor in ((By.ID, "txtNombreRazonSocial"), (By.NAME, "search3")):
+                elementos = self.driver.find_elements(by, valor)
+                if elementos and elementos[0].is_displayed():
+                    return elementos[0]
+            
+            if intento == 0:
+                with self._fase('pestana'):
+                    try:
+                        tab = self.wait.until(EC.element_to_be_clickable((By.ID, "btnPorRazonSocial")))
+                        tab.click()
+                    except:
+                        return None
+        return None
+    
+    def _recargar_formulario(self):
+        self.driver.get(config.SUNAT_URL)
+        self.formulario_cargado = True
+        self.recargas_completas += 1
     
-    def _extraer_estado(self, texto: str) -> str:
-        texto_upper = texto.upper()
-        if "ACTIVO" in texto_upper:
-            return "ACTIVO"
-        elif "BAJA" in texto_upper:
-            return "BAJA"
-        elif "SUSPENSION" in texto_upper:
-            return "SUSPENDIDO"
+    def _preparar_formulario(self):
+        """
+        Deja el formulario de busqueda listo reutilizando la pagina ya cargada:
+        - si sigue en pantalla (p.ej. despues de un alert) se usa tal cual
+        - si se esta en la pagina de resultados se vuelve atras en el historial
+        Solo se recarga SUNAT_URL si el formulario se perdio o hubo un error de sesion.
+        """
+        input_razon = None
+        
+        if self.formulario_cargado:
+            try:
+                if not self.driver.find_elements(By.ID, "btnAceptar"):
+                    with self._fase('navegacion'):
+                        self.driver.back()
+                input_razon = self._input_razon_visible()
+            except Exception as e:
+                print(f"[Worker {self.worker_id}] Formulario perdido, recargando: {e}")
+                input_razon = None
+        
+        if input_razon is None:
+            with self._fase('navegacion'):
+                self._recargar_formulario()
+            input_razon = self._input_razon_visible()
         else:
-            return "DESCONOCIDO"
+            self.formularios_reutilizados += 1
+        
+        return input_razon
+    
+    def _escribir_variante(self, variante: str):
+        """Deja la variante escrita en el formulario (y el CAPTCHA resuelto) listo para enviar"""
+        input_razon = self._preparar_formulario()
+        
+        with self._fase('escritura'):
+            if input_razon:
+                try:
+                    input_razon.clear()
+                    input_razon.send_keys(variante)
+                except Exception as e:
+                    print(f"[Worker {self.worker_id}] ERROR escribiendo: {e}")
+        
+        captcha_visible = False
+        try:
+            txt_codigo = self.driver.find_element(By.ID, "txtCodigo")
+            if txt_codigo.is_displayed():
+                captcha_visible = True
+        except:
+            pass
+        
+        if captcha_visible:
+            self.captchas += 1
+            if not self.resolver_captcha:
+                # La pagina con CAPTCHA no se reutiliza: la proxima busqueda recarga el formulario
+                self.formulario_cargado = False
+                raise CaptchaRequerido(variante)
+            with self._fase('captcha'):
+                print(f"[Worker {self.worker_id}] CAPTCHA detectado. Escribelo en Chrome y presiona ENTER aqui...")
+                input()
     
-    def buscar_ruc(self, razon_social: str) -> dict:
+    def _atender_respuesta(self, respuesta) -> list:
+        """Filas de la pagina una vez detectada la respuesta ([] para alert o sin resultados)"""
+        if respuesta == 'alert':
+            alert = self.driver.switch_to.alert
+            alert_text = alert.text
+            self.alertas += 1
+            print(f"[Worker {self.worker_id}] Alert: {alert_text}")
+            alert.accept()
+            self.html_respuesta = ''
+            return []
+        
+        if respuesta == 'sin_resultados':
+            self.html_respuesta = self.driver.page_source if self.archivo is not None else ''
+            return []
+        
+        with self._fase('extraccion'):
+            return self._extraer_filas_resultado()
+    
+    def _consultar_variante(self, variante: str) -> list:
+        """
+        Ejecuta una busqueda por razon social en la web y retorna las filas de la
+        pagina de resultados ([] si SUNAT respondio con un alert o sin resultados).
+        """
+        self._escribir_variante(variante)
+        
+        respuesta = None
+        try:
+            with self._fase('envio'):
+                boton_buscar = self.driver.find_element(By.ID, "btnAceptar")
+                boton_buscar.click()
+            
+            # Esperar por eventos (resultados, alert o mensaje de sin resultados) en vez de sleeps fijos
+            with self._fase('espera_resultado'):
+                try:
+                    respuesta = WebDriverWait(
+                        self.driver,
+                        config.RESULT_WAIT_TIMEOUT,
+                        poll_frequency=config.RESULT_POLL_INTERVAL
+                    ).until(lambda driver: self._detectar_resultado(driver, boton_buscar))
+                except TimeoutException:
+                    print(f"[Worker {self.worker_id}] Sin respuesta reconocible tras {config.RESULT_WAIT_TIMEOUT}s, leyendo pagina")
+                    respuesta = 'timeout'
+                
+        except Exception as e:
+            print(f"[Worker {self.worker_id}] ERROR en Buscar: {e}")
+        
+        filas = self._atender_respuesta(respuesta)
+        self._archivar_pagina(variante, self.html_respuesta)
+        return filas
+    
+    def _archivar_pagina(self, variante: str, html: str):
+        """Graba el HTML crudo de la respuesta de una variante si hay archivo de paginas"""
+        if self.archivo is not None:
+            with self._fase('archivo'):
+                self.archivo.guardar(variante, html)
+    
+    def _extraer_filas_resultado(self) -> list:
+        """
+        Descarga el HTML de la pagina una sola vez y lo parsea localmente.
+        Solo si la pagina principal no tiene resultados se revisan los iframes.
+        """
+        paginas = [self.driver.page_source]
+        filas = parsear_resultados(paginas[0])
+        
+        if not filas:
+            for frame in self.driver.find_elements(By.TAG_NAME, "iframe"):
+                try:
+                    self.driver.switch_to.frame(frame)
+                    paginas.append(self.driver.page_source)
+                    filas.extend(parsear_resultados(paginas[-1]))
+                except:
+                    pass
+                finally:
+                    self.driver.switch_to.default_content()
+        
+        self.html_respuesta = ''.join(paginas)
+        return filas
+    
+    def _resultado_error(self, e: Exception) -> dict:
+        """Clasifica una excepcion de busqueda como CAPTCHA, ERROR o ERROR_CONEXION"""
+        if isinstance(e, CaptchaRequerido):
+            print(f"[Worker {self.worker_id}] CAPTCHA en '{e}': el registro queda para la sesion de CAPTCHA")
+            return {'ruc': None, 'variante': None, 'estado': 'CAPTCHA', 'observacion': 'CAPTCHA pendiente'}
+        
+        error_msg = str(e)
+        print(f"[Worker {self.worker_id}] ERROR: {e}")
+        
+        # El estado de la pagina es incierto: la proxima busqueda recarga el formulario
+        self.formulario_cargado = False
+        
+        # Detectar errores críticos de conexión
+        errores_criticos = [
+            'ERR_CONNECTION_RESET',
+            'ERR_INTERNET_DISCONNECTED', 
+            'ERR_NAME_NOT_RESOLVED',
+            'ERR_CONNECTION_REFUSED',
+            'ERR_CONNECTION_TIMED_OUT',
+            'ERR_NETWORK_CHANGED',
+            'ERR_CONNECTION_CLOSED',
+            'Max retries exceeded',
+            'Connection refused',
+            'Connection reset',
+            'Connection aborted',
+            'No se puede establecer una conexión',
+            'Failed to establish a new connection',
+            'NewConnectionError',
+            'Timeout',
+            'timed out',
+            'chrome not reachable',
+            'Session deleted because of page crash',
+            'disconnected: not connected to DevTools',
+            'invalid session id'
+        ]
+        
+        es_error_critico = any(error in error_msg for error in errores_criticos)
+        
+        resultado = {'ruc': None, 'variante': None}
+        if es_error_critico:
+            print(f"\n{'!'*70}")
+            print(f"[Worker {self.worker_id}] ERROR CRITICO DE CONEXION DETECTADO")
+            print(f"{'!'*70}")
+            resultado['estado'] = 'ERROR_CONEXION'
+            resultado['observacion'] = f'ERROR CONEXION: {error_msg}'
+        else:
+            resultado['estado'] = config.STATUS['ERROR']
+            resultado['observacion'] = str(e)
+        return resultado
+    
+    def buscar_ruc(self, razon_social: str, antes_de_consultar=None) -> dict:
+        """
+        Busca el RUC probando las variantes de la razon social.
+        antes_de_consultar: funcion opcional que se llama antes de enviar cada variante
+        (p.ej. para tomar una ficha del limite de tasa)
+        """
         resultado = {
             'ruc': None,
             'estado': config.STATUS['PENDING'],
-            'observacion': ''
+            'observacion': '',
+            'variante': None
         }
+        self.tiempos_fases = {}
+        inicio = time.perf_counter()
+        
+        # Chrome de larga vida: reemplazarlo antes de que su memoria provoque crashes
+        self.reciclar_si_necesario()
+        self.busquedas_driver += 1
         
         # Verificar que el driver esté vivo antes de comenzar
         if not self.is_driver_alive():
-            print(f"[Worker {self.worker_id}] ERROR: Chrome no está activo")
+            print(f"[Worker {self.worker_id}] ERROR: {self.NOMBRE_BACKEND} no está activo")
             resultado['estado'] = 'ERROR_CONEXION'
-            resultado['observacion'] = 'Chrome cerrado o no disponible'
+            resultado['observacion'] = f'{self.NOMBRE_BACKEND} cerrado o no disponible'
+            self.duracion_busqueda = time.perf_counter() - inicio
             return resultado
         
         try:
-            razon_limpia = self.limpiar_razon_social(razon_social)
-            variantes = self.obtener_variantes_busqueda(razon_limpia)
-            
-            print(f"[Worker {self.worker_id}] Limpiado: {razon_limpia}")
+            busqueda = EstadoBusqueda(self, razon_social)
+            print(f"[Worker {self.worker_id}] Limpiado: {busqueda.razon_limpia}")
             
-            ruc_encontrado = None
-            estado_encontrado = config.STATUS['NOT_FOUND']
-            variante_exitosa = None
-            
-            for idx_var, variante in enumerate(variantes, 1):
-                if ruc_encontrado:
-                    break
-                
-                if idx_var > 1:
-                    print(f"[Worker {self.worker_id}] Variante {idx_var}/{len(variantes)}: {variante}")
-                
-                self.driver.get(config.SUNAT_URL)
-                
-                try:
-                    tab = self.wait.until(EC.element_to_be_clickable((By.ID, "btnPorRazonSocial")))
-                    tab.click()
-                except:
-                    pass
-                
-                input_razon = None
-                try:
-                    input_razon = self.driver.find_element(By.ID, "txtNombreRazonSocial")
-                    if not input_razon.is_displayed():
-                        input_razon = self.driver.find_element(By.NAME, "search3")
-                except:
-                    pass
-                
-                if input_razon and input_razon.is_displayed():
-                    try:
-                        input_razon.clear()
-                        input_razon.send_keys(variante)
-                    except Exception as e:
-                        print(f"[Worker {self.worker_id}] ERROR escribiendo: {e}")
-                
-                captcha_visible = False
-                try:
-                    txt_codigo = self.driver.find_element(By.ID, "txtCodigo")
-                    if txt_codigo.is_displayed():
-                        captcha_visible = True
-                except:
-                    pass
-                
-                if captcha_visible:
-                    print(f"[Worker {self.worker_id}] CAPTCHA detectado. Escribelo en Chrome y presiona ENTER aqui...")
-                    input()
-                
-                try:
-                    self.driver.find_element(By.ID, "btnAceptar").click()
-                    
-                    time.sleep(0.5)
-                    try:
-                        alert = self.driver.switch_to.alert
-                        alert_text = alert.text
-                        print(f"[Worker {self.worker_id}] Alert: {alert_text}")
-                        alert.accept()
-                        continue
-                    except:
-                        pass
-                        
-                except Exception as e:
-                    print(f"[Worker {self.worker_id}] ERROR en Buscar: {e}")
-                
-                time.sleep(config.PAGE_LOAD_WAIT)
+            while not busqueda.terminado:
+                variante = busqueda.variante_actual()
+                if busqueda.indice > 0:
+                    print(f"[Worker {self.worker_id}] Variante {busqueda.indice + 1}/{len(busqueda.variantes)}: {variante}")
                 
-                body_text = self.driver.find_element(By.TAG_NAME, "body").text
-                rucs_encontrados = self.extraer_todos_los_rucs(body_text)
+                if antes_de_consultar:
+                    with self._fase('limite_tasa'):
+                        antes_de_consultar()
                 
-                if not rucs_encontrados:
-                    iframes = self.driver.find_elements(By.TAG_NAME, "iframe")
-                    for frame in iframes:
-                        try:
-                            self.driver.switch_to.frame(frame)
-                            frame_text = self.driver.find_element(By.TAG_NAME, "body").text
-                            rucs_frame = self.extraer_todos_los_rucs(frame_text)
-                            if rucs_frame:
-                                rucs_encontrados.extend(rucs_frame)
-                                body_text += " " + frame_text
-                            self.driver.switch_to.default_content()
-                        except:
-                            self.driver.switch_to.default_content()
-                
-                if rucs_encontrados:
-                    ruc_encontrado, estado_encontrado = self.seleccionar_mejor_ruc(
-                        rucs_encontrados, 
-                        body_text
-                    )
-                    variante_exitosa = variante
+                busqueda.registrar(self._consultar_variante(variante))
             
-            if ruc_encontrado:
-                print(f"[Worker {self.worker_id}] RUC: {ruc_encontrado} ({estado_encontrado})")
-                resultado['ruc'] = ruc_encontrado
-                resultado['estado'] = estado_encontrado
-                resultado['observacion'] = 'Exito'
-                if variante_exitosa != variantes[0]:
-                    resultado['observacion'] += f' (variante: {variante_exitosa})'
-            else:
-                print(f"[Worker {self.worker_id}] No encontrado")
-                resultado['estado'] = config.STATUS['NOT_FOUND']
-                resultado['observacion'] = 'No encontrado en web'
+            resultado.update(busqueda.resultado())
         
         except Exception as e:
-            error_msg = str(e)
-            print(f"[Worker {self.worker_id}] ERROR: {e}")
+            resultado.update(self._resultado_error(e))
+        
+        if self.tiempos_fases:
+            detalle = ' '.join(f"{fase}={seg:.2f}s" for fase, seg in self.tiempos_fases.items())
+            print(f"[Worker {self.worker_id}] Tiempos: {detalle}")
+        self._registrar_trafico()
+        self.duracion_busqueda = time.perf_counter() - inicio
+        
+        return resultado
+
+    
+    def _abrir_pestanas(self, cantidad: int) -> list:
+        """Abre las pestanas del pipeline en el Chrome actual; cada una tiene su propio formulario"""
+        pestanas = [self.driver.current_window_handle]
+        for _ in range(cantidad - 1):
+            self.driver.switch_to.new_window('tab')
+            # El bloqueo de DevTools es por pestana
+            aplicar_bloqueo_red(self.driver)
+            pestanas.append(self.driver.current_window_handle)
+        return [{'handle': handle, 'busqueda': None} for handle in pestanas]
+    
+    def _activar_pestana(self, slot: dict):
+        if self.pestana_actual != slot['handle']:
+            self.driver.switch_to.window(slot['handle'])
+            self.pestana_actual = slot['handle']
+        self.tiempos_fases = slot['tiempos']
+    
+    def _enviar_en_pestana(self, slot: dict):
+        """Escribe la variante actual y dispara la busqueda sin esperar la respuesta"""
+        self._activar_pestana(slot)
+        busqueda = slot['busqueda']
+        if busqueda.indice > 0:
+            print(f"[Worker {self.worker_id}] Variante {busqueda.indice + 1}/{len(busqueda.variantes)}: {busqueda.variante_actual()}")
+        
+        self._escribir_variante(busqueda.variante_actual())
+        
+        with self._fase('envio'):
+            boton_buscar = self.driver.find_element(By.ID, "btnAceptar")
+            # Click diferido: el comando vuelve de inmediato aunque el submit navegue la pagina
+            self.driver.execute_script("var b = arguments[0]; setTimeout(function() { b.click(); }, 0);", boton_buscar)
+        
+        slot['boton'] = boton_buscar
+        slot['enviado'] = time.perf_counter()
+    
+    def _revisar_pestana(self, slot: dict) -> bool:
+        """Revisa una vez si la busqueda de la pestana ya respondio; si es asi la registra"""
+        self._activar_pestana(slot)
+        
+        respuesta = self._detectar_resultado(self.driver, slot['boton'])
+        espera = time.perf_counter() - slot['enviado']
+        if not respuesta:
+            if espera < config.RESULT_WAIT_TIMEOUT:
+                return False
+            print(f"[Worker {self.worker_id}] Sin respuesta reconocible tras {config.RESULT_WAIT_TIMEOUT}s, leyendo pagina")
+            respuesta = 'timeout'
+        
+        self.tiempos_fases['espera_resultado'] = self.tiempos_fases.get('espera_resultado', 0.0) + espera
+        slot['boton'] = None
+        filas = self._atender_respuesta(respuesta)
+        self._archivar_pagina(slot['busqueda'].variante_actual(), self.html_respuesta)
+        slot['busqueda'].registrar(filas)
+        return True
+    
+    def _completar_pestana(self, slot: dict, completar, resultado: dict):
+        self.duracion_busqueda = time.perf_counter() - slot.get('inicio', time.perf_counter())
+        if self.tiempos_fases:
+            detalle = ' '.join(f"{fase}={seg:.2f}s" for fase, seg in self.tiempos_fases.items())
+            print(f"[Worker {self.worker_id}] Tiempos: {detalle}")
+        # Con varias pestanas el log de red es del Chrome completo: se atribuye a la busqueda que termina
+        self._registrar_trafico()
+        completar(slot['clave'], resultado)
+        slot['busqueda'] = None
+        slot['boton'] = None
+        self.tiempos_fases = {}
+    
+    def buscar_rucs_pipeline(self, siguiente, completar, pestanas_por_driver: int = None) -> bool:
+        """
+        Mantiene varias busquedas en vuelo dentro del mismo Chrome, una por pestana:
+        mientras una pestana espera la respuesta de SUNAT, otra escribe y envia la suya.
+        
+        - siguiente(esperar) -> (clave, razon_social), o None si no hay trabajo
+          (con esperar=False no debe bloquearse mientras haya otras busquedas en vuelo)
+        - completar(clave, resultado) recibe el mismo dict que retornaria buscar_ruc
+        
+        Retorna True al agotarse el trabajo y False ante un error de conexion; en ese
+        caso las busquedas que quedaban en vuelo no se completan y el llamador debe
+        devolverlas a la cola.
+        """
+        cantidad = max(1, pestanas_por_driver or config.TABS_PER_WORKER)
+        pestanas = None
+        sin_trabajo = False
+        reciclar = ''
+        revisado = None
+        
+        while True:
+            if pestanas is None:
+                if not self.is_driver_alive():
+                    return False
+                pestanas = self._abrir_pestanas(cantidad)
             
-            # Detectar errores críticos de conexión
-            errores_criticos = [
-                'ERR_CONNECTION_RESET',
-                'ERR_INTERNET_DISCONNECTED', 
-                'ERR_NAME_NOT_RESOLVED',
-                'ERR_CONNECTION_REFUSED',
-                'ERR_CONNECTION_TIMED_OUT',
-                'ERR_NETWORK_CHANGED',
-                'ERR_CONNECTION_CLOSED',
-                'Max retries exceeded',
-                'Connection refused',
-                'Connection reset',
-                'No se puede establecer una conexión',
-                'Failed to establish a new connection',
-                'NewConnectionError',
-                'Timeout',
-                'timed out',
-                'chrome not reachable',
-                'Session deleted because of page crash',
-                'disconnected: not connected to DevTools',
-                'invalid session id'
-            ]
+            en_vuelo = [slot for slot in pestanas if slot['busqueda'] is not None]
+            if revisado != self.busquedas_driver:
+                reciclar = motivo_reciclaje(self.driver, self.busquedas_driver)
+                revisado = self.busquedas_driver
+            # Reciclar el Chrome solo con todas sus pestanas libres
+            if reciclar and not en_vuelo:
+                print(f"[Worker {self.worker_id}] Reciclando Chrome ({reciclar})")
+                self.close_driver()
+                if not self.initialize_driver():
+                    return False
+                pestanas = None
+                reciclar = ''
+                continue
             
-            es_error_critico = any(error in error_msg for error in errores_criticos)
+            if sin_trabajo and not en_vuelo:
+                return True
             
-            if es_error_critico:
-                print(f"\n{'!'*70}")
-                print(f"[Worker {self.worker_id}] ERROR CRITICO DE CONEXION DETECTADO")
-                print(f"{'!'*70}")
-                resultado['estado'] = 'ERROR_CONEXION'
-                resultado['observacion'] = f'ERROR CONEXION: {error_msg}'
-            else:
-                resultado['estado'] = config.STATUS['ERROR']
-                resultado['observacion'] = str(e)
+            progreso = False
+            for slot in pestanas:
+                try:
+                    if slot['busqueda'] is None:
+                        if sin_trabajo or reciclar:
+                            continue
+                        item = siguiente(not en_vuelo)
+                        if item is None:
+                            sin_trabajo = not en_vuelo
+                            continue
+                        en_vuelo.append(slot)
+                        slot['clave'], razon = item
+                        slot['tiempos'] = {}
+                        slot['inicio'] = time.perf_counter()
+                        slot['boton'] = None
+                        self._activar_pestana(slot)
+                        slot['busqueda'] = EstadoBusqueda(self, razon)
+                        self.busquedas_driver += 1
+                        print(f"[Worker {self.worker_id}] Pestana {pestanas.index(slot) + 1} - Limpiado: {slot['busqueda'].razon_limpia}")
+                    elif slot['boton'] is not None:
+                        if not self._revisar_pestana(slot):
+                            continue
+                    
+                    progreso = True
+                    if slot['busqueda'].terminado:
+                        self._completar_pestana(slot, completar, slot['busqueda'].resultado())
+                    else:
+                        self._enviar_en_pestana(slot)
+                
+                except Exception as e:
+                    self.pestana_actual = slot['handle']
+                    self.tiempos_fases = slot.get('tiempos', {})
+                    resultado = self._resultado_error(e)
+                    self._completar_pestana(slot, completar, resultado)
+                    if resultado['estado'] == 'ERROR_CONEXION':
+                        return False
+                    progreso = True
+            
+            if not progreso:
+                time.sleep(config.RESULT_POLL_INTERVAL)
+
+
+class EstadoBusqueda:
+    """
+    Avance de la busqueda de una razon social a traves de sus variantes.
+    Decide cuando detenerse y arma el resultado final; lo usan tanto
+    buscar_ruc (secuencial) como el pipeline de varias pestanas.
+    """
+    
+    def __init__(self, scraper: SunatScraper, razon_social: str):
+        self.scraper = scraper
+        self.razon_limpia = scraper.limpiar_razon_social(razon_social)
+        self.variantes = scraper.obtener_variantes_busqueda(self.razon_limpia)
+        self.indice = 0
+        self.terminado = not self.variantes
+        self.ruc = None
+        self.estado = config.STATUS['NOT_FOUND']
+        self.variante_exitosa = None
+        self.similitud = 0.0
+        
+        num_palabras = len(self.razon_limpia.split())
+        self.cota_variantes_cortas = 2 * (num_palabras - 1) / (2 * num_palabras - 1) if num_palabras > 1 else 0.0
+    
+    def variante_actual(self) -> str:
+        return self.variantes[self.indice]
+    
+    def registrar(self, filas: list):
+        """Registra las filas obtenidas para la variante actual y avanza a la siguiente si hace falta"""
+        variante = self.variante_actual()
+        self.indice += 1
+        
+        if filas:
+            ruc, estado, similitud = self.scraper.seleccionar_mejor_ruc(filas, self.razon_limpia)
+            if ruc and similitud > self.similitud:
+                self.ruc, self.estado, self.variante_exitosa = ruc, estado, variante
+                self.similitud = similitud
+        
+        # Coincidencia de alta confianza: no hace falta probar mas variantes.
+        # Ademas, los candidatos nuevos de una variante mas corta no contienen todas las palabras
+        # del nombre (si no, ya habrian salido en esta busqueda): no pueden superar la cota
+        if (self.similitud >= config.SIMILITUD_ALTA
+                or (filas and self.similitud >= self.cota_variantes_cortas)
+                or self.indice >= len(self.variantes)):
+            self.terminado = True
+    
+    def resultado(self) -> dict:
+        worker_id = self.scraper.worker_id
+        resultado = {'ruc': None, 'estado': config.STATUS['NOT_FOUND'], 'variante': None}
+        
+        if self.ruc and self.similitud < config.SIMILITUD_MINIMA:
+            print(f"[Worker {worker_id}] Descartado {self.ruc}: similitud {self.similitud:.2f}")
+            resultado['observacion'] = f'Sin coincidencia suficiente (mejor: {self.ruc}, similitud {self.similitud:.2f})'
+        elif self.ruc:
+            print(f"[Worker {worker_id}] RUC: {self.ruc} ({self.estado})")
+            resultado['ruc'] = self.ruc
+            resultado['estado'] = self.estado
+            resultado['observacion'] = 'Exito'
+            resultado['variante'] = self.variante_exitosa
+            if self.variante_exitosa != self.variantes[0]:
+                resultado['observacion'] += f' (variante: {self.variante_exitosa})'
+            if self.similitud < config.SIMILITUD_ALTA:
+                resultado['observacion'] += f' (similitud {self.similitud:.2f})'
+        else:
+            print(f"[Worker {worker_id}] No encontrado")
+            resultado['observacion'] = 'No encontrado en web'
         
         return resultado
-
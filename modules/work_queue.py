@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional
+import config
+
+
+class WorkQueue:
+    """
+    Cola de trabajo compartida entre workers (reemplaza el reparto estatico i % num_workers).
+    Cada item entregado queda "prestado" (lease) al worker hasta que lo marca como hecho.
+    Los items de un worker que muere o que se queda colgado vuelven a la cola.
+    Con abierta=True la cola se llena en paralelo (agregar) mientras los workers
+    consumen, hasta que se llama a cerrar(); capacidad limita los items en espera.
+    Los items que piden CAPTCHA se estacionan aparte (estacionar) y solo los toma
+    la sesion dedicada a resolverlos (get_estacionado), sin lease ni vencimiento.
+    """
+
+    def __init__(self, items: Iterable[tuple] = (), lease_timeout: float = None,
+                 abierta: bool = False, capacidad: int = 0):
+        self.lease_timeout = config.WORK_LEASE_TIMEOUT if lease_timeout is None else lease_timeout
+        self.cond = threading.Condition()
+        self.pendientes = deque(items)
+        self.total = len(self.pendientes)
+        self.abierta = abierta
+        self.capacidad = capacidad
+        self.en_proceso: Dict = {}  # idx -> (worker_id, item, inicio)
+        self.completados = set()
+        self.reencolados = 0
+        self.estacionados = deque()  # items bloqueados por CAPTCHA
+        self.resolviendo: Dict = {}  # idx -> (worker_id, item) en manos de la sesion de CAPTCHA
+        self.reintentos: Dict = {}  # idx -> veces reencolado por error de conexion
+
+    def get(self, worker_id: int, timeout: float = 1.0, esperar: bool = True) -> Optional[tuple]:
+        """
+        Entrega el siguiente item pendiente. Si la cola esta vacia pero hay items
+        en proceso espera, porque alguno puede volver a la cola. Retorna None
+        solo cuando ya no queda trabajo.
+        Con esperar=False retorna None de inmediato si no hay items pendientes
+        (lo usa un worker que ya tiene otras busquedas en vuelo).
+        """
+        with self.cond:
+            while True:
+                self._reencolar_vencidos()
+
+                while self.pendientes:
+                    item = self.pendientes.popleft()
+                    idx = item[0]
+                    if idx in self.completados or idx in self.en_proceso:
+                        continue
+                    self.en_proceso[idx] = (worker_id, item, time.time())
+                    if self.abierta:
+                        self.cond.notify_all()  # hay lugar para el productor
+                    return item
+
+                if (not self.en_proceso and not self.abierta) or not esperar:
+                    return None
+
+                self.cond.wait(timeout)
+
+    def reintentar(self, worker_id: int, idx, max_reintentos: int = None) -> bool:
+        """
+        Devuelve al final de la cola un item que fallo por error de conexion.
+        Retorna False si ya agoto sus reintentos (el llamador lo registra como fallido).
+        """
+        max_reintentos = config.CONEXION_MAX_REINTENTOS if max_reintentos is None else max_reintentos
+        with self.cond:
+            if idx in self.completados:
+                return True
+            if self.reintentos.get(idx, 0) >= max_reintentos:
+                return False
+            self.reintentos[idx] = self.reintentos.get(idx, 0) + 1
+
+            if idx in self.resolviendo:
+                self.estacionados.append(self.resolviendo.pop(idx)[1])
+            elif idx in self.en_proceso:
+                self.pendientes.append(self.en_proceso.pop(idx)[1])
+            # Si no esta en ninguno, su lease ya vencio y volvio a la cola
+            self.cond.notify_all()
+            return True
+
+    def estacionar(self, worker_id: int, idx) -> bool:
+        """El item pide CAPTCHA: sale del lease del worker y queda esperando a la sesion de CAPTCHA"""
+        with self.cond:
+            entrada = self.en_proceso.pop(idx, None)
+            if entrada is None or idx in self.completados:
+                return False
+            self.estacionados.append(entrada[1])
+            self.cond.notify_all()
+            return True
+
+    def get_estacionado(self, worker_id: int, timeout: float = 1.0, esperar: bool = True) -> Optional[tuple]:
+        """
+        Entrega el siguiente item estacionado por CAPTCHA. Espera mientras queden
+        items que aun podrian estacionarse; retorna None cuando ya no queda trabajo.
+        """
+        with self.cond:
+            while True:
+                if self.estacionados:
+                    item = self.estacionados.popleft()
+                    self.resolviendo[item[0]] = (worker_id, item)
+                    return item
+
+                if not esperar or not (self.pendientes or self.en_proceso or self.abierta):
+                    return None
+
+                self.cond.wait(timeout)
+
+    def agregar(self, items: Iterable[tuple]) -> int:
+        """Agrega un bloque de items; si la cola esta llena espera a que los workers la vacien"""
+        items = list(items)
+        with self.cond:
+            while self.capacidad and len(self.pendientes) >= self.capacidad:
+                self.cond.wait(1.0)
+            self.pendientes.extend(items)
+            self.total += len(items)
+            if items:
+                self.cond.notify_all()
+        return len(items)
+
+    def cerrar(self):
+        """No llegaran mas items: los workers terminan al vaciarse la cola"""
+        with self.cond:
+            self.abierta = False
+            self.cond.notify_all()
+
+    def done(self, worker_id: int, idx) -> bool:
+        """
+        Marca el item como hecho. Retorna False si ya estaba completado o si el worker
+        perdio el lease (vencio y lo tomo otro): ese resultado no se registra.
+        """
+        with self.cond:
+            if idx in self.completados:
+                return False
+            entrada = self.en_proceso.get(idx) or self.resolviendo.get(idx)
+            if entrada is None or entrada[0] != worker_id:
+                return False
+            self.completados.add(idx)
+            self.en_proceso.pop(idx, None)
+            self.resolviendo.pop(idx, None)
+            self.cond.notify_all()
+            return True
+
+    def release_worker(self, worker_id: int) -> int:
+        """Devuelve a la cola todos los items que tenia el worker (murio o termino con error)"""
+        with self.cond:
+            devueltos = [idx for idx, (wid, _, _) in self.en_proceso.items() if wid == worker_id]
+            for idx in devueltos:
+                _, item, _ = self.en_proceso.pop(idx)
+                self.pendientes.appendleft(item)
+            self.reencolados += len(devueltos)
+
+            # Los de la sesion de CAPTCHA vuelven a estacionados, no a la cola general
+            sin_resolver = [idx for idx, (wid, _) in self.resolviendo.items() if wid == worker_id]
+            for idx in sin_resolver:
+                self.estacionados.appendleft(self.resolviendo.pop(idx)[1])
+
+            if devueltos:
+                print(f"[Cola] {len(devueltos)} registros del Worker {worker_id} devueltos a la cola")
+            if devueltos or sin_resolver:
+                self.cond.notify_all()
+            return len(devueltos)
+
+    def _reencolar_vencidos(self):
+        if self.lease_timeout <= 0 or not self.en_proceso:
+            return
+        limite = time.time() - self.lease_timeout
+        vencidos = [idx for idx, (_, _, inicio) in self.en_proceso.items() if inicio < limite]
+        for idx in vencidos:
+            worker_id, item, _ = self.en_proceso.pop(idx)
+            self.pendientes.appendleft(item)
+            self.reencolados += 1
+            print(f"[Cola] Registro {idx} del Worker {worker_id} excedio {self.lease_timeout:.0f}s, devuelto a la cola")
+
+    def size(self) -> int:
+        with self.cond:
+            return len(self.pendientes)
+
+    def estacionados_count(self) -> int:
+        with self.cond:
+            return len(self.estacionados) + len(self.resolviendo)
+
+    def completed_count(self) -> int:
+        with self.cond:
+            return len(self.completados)
+
+    def is_finished(self) -> bool:
+        with self.cond:
+            return (not self.pendientes and not self.en_proceso and not self.abierta
+                    and not self.estacionados and not self.resolviendo)
@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+import config
+from modules.backends import crear_browser_pool, crear_scraper
+from modules.excel_manager import ExcelManager
+from modules.metrics import MetricasBusqueda
+from modules.rate_limiter import TokenBucket
+from modules.result_journal import ResultJournal
+from modules.result_store import AlmacenResultados
+from modules.ruc_cache import RucCache
+from procesar_sunat_paralelo import construir_resultado, imprimir_estadisticas
+
+
+class MotorAsync:
+    """
+    Motor de busqueda basado en asyncio.
+    - Semaforo: limita las busquedas en vuelo (ASYNC_CONCURRENCY)
+    - Token bucket global: limita las consultas/segundo a SUNAT (una ficha por variante enviada);
+      la espera de la primera consulta de cada registro es un await en el event loop
+    - Entrada por bloques: cada bloque se lee en un hilo aparte, sin bloquear el event loop
+    - Checkpoint asincrono: los resultados se escriben al journal en lotes, fuera del event loop
+    Las busquedas en si (Selenium o HTTP) son bloqueantes y se ejecutan en un pool de hilos.
+    """
+
+    def __init__(self, journal: ResultJournal, cache: RucCache = None,
+                 concurrencia: int = None, rate: float = None, burst: float = None,
+                 intentos_previos: Dict = None):
+        self.journal = journal
+        self.cache = cache
+        self.intentos_previos = intentos_previos or {}
+        self.concurrencia = concurrencia or config.ASYNC_CONCURRENCY
+        self.rate_limiter = TokenBucket(
+            config.RATE_LIMIT_RPS if rate is None else rate,
+            config.RATE_LIMIT_BURST if burst is None else burst
+        )
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrencia, thread_name_prefix='busqueda')
+        self.executor_journal = ThreadPoolExecutor(max_workers=1, thread_name_prefix='journal')
+        self.executor_lectura = ThreadPoolExecutor(max_workers=1, thread_name_prefix='lectura')
+        self.resultados = AlmacenResultados()
+        self.metricas = MetricasBusqueda()
+        self.ultima_exportacion = time.time()
+        self.inicio = None
+        self.semaforo = None
+        self.scrapers = None
+        self.cola_journal = None
+        self.pool = None
+
+    async def _tomar_scraper(self):
+        """Toma un backend libre; cada slot crea e inicializa el suyo la primera vez que se usa"""
+        slot_id, scraper = await self.scrapers.get()
+        if scraper is None:
+            scraper = crear_scraper(worker_id=slot_id, pool=self.pool)
+        if not scraper.is_ready():
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, scraper.initialize_driver)
+        return slot_id, scraper
+
+    async def _procesar(self, idx, fila):
+        loop = asyncio.get_running_loop()
+        try:
+            previos = self.intentos_previos.get(fila[3], 0)
+            resultado = construir_resultado(idx, fila, worker_id=None, intentos=previos + 1)
+            razon = resultado['razon_social_input']
+
+            # Los registros fallidos que se reintentan no se responden desde el cache
+            razon_limpia = fila[4]  # calculada por columna en to_work_items
+            cacheado = self.cache.get(razon_limpia) if self.cache and not previos else None
+            if cacheado:
+                cacheado['observacion'] += ' (cache)'
+                resultado.update(cacheado)
+                self.metricas.registrar_cache(resultado['estado'])
+            else:
+                # Una ficha por consulta a SUNAT. La de la primera variante se espera aqui, antes de
+                # tomar un backend, sin retener ningun slot ni hilo; las de las variantes siguientes
+                # se toman desde el hilo de la busqueda
+                await self.rate_limiter.acquire_async()
+                consultas = itertools.count()
+
+                def tomar_ficha():
+                    if next(consultas):
+                        self.rate_limiter.acquire()
+
+                slot_id, scraper = await self._tomar_scraper()
+                try:
+                    resultado['worker_id'] = slot_id
+                    recargas = scraper.recargas_completas
+                    busqueda = await loop.run_in_executor(self.executor, scraper.buscar_ruc, razon, tomar_ficha)
+                    resultado.update(busqueda)
+                    self.metricas.registrar(slot_id, scraper.duracion_busqueda, scraper.tiempos_fases,
+                                            busqueda.get('estado'), recargas=scraper.recargas_completas - recargas)
+
+                    if busqueda.get('estado') == 'ERROR_CONEXION':
+                        # Descartar el backend danado; el slot se reinicializa en su proximo uso
+                        await loop.run_in_executor(self.executor, scraper.close_driver)
+                    elif self.cache:
+                        self.cache.put(razon_limpia, busqueda)
+                finally:
+                    self.scrapers.put_nowait((slot_id, scraper))
+
+            self.resultados.agregar(resultado)
+            await self.cola_journal.put(resultado)
+            self._reportar_progreso()
+
+        except Exception as e:
+            print(f"[Async] ERROR procesando registro {idx}: {e}")
+
+        finally:
+            self.semaforo.release()
+
+    def _reportar_progreso(self):
+        completados = len(self.resultados)
+        if completados % 50 == 0:
+            print(f"[Async] {completados} completados | {self.metricas.linea_monitor()}")
+        if time.time() - self.ultima_exportacion >= config.METRICS_INTERVAL:
+            self.ultima_exportacion = time.time()
+            self.metricas.exportar()
+
+    async def _escritor_journal(self):
+        """Vacia la cola de resultados al journal en lotes, sin bloquear el event loop"""
+        loop = asyncio.get_running_loop()
+        terminar = False
+        while not terminar:
+            lote = [await self.cola_journal.get()]
+            while not self.cola_journal.empty():
+                lote.append(self.cola_journal.get_nowait())
+
+            if lote[-1] is None:
+                terminar = True
+            lote = [r for r in lote if r is not None]
+            if lote:
+                await loop.run_in_executor(self.executor_journal, self.journal.append_many, lote)
+
+    async def _bloques(self, bloques):
+        """Entrega los bloques de items leyendo cada uno en un hilo (Excel/CSV no bloquea el event loop)"""
+        loop = asyncio.get_running_loop()
+        bloques = iter(bloques)
+        while True:
+            bloque = await loop.run_in_executor(self.executor_lectura, next, bloques, None)
+            if bloque is None:
+                return
+            yield bloque
+
+    async def ejecutar(self, bloques) -> AlmacenResultados:
+        """bloques: iterable de listas de items (idx, fila); se consume a medida que se liberan lugares"""
+        self.inicio = time.time()
+        self.semaforo = asyncio.Semaphore(self.concurrencia)
+        self.cola_journal = asyncio.Queue()
+        self.scrapers = asyncio.Queue()
+        self.pool = crear_browser_pool(self.concurrencia)
+        for slot_id in range(self.concurrencia):
+            self.scrapers.put_nowait((slot_id, None))
+
+        escritor = asyncio.create_task(self._escritor_journal())
+
+        tareas = set()
+        try:
+            async for bloque in self._bloques(bloques):
+                for idx, fila in bloque:
+                    await self.semaforo.acquire()
+                    tarea = asyncio.create_task(self._procesar(idx, fila))
+                    tareas.add(tarea)
+                    tarea.add_done_callback(tareas.discard)
+
+            if tareas:
+                await asyncio.gather(*tareas)
+        finally:
+            await self.cola_journal.put(None)
+            await escritor
+            await self._cerrar_scrapers()
+            self.metricas.exportar(pendientes=0)
+            if self.pool:
+                self.pool.cerrar()
+            self.executor.shutdown(wait=False)
+            self.executor_journal.shutdown(wait=True)
+            self.executor_lectura.shutdown(wait=False)
+
+        return self.resultados
+
+    async def _cerrar_scrapers(self):
+        loop = asyncio.get_running_loop()
+        cierres = []
+        while not self.scrapers.empty():
+            _, scraper = self.scrapers.get_nowait()
+            if scraper is not None:
+                cierres.append(loop.run_in_executor(self.executor, scraper.close_driver))
+        if cierres:
+            await asyncio.gather(*cierres, return_exceptions=True)
+
+
+def procesar_async(solo_fallidos: bool = False):
+    print("="*70)
+    print("PROCESAMIENTO ASYNC DE RUCs - SUNAT")
+    print(f"Busquedas simultaneas: {config.ASYNC_CONCURRENCY}")
+    print(f"Limite global: {config.RATE_LIMIT_RPS} consultas/segundo (rafaga {config.RATE_LIMIT_BURST})")
+    print(f"Backend: {config.SCRAPER_BACKEND}")
+    print("="*70)
+
+    if config.SCRAPER_BACKEND == 'selenium':
+        print(f"ADVERTENCIA: con el backend selenium cada busqueda simultanea es un Chrome ({config.ASYNC_CONCURRENCY}).")
+        print("Se recomienda SCRAPER_BACKEND=http para este motor.")
+
+    excel_manager = ExcelManager()
+
+    try:
+        if config.INPUT_STREAMING:
+            columns = excel_manager.find_columns(excel_manager.read_header())
+        else:
+            df = excel_manager.load_data()
+            columns = excel_manager.find_columns(df)
+    except Exception as e:
+        print(f"ERROR en carga inicial: {e}")
+        return
+
+    previos, procesados = excel_manager.load_previous_results()
+    resultados = AlmacenResultados(previos)
+    del previos
+
+    solo_huellas = set(excel_manager.intentos_previos) if solo_fallidos else None
+    if solo_fallidos and not solo_huellas:
+        print("\nNo hay registros fallidos para reintentar")
+        return
+
+    if config.INPUT_STREAMING:
+        # El motor consume el generador a medida que libera lugares: la entrada se lee por bloques
+        bloques = excel_manager.stream_pending(columns, procesados, solo_huellas=solo_huellas)
+    else:
+        pendientes = excel_manager.get_pending_records(df, columns, procesados, solo_huellas)
+
+        if len(pendientes) == 0:
+            print("\nTodo ya esta procesado")
+            return
+
+        pendientes_unicos, mapa_duplicados = excel_manager.deduplicate(pendientes, columns['razon'])
+        excel_manager.registrar_duplicados(mapa_duplicados, pendientes)
+        del mapa_duplicados
+        bloques = [excel_manager.to_work_items(pendientes_unicos, columns)]
+
+    cache = RucCache() if config.CACHE_ENABLED else None
+    motor = MotorAsync(excel_manager.journal, cache=cache, intentos_previos=excel_manager.intentos_previos)
+
+    try:
+        nuevos = asyncio.run(motor.ejecutar(bloques))
+    finally:
+        transcurrido = time.time() - motor.inicio if motor.inicio else 0
+        print(f"\nBusquedas completadas: {len(motor.resultados)} en {transcurrido:.1f}s")
+
+    resultados.extend(nuevos)
+    excel_manager.journal.close()
+    excel_manager.duplicados.close()
+
+    print("\n" + "="*70)
+    print("GUARDADO FINAL")
+    print("="*70)
+    excel_manager.save_results(resultados, force=True)
+
+    print("\n" + "="*70)
+    print("PROCESAMIENTO COMPLETADO")
+    print("="*70)
+    print(f"Total procesado: {len(resultados)} busquedas unicas (los duplicados se completan en la salida)")
+    print(f"Archivo de salida: {config.OUTPUT_FILE}")
+
+    imprimir_estadisticas(resultados, cache, motor.metricas)
+    if cache:
+        cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Procesamiento async de RUCs en SUNAT")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Procesar solo los registros fallidos (ESTADOS_REINTENTABLES) de corridas anteriores")
+    args = parser.parse_args()
+
+    try:
+        procesar_async(solo_fallidos=args.retry_failed)
+    except KeyboardInterrupt:
+        print("\n\nProceso interrumpido por usuario")
+        print("El progreso ha sido guardado automaticamente")
+    except Exception as e:
+        print(f"\nERROR CRITICO: {e}")
+        import traceback
+        traceback.print_exc()
@@ -1,283 +1,512 @@
+import argparse
 import threading
 import time
-from typing import List, Dict
+from typing import Dict
 import config
+from modules.adaptive_controller import ControlAdaptativo
+from modules.circuit_breaker import CircuitBreaker
 from modules.excel_manager import ExcelManager
-from modules.sunat_scraper import SunatScraper
+from modules.metrics import MetricasBusqueda
+from modules.backends import crear_browser_pool, crear_scraper
+from modules.ruc_cache import RucCache
+from modules.result_journal import ResultJournal
+from modules.result_store import AlmacenResultados
+from modules.work_queue import WorkQueue
+
+def construir_resultado(idx, fila: tuple, worker_id: int, intentos: int = 1) -> Dict:
+    """fila: (razon, direccion, numero, huella, razon_limpia), como la entregan los items de la cola; intentos cuenta esta corrida"""
+    razon, direccion, numero, huella = fila[:4]
+    return {
+        'indice_original': idx,
+        'razon_social_input': str(razon).strip(),
+        'ruc': None,
+        'estado': config.STATUS['PENDING'],
+        'observacion': '',
+        'direccion_original': direccion,
+        'numero_original': numero,
+        'worker_id': worker_id,
+        'intentos': intentos,
+        'huella': huella
+    }
+
+
+def alimentar_cola(work_queue: WorkQueue, bloques):
+    """Hilo productor: encola los registros de la entrada a medida que se leen"""
+    try:
+        for items in bloques:
+            work_queue.agregar(items)
+    except Exception as e:
+        print(f"[Entrada] ERROR leyendo {config.INPUT_FILE}: {e}")
+    finally:
+        work_queue.cerrar()
+
+
+def imprimir_estadisticas(resultados: AlmacenResultados, cache: RucCache = None, metricas: MetricasBusqueda = None):
+    # Conteos mantenidos por el almacen al agregar cada resultado: sin recorrer la lista.
+    # Son por busqueda unica; los duplicados toman el resultado de su representante
+    exitosos = resultados.exitosos
+    no_encontrados = resultados.conteo(config.STATUS['NOT_FOUND'])
+    errores = resultados.conteo(config.STATUS['ERROR'])
+    
+    print(f"\nEstadisticas:")
+    print(f"  Exitosos: {exitosos}")
+    print(f"  No encontrados: {no_encontrados}")
+    print(f"  Errores: {errores}")
+    if cache:
+        total_consultas = cache.hits + cache.misses
+        tasa = cache.hits / total_consultas * 100 if total_consultas else 0
+        print(f"  Cache hits: {cache.hits}")
+        print(f"  Cache misses: {cache.misses}")
+        print(f"  Tasa de acierto cache: {tasa:.1f}%")
+    if metricas and metricas.busquedas:
+        resumen = metricas.resumen()
+        print(f"\nLatencia por busqueda (ultimas {len(metricas.latencias)}):")
+        fases = {'total': resumen['latencia_s'], **resumen['fases_s']}
+        for fase, valores in fases.items():
+            print(f"  {fase:<18} p50 {valores['p50']:.2f}s  p95 {valores['p95']:.2f}s  p99 {valores['p99']:.2f}s")
+
 
 class WorkerThread(threading.Thread):
     
-    def __init__(self, worker_id: int, work_items: List[tuple], 
-                 columns: Dict, resultados: List[Dict], lock: threading.Lock, pause_event: threading.Event):
+    def __init__(self, worker_id: int, work_queue: WorkQueue, 
+                 resultados: AlmacenResultados, pause_event: threading.Event,
+                 cache: RucCache = None, journal: ResultJournal = None, pool=None,
+                 controlador: ControlAdaptativo = None, metricas: MetricasBusqueda = None,
+                 resolver_captcha: bool = False, breaker: CircuitBreaker = None,
+                 intentos_previos: Dict = None):
         super().__init__()
         self.worker_id = worker_id
-        self.work_items = work_items
-        self.columns = columns
+        self.work_queue = work_queue
         self.resultados = resultados
-        self.lock = lock
         self.pause_event = pause_event
+        self.cache = cache
+        self.journal = journal
+        self.pool = pool
         self.scraper = None
+        self.procesados = 0
+        self.controlador = controlador
+        self.metricas = metricas
+        self.alertas_vistas = 0
+        self.captchas_vistos = 0
+        self.recargas_vistas = 0
+        # Sesion visible dedicada: solo toma los registros estacionados por CAPTCHA
+        self.resolver_captcha = resolver_captcha
+        self.breaker = breaker
+        self.intentos_previos = intentos_previos or {}  # huella -> intentos de corridas anteriores (fallidos)
+        self.claves_cache = {}  # idx -> razon social limpia de los registros en vuelo
+    
+    def _registrar_resultado(self, resultado: Dict):
+        # Si el lease vencio y otro worker tomo el registro, solo cuenta el resultado de ese worker
+        if not self.work_queue.done(self.worker_id, resultado['indice_original']):
+            print(f"[Worker {self.worker_id}] Registro {resultado['indice_original']} ya registrado por otro worker, se descarta")
+            return
+        self.resultados.agregar(resultado)
+        if self.journal:
+            self.journal.append(resultado)
+        
+    def _siguiente_busqueda(self, esperar: bool = True):
+        """
+        Toma registros de la cola hasta encontrar uno que requiera una busqueda real
+        (los que estan en cache se registran aqui mismo). Retorna (resultado, razon)
+        o None si no hay trabajo.
+        """
+        while True:
+            # Worker estacionado por el control adaptativo: no toma registros nuevos
+            if self.controlador and not self.controlador.puede_trabajar(self.worker_id):
+                if not esperar:
+                    return None
+                self.controlador.esperar_turno(self.worker_id, self.work_queue.is_finished)
+            
+            # Esperar si esta pausado
+            self.pause_event.wait()
+            
+            if self.resolver_captcha:
+                item = self.work_queue.get_estacionado(self.worker_id, esperar=esperar)
+            else:
+                item = self.work_queue.get(self.worker_id, esperar=esperar)
+            if item is None:
+                return None
+            idx, fila = item
+            self.procesados += 1
+            
+            razon = str(fila[0]).strip()
+            
+            print(f"\n[Worker {self.worker_id}] [#{self.procesados}, cola: {self.work_queue.size()}] Procesando: {razon}")
+            
+            previos = self.intentos_previos.get(fila[3], 0)
+            resultado = construir_resultado(idx, fila, self.worker_id, intentos=previos + 1)
+            
+            # Consultar cache antes de abrir Chrome / cargar la pagina
+            # (un registro que se reintenta por haber fallado siempre va a SUNAT).
+            # La clave viene limpia en el item: se calculo por columna al leer la entrada
+            razon_limpia = fila[4]
+            cacheado = self.cache.get(razon_limpia) if self.cache and not previos else None
+            if cacheado:
+                print(f"[Worker {self.worker_id}] Cache: {cacheado['ruc']} ({cacheado['estado']})")
+                cacheado['observacion'] += ' (cache)'
+                resultado.update(cacheado)
+                if self.metricas:
+                    self.metricas.registrar_cache(resultado['estado'])
+                self._registrar_resultado(resultado)
+                continue
+            
+            self.claves_cache[idx] = razon_limpia
+            return resultado, razon
+    
+    def _completar_busqueda(self, resultado: Dict, busqueda: Dict) -> bool:
+        """Registra el resultado de una busqueda; retorna False ante un error critico de conexion"""
+        resultado.update(busqueda)
+        razon_limpia = self.claves_cache.pop(resultado['indice_original'], None)
+        
+        if self.controlador:
+            self._informar_controlador(busqueda)
+        
+        if resultado.get('estado') == 'CAPTCHA':
+            # No es un resultado: el registro espera a la sesion de CAPTCHA y el worker sigue con otro
+            self.work_queue.estacionar(self.worker_id, resultado['indice_original'])
+            print(f"[Worker {self.worker_id}] Registro {resultado['indice_original']} estacionado por CAPTCHA "
+                  f"({self.work_queue.estacionados_count()} en espera)")
+            return True
+        
+        if self.metricas:
+            recargas = self.scraper.recargas_completas - self.recargas_vistas
+            self.recargas_vistas = self.scraper.recargas_completas
+            self.metricas.registrar(self.worker_id, self.scraper.duracion_busqueda,
+                                    self.scraper.tiempos_fases, busqueda.get('estado'), recargas=recargas)
+        
+        if self.cache and razon_limpia is not None:
+            self.cache.put(razon_limpia, busqueda)
+        
+        # Error de conexion: el registro va a la cola de reintentos (no es un resultado)
+        # y el circuit breaker decide si pausar a todos hasta que SUNAT vuelva a responder
+        if resultado.get('estado') == 'ERROR_CONEXION':
+            idx = resultado['indice_original']
+            if self.breaker:
+                self.breaker.registrar_fallo(f"Worker {self.worker_id}: {resultado.get('observacion', '')}")
+            if self.work_queue.reintentar(self.worker_id, idx):
+                print(f"[Worker {self.worker_id}] Registro {idx} reencolado para reintento")
+            else:
+                print(f"[Worker {self.worker_id}] Registro {idx} agoto sus {config.CONEXION_MAX_REINTENTOS} reintentos")
+                self._registrar_resultado(resultado)
+            return False
+        
+        if self.breaker:
+            self.breaker.registrar_exito()
+        self._registrar_resultado(resultado)
+        return True
+    
+    def _informar_controlador(self, busqueda: Dict):
+        # La espera por CAPTCHA no es latencia de SUNAT
+        latencia = sum(seg for fase, seg in self.scraper.tiempos_fases.items() if fase != 'captcha')
+        self.controlador.registrar(
+            latencia,
+            busqueda.get('estado'),
+            alertas=self.scraper.alertas - self.alertas_vistas,
+            captchas=self.scraper.captchas - self.captchas_vistos
+        )
+        self.alertas_vistas = self.scraper.alertas
+        self.captchas_vistos = self.scraper.captchas
+    
+    def _recuperar_conexion(self) -> bool:
+        """Tras un error de conexion: espera la reanudacion y reinicializa Chrome"""
+        # Los registros que quedaron en vuelo (pipeline de pestanas) vuelven a la cola
+        self.work_queue.release_worker(self.worker_id)
+        
+        # Cerrar el driver actual (puede estar corrupto)
+        print(f"[Worker {self.worker_id}] Cerrando Chrome dañado...")
+        if self.scraper:
+            try:
+                self.scraper.close_driver()
+            except:
+                pass
+        
+        # Con el circuito abierto se espera a que una sonda a SUNAT responda
+        if not self.pause_event.is_set():
+            print(f"[Worker {self.worker_id}] Esperando a que se cierre el circuito...")
+        self.pause_event.wait()
+        
+        # REINICIALIZAR el driver después de reanudar
+        print(f"[Worker {self.worker_id}] Reanudando... reinicializando Chrome")
+        max_reintentos = 3
+        for intento in range(1, max_reintentos + 1):
+            if self.scraper.initialize_driver():
+                print(f"[Worker {self.worker_id}] Chrome reinicializado exitosamente")
+                return True
+            else:
+                print(f"[Worker {self.worker_id}] Intento {intento}/{max_reintentos} falló")
+                if intento < max_reintentos:
+                    time.sleep(3)
+        
+        print(f"[Worker {self.worker_id}] No se pudo reinicializar. Terminando worker.")
+        return False
+    
+    def _procesar_secuencial(self):
+        while True:
+            siguiente = self._siguiente_busqueda()
+            if siguiente is None:
+                break
+            resultado, razon = siguiente
+            
+            # Chrome / la sesion HTTP se inicia solo cuando hay una busqueda real que hacer
+            if not self.scraper.is_ready() and not self.scraper.initialize_driver():
+                print(f"[Worker {self.worker_id}] ERROR: No se pudo inicializar {self.scraper.NOMBRE_BACKEND}")
+                return
+            
+            busqueda = self.scraper.buscar_ruc(razon)
+            
+            if not self._completar_busqueda(resultado, busqueda):
+                if not self._recuperar_conexion():
+                    return
+            
+            time.sleep(self.controlador.delay if self.controlador else config.DELAY_BETWEEN_BATCHES)
+    
+    def _procesar_con_pestanas(self):
+        """Varias busquedas en vuelo por Chrome (TABS_PER_WORKER pestanas)"""
+        pendiente = self._siguiente_busqueda()
         
+        def siguiente(esperar: bool):
+            nonlocal pendiente
+            if pendiente is not None:
+                item, pendiente = pendiente, None
+                return item
+            return self._siguiente_busqueda(esperar)
+        
+        while pendiente is not None:
+            # Chrome se inicia solo cuando hay una busqueda real que hacer
+            if not self.scraper.is_ready() and not self.scraper.initialize_driver():
+                print(f"[Worker {self.worker_id}] ERROR: No se pudo inicializar {self.scraper.NOMBRE_BACKEND}")
+                return
+            
+            if self.scraper.buscar_rucs_pipeline(siguiente, self._completar_busqueda):
+                return
+            
+            if not self._recuperar_conexion():
+                return
+            pendiente = self._siguiente_busqueda()
+    
     def run(self):
         print(f"\n{'='*60}")
-        print(f"[Worker {self.worker_id}] INICIANDO - {len(self.work_items)} registros asignados")
+        print(f"[Worker {self.worker_id}] INICIANDO - cola compartida ({self.work_queue.size()} pendientes)")
         print(f"{'='*60}")
         
-        self.scraper = SunatScraper(worker_id=self.worker_id)
-        if not self.scraper.initialize_driver():
-            print(f"[Worker {self.worker_id}] ERROR: No se pudo inicializar Chrome")
-            return
+        # La sesion de CAPTCHA usa su propio Chrome visible, fuera del pool
+        self.scraper = crear_scraper(worker_id=self.worker_id, pool=None if self.resolver_captcha else self.pool)
+        self.scraper.resolver_captcha = self.resolver_captcha
         
         try:
-            for i, (idx, row) in enumerate(self.work_items, 1):
-                # Esperar si esta pausado
-                self.pause_event.wait()
-                
-                razon = str(row[self.columns['razon']]).strip()
-                
-                print(f"\n[Worker {self.worker_id}] [{i}/{len(self.work_items)}] Procesando: {razon}")
-                
-                resultado = {
-                    'indice_original': idx,
-                    'razon_social_input': razon,
-                    'ruc': None,
-                    'estado': config.STATUS['PENDING'],
-                    'observacion': '',
-                    'direccion_original': row[self.columns['direccion']] if self.columns['direccion'] else '',
-                    'numero_original': row[self.columns['numero']] if self.columns['numero'] else '',
-                    'worker_id': self.worker_id
-                }
-                
-                busqueda = self.scraper.buscar_ruc(razon)
-                resultado.update(busqueda)
-                
-                # DETECTAR ERROR CRITICO DE CONEXION
-                if resultado.get('estado') == 'ERROR_CONEXION':
-                    print(f"\n{'='*70}")
-                    print(f"EMERGENCIA: ERROR DE CONEXION EN WORKER {self.worker_id}")
-                    print(f"{'='*70}")
-                    print(f"Pausando TODOS los workers para evitar perdida de datos...")
-                    self.pause_event.clear()  # PAUSAR TODOS
-                    
-                    with self.lock:
-                        self.resultados.append(resultado)
-                    
-                    # Cerrar el driver actual (puede estar corrupto)
-                    print(f"[Worker {self.worker_id}] Cerrando Chrome dañado...")
-                    if self.scraper:
-                        try:
-                            self.scraper.close_driver()
-                        except:
-                            pass
-                    
-                    # NO continuar procesando hasta que se reactive pause_event
-                    print(f"[Worker {self.worker_id}] Esperando reanudacion...")
-                    self.pause_event.wait()  # Esperar a que se reactive
-                    
-                    # REINICIALIZAR el driver después de reanudar
-                    print(f"[Worker {self.worker_id}] Reanudando... reinicializando Chrome")
-                    max_reintentos = 3
-                    for intento in range(1, max_reintentos + 1):
-                        if self.scraper.initialize_driver():
-                            print(f"[Worker {self.worker_id}] Chrome reinicializado exitosamente")
-                            break
-                        else:
-                            print(f"[Worker {self.worker_id}] Intento {intento}/{max_reintentos} falló")
-                            if intento < max_reintentos:
-                                time.sleep(3)
-                            else:
-                                print(f"[Worker {self.worker_id}] No se pudo reinicializar. Terminando worker.")
-                                return
-                    
-                    # Continuar con el siguiente registro
-                    time.sleep(config.DELAY_BETWEEN_BATCHES)
-                    continue
-                
-                with self.lock:
-                    self.resultados.append(resultado)
-                
-                time.sleep(config.DELAY_BETWEEN_BATCHES)
+            if config.TABS_PER_WORKER > 1 and config.SCRAPER_BACKEND == 'selenium' and not self.resolver_captcha:
+                self._procesar_con_pestanas()
+            else:
+                self._procesar_secuencial()
         
         except Exception as e:
             print(f"[Worker {self.worker_id}] ERROR CRITICO: {e}")
         
         finally:
+            # Lo que este worker tenga tomado vuelve a la cola para los demas
+            self.work_queue.release_worker(self.worker_id)
+            if self.controlador:
+                self.controlador.retirar(self.worker_id)
+            
             if self.scraper:
                 self.scraper.close_driver()
             
             print(f"\n[Worker {self.worker_id}] FINALIZADO")
 
 
-def procesar_paralelo():
+def procesar_paralelo(solo_fallidos: bool = False):
     print("="*70)
     print("PROCESAMIENTO PARALELO DE RUCs - SUNAT")
     print(f"Workers: {config.NUM_WORKERS}")
+    print(f"Backend: {config.SCRAPER_BACKEND}")
     print("="*70)
     
     excel_manager = ExcelManager()
     
     try:
-        df = excel_manager.load_data()
-        columns = excel_manager.find_columns(df)
+        if config.INPUT_STREAMING:
+            columns = excel_manager.find_columns(excel_manager.read_header())
+        else:
+            df = excel_manager.load_data()
+            columns = excel_manager.find_columns(df)
     except Exception as e:
         print(f"ERROR en carga inicial: {e}")
         return
     
-    resultados, procesados_indices = excel_manager.load_previous_results()
-    
-    pendientes = excel_manager.get_pending_records(df, procesados_indices)
+    previos, procesados = excel_manager.load_previous_results()
+    resultados = AlmacenResultados(previos)
+    del previos
     
-    if len(pendientes) == 0:
-        print("\nTodo ya esta procesado")
-        return
-    
-    print(f"\n{'='*70}")
-    print("DEDUPLICACION DE REGISTROS CONSECUTIVOS")
-    print(f"{'='*70}")
-    pendientes_unicos, mapa_duplicados = excel_manager.deduplicate_consecutive(pendientes, columns['razon'])
+    # --retry-failed: solo los registros fallidos de corridas anteriores, no los nunca procesados
+    solo_huellas = set(excel_manager.intentos_previos) if solo_fallidos else None
+    if solo_fallidos:
+        print(f"Modo reintento: {len(solo_huellas)} registros fallidos "
+              f"(estados {', '.join(config.ESTADOS_REINTENTABLES)}; maximo {config.MAX_INTENTOS} intentos)")
+        if not solo_huellas:
+            print("\nNo hay registros fallidos para reintentar")
+            return
     
-    print(f"\nDistribuyendo {len(pendientes_unicos)} registros unicos entre {config.NUM_WORKERS} workers:")
-    work_distribution = excel_manager.distribute_work(pendientes_unicos, config.NUM_WORKERS)
+    bloques = None
+    if config.INPUT_STREAMING:
+        # La entrada se lee por bloques en un hilo aparte: las busquedas empiezan con el primer bloque
+        print(f"\nLectura incremental de {config.INPUT_FILE} en bloques de {config.INPUT_CHUNK_SIZE} registros "
+              f"(deduplicacion {config.DEDUP_MODE})")
+        bloques = excel_manager.stream_pending(columns, procesados, solo_huellas=solo_huellas)
+        work_queue = WorkQueue(abierta=True, capacidad=2 * config.INPUT_CHUNK_SIZE)
+    else:
+        pendientes = excel_manager.get_pending_records(df, columns, procesados, solo_huellas)
+        
+        if len(pendientes) == 0:
+            print("\nTodo ya esta procesado")
+            return
+        
+        print(f"\n{'='*70}")
+        print(f"DEDUPLICACION DE REGISTROS (modo {config.DEDUP_MODE})")
+        print(f"{'='*70}")
+        pendientes_unicos, mapa_duplicados = excel_manager.deduplicate(pendientes, columns['razon'])
+        excel_manager.registrar_duplicados(mapa_duplicados, pendientes)
+        del mapa_duplicados
+        
+        print(f"\nEncolando {len(pendientes_unicos)} registros unicos para {config.NUM_WORKERS} workers:")
+        work_queue = excel_manager.create_work_queue(pendientes_unicos, columns)
     
     print("\n" + "="*70)
-    if config.HEADLESS_MODE:
+    if config.SCRAPER_BACKEND == 'http':
+        print("BACKEND HTTP ACTIVADO")
+        print(f"Se usaran {config.NUM_WORKERS} sesiones HTTP (sin Chrome)")
+    elif config.SCRAPER_BACKEND == 'replay':
+        print("BACKEND REPLAY ACTIVADO")
+        print(f"Las busquedas se responden desde {config.ARCHIVO_PAGINAS} (sin red)")
+    elif config.HEADLESS_MODE:
         print("MODO HEADLESS ACTIVADO")
         print("Los 5 Chrome se ejecutaran en segundo plano (sin ventanas)")
     else:
         print("ADVERTENCIA: Se abriran 5 ventanas de Chrome simultaneamente")
+    if config.GRABAR_PAGINAS and config.SCRAPER_BACKEND != 'replay':
+        print(f"Grabando el HTML de cada respuesta en {config.ARCHIVO_PAGINAS}")
     print("="*70)
     input("\nPresiona ENTER para comenzar el procesamiento paralelo...")
     
-    lock = threading.Lock()
     pause_event = threading.Event()
     pause_event.set() # Inicialmente activo (no pausado)
+    breaker = CircuitBreaker(pause_event)
+    
+    cache = RucCache() if config.CACHE_ENABLED else None
+    
+    if bloques is not None:
+        threading.Thread(target=alimentar_cola, args=(work_queue, bloques), name='entrada', daemon=True).start()
+    
+    # Con lectura incremental aun no se sabe cuantos registros hay
+    limite_registros = float('inf') if work_queue.abierta else work_queue.total
+    num_workers = int(min(config.NUM_WORKERS, limite_registros))
+    controlador = None
+    if config.CONTROL_ADAPTATIVO:
+        # Se crean hasta WORKERS_MAX hilos; los que exceden los activos esperan estacionados
+        controlador = ControlAdaptativo(num_workers)
+        num_hilos = int(min(controlador.workers_max, limite_registros))
+        print(f"Control adaptativo: {controlador.activos} workers activos "
+              f"(rango {controlador.workers_min}-{controlador.workers_max}), pausa {controlador.delay:.2f}s")
+    else:
+        num_hilos = num_workers
+    # Los Chrome se lanzan en paralelo y en segundo plano; los workers los toman ya iniciados
+    pool = crear_browser_pool(num_workers)
+    
+    metricas = MetricasBusqueda()
     
     workers = []
-    for worker_id in range(config.NUM_WORKERS):
-        work_items = work_distribution[worker_id]
-        if work_items:
-            worker = WorkerThread(
-                worker_id=worker_id,
-                work_items=work_items,
-                columns=columns,
-                resultados=resultados,
-                lock=lock,
-                pause_event=pause_event
-            )
-            workers.append(worker)
-            worker.start()
-            time.sleep(2)
+    for worker_id in range(num_hilos):
+        worker = WorkerThread(
+            worker_id=worker_id,
+            work_queue=work_queue,
+            resultados=resultados,
+            pause_event=pause_event,
+            cache=cache,
+            journal=excel_manager.journal,
+            pool=pool,
+            controlador=controlador,
+            metricas=metricas,
+            breaker=breaker,
+            intentos_previos=excel_manager.intentos_previos
+        )
+        workers.append(worker)
+        worker.start()
+        if not pool and config.SCRAPER_BACKEND == 'selenium' and worker_id < num_workers:
+            time.sleep(2)  # Sin pool: escalonar los arranques en frio de Chrome
+    
+    if config.SCRAPER_BACKEND == 'selenium':
+        # Los registros que piden CAPTCHA se estacionan y los resuelve (con el operador) una
+        # unica sesion visible; su Chrome se abre recien con el primer CAPTCHA
+        sesion_captcha = WorkerThread(
+            worker_id=num_hilos,
+            work_queue=work_queue,
+            resultados=resultados,
+            pause_event=pause_event,
+            cache=cache,
+            journal=excel_manager.journal,
+            metricas=metricas,
+            resolver_captcha=True,
+            breaker=breaker,
+            intentos_previos=excel_manager.intentos_previos
+        )
+        workers.append(sesion_captcha)
+        sesion_captcha.start()
+        print(f"Sesion de CAPTCHA: Worker {num_hilos} (visible, solo registros estacionados)")
     
     print("\n" + "="*70)
-    print("Sistema de guardado automatico activado (cada 30 segundos)")
+    print("Guardado automatico activado: cada resultado se escribe al instante en")
+    print(f"{excel_manager.journal.path} (append-only, seguro ante cortes)")
     print("="*70)
-    print("\nADVERTENCIA: Si abres RESULTADOS_FINALES.xlsx durante la ejecucion,")
-    print("el programa se PAUSARA automaticamente hasta que cierres el archivo.")
-    print("Todos los workers esperaran. No se perdera ningun dato.")
+    print(f"\n{config.OUTPUT_FILE} se genera al final del procesamiento.")
+    print("Para generarlo antes, ejecuta en otra consola:")
+    print("  python procesar_sunat_paralelo.py --exportar")
     print("="*70)
     
     last_save_count = len(resultados)
-    emergency_detected = False
+    ultimo_ajuste = time.time()
+    ultima_exportacion = time.time()
     
     while any(w.is_alive() for w in workers):
-        time.sleep(5)  # Revisar cada 5 segundos (mas frecuente para detectar emergencias)
+        time.sleep(5)
         
-        # Detectar si se activo pausa de emergencia
-        if not pause_event.is_set() and not emergency_detected:
-            # Buscar si hay algún ERROR_CONEXION en resultados
-            tiene_error_conexion = any(r.get('estado') == 'ERROR_CONEXION' for r in resultados)
-            
-            if tiene_error_conexion:
-                emergency_detected = True
-                print(f"\n{'!'*70}")
-                print("SISTEMA DE EMERGENCIA ACTIVADO")
-                print(f"{'!'*70}")
-                print("\nSe detecto un error de conexion critico.")
-                print("TODOS LOS WORKERS HAN SIDO PAUSADOS")
-                print("\nGuardando datos de emergencia...")
-                
-                # Guardar inmediatamente
-                excel_manager.save_results(resultados, force=True, pause_event=None)
-                
-                print(f"\n{'='*70}")
-                print("DATOS GUARDADOS EXITOSAMENTE")
-                print(f"{'='*70}")
-                print(f"\nRegistros guardados: {len(resultados)}")
-                print(f"Archivo: {config.OUTPUT_FILE}")
-                
-                # Verificar si los workers siguen vivos
-                workers_vivos = [w for w in workers if w.is_alive()]
-                workers_muertos = len(workers) - len(workers_vivos)
-                
-                print(f"\n{'='*70}")
-                print("ESTADO DE WORKERS:")
-                print(f"{'='*70}")
-                print(f"Workers activos: {len(workers_vivos)}/{len(workers)}")
-                if workers_muertos > 0:
-                    print(f"Workers cerrados: {workers_muertos}")
-                    print("\nNOTA: Algunos workers se cerraron (posiblemente Chrome crasheó).")
-                    print("Los workers restantes intentarán reinicializarse al reanudar.")
-                
-                print(f"\n{'='*70}")
-                print("INSTRUCCIONES:")
-                print(f"{'='*70}")
-                print("1. Verifica tu conexion a internet")
-                print("2. Revisa el archivo de resultados para confirmar que no se perdieron datos")
-                print("3. Cuando estes listo, presiona ENTER para REANUDAR el procesamiento")
-                print("4. Si todos los workers murieron, el programa terminará y podrás ejecutarlo")
-                print("   de nuevo - continuará desde donde quedó")
-                print("5. O presiona Ctrl+C para TERMINAR el programa ahora")
-                print(f"{'='*70}")
-                
-                input("\nPresiona ENTER para REANUDAR (o Ctrl+C para salir)...")
-                
-                # Verificar de nuevo cuántos workers siguen vivos
-                workers_vivos = [w for w in workers if w.is_alive()]
-                if len(workers_vivos) == 0:
-                    print("\n" + "="*70)
-                    print("TODOS LOS WORKERS HAN TERMINADO")
-                    print("="*70)
-                    print("\nNo quedan workers activos para continuar.")
-                    print("El progreso ha sido guardado.")
-                    print("\nPara continuar procesando, ejecuta el programa de nuevo.")
-                    print("Automaticamente continuará desde donde quedó.")
-                    print("="*70)
-                    return  # Terminar la función principal
-                
-                print(f"\nReanudando procesamiento con {len(workers_vivos)} workers...")
-                pause_event.set()  # Reanudar workers
-                emergency_detected = False
+        if controlador and pause_event.is_set() and time.time() - ultimo_ajuste >= config.CONTROL_INTERVALO:
+            ultimo_ajuste = time.time()
+            cambio = controlador.ajustar()
+            if cambio:
+                print(f"\n[Control] {cambio}")
         
-        # Guardado periodico normal (cada 30 segundos)
+        # El progreso se guarda en el journal por cada resultado; aqui solo se informa
         current_count = len(resultados)
+        pendientes = work_queue.total - work_queue.completed_count()
         if current_count > last_save_count:
-            # Solo guardar si no estamos en emergencia
-            if pause_event.is_set():
-                print(f"\nGuardando progreso... ({current_count} registros totales)")
-                excel_manager.save_results(resultados, force=True, pause_event=pause_event)
-                last_save_count = current_count
+            estacionados = work_queue.estacionados_count()
+            # Conteos O(1): los mantiene el almacen al agregar cada resultado
+            sin_conexion = resultados.conteo('ERROR_CONEXION')
+            print(f"\nProgreso: {current_count} registros totales | {metricas.linea_monitor(pendientes)}"
+                  f"{f' | CAPTCHA en espera: {estacionados}' if estacionados else ''}"
+                  f"{f' | ERROR_CONEXION: {sin_conexion}' if resultados.hay_error_conexion else ''}"
+                  f"{' | CIRCUITO ABIERTO' if breaker.abierto else ''}"
+                  f"{' (entrada aun en lectura)' if work_queue.abierta else ''}")
+            last_save_count = current_count
+        
+        if time.time() - ultima_exportacion >= config.METRICS_INTERVAL:
+            ultima_exportacion = time.time()
+            metricas.exportar(pendientes=pendientes)
     
     for worker in workers:
         worker.join()
     
-    print("\n" + "="*70)
-    print("REPLICANDO RESULTADOS A DUPLICADOS")
-    print("="*70)
+    breaker.detener()
+    if breaker.aperturas:
+        print(f"Circuito abierto {breaker.aperturas} veces ({breaker.segundos_abierto:.0f}s en total)")
+    if pool:
+        pool.cerrar()
     
-    resultados_replicados = []
-    for resultado in resultados:
-        idx_original = resultado['indice_original']
-        if idx_original in mapa_duplicados:
-            indices_duplicados = mapa_duplicados[idx_original]
-            for idx_dup in indices_duplicados:
-                resultado_copia = resultado.copy()
-                resultado_copia['indice_original'] = idx_dup
-                if idx_dup != idx_original:
-                    resultado_copia['observacion'] += ' (duplicado)'
-                resultados_replicados.append(resultado_copia)
-    
-    print(f"Resultados replicados: {len(resultados)} -> {len(resultados_replicados)}")
-    resultados = resultados_replicados
+    metricas.exportar(pendientes=0)
+    if config.METRICS_FILE:
+        print(f"Metricas: {config.METRICS_FILE}")
+    
+    excel_manager.journal.close()
+    excel_manager.duplicados.close()
     
     print("\n" + "="*70)
     print("GUARDADO FINAL")
@@ -287,22 +516,36 @@ def procesar_paralelo():
     print("\n" + "="*70)
     print("PROCESAMIENTO COMPLETADO")
     print("="*70)
-    print(f"Total procesado: {len(resultados)} registros")
+    print(f"Total procesado: {len(resultados)} busquedas unicas (los duplicados se completan en la salida)")
     print(f"Archivo de salida: {config.OUTPUT_FILE}")
     
-    exitosos = sum(1 for r in resultados if r.get('ruc'))
-    no_encontrados = sum(1 for r in resultados if r.get('estado') == config.STATUS['NOT_FOUND'])
-    errores = sum(1 for r in resultados if r.get('estado') == config.STATUS['ERROR'])
-    
-    print(f"\nEstadisticas:")
-    print(f"  Exitosos: {exitosos}")
-    print(f"  No encontrados: {no_encontrados}")
-    print(f"  Errores: {errores}")
+    imprimir_estadisticas(resultados, cache, metricas)
+    if cache:
+        cache.close()
+
+
+def exportar_resultados():
+    print("="*70)
+    print("EXPORTANDO RESULTADOS DEL JOURNAL A EXCEL")
+    print("="*70)
+    excel_manager = ExcelManager()
+    if excel_manager.export_from_journal():
+        print(f"Archivo de salida: {excel_manager.output_file}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Procesamiento paralelo de RUCs - SUNAT")
+    parser.add_argument('--exportar', action='store_true',
+                        help="Solo generar el Excel de salida a partir del journal y salir")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Procesar solo los registros fallidos (ESTADOS_REINTENTABLES) de corridas anteriores")
+    args = parser.parse_args()
+    
     try:
-        procesar_paralelo()
+        if args.exportar:
+            exportar_resultados()
+        else:
+            procesar_paralelo(solo_fallidos=args.retry_failed)
     except KeyboardInterrupt:
         print("\n\nProceso interrumpido por usuario")
         print("El progreso ha sido guardado automaticamente")
@@ -0,0 +1,36 @@
+from modules.result_parser import parsear_resultados
+
+
+def test_lista_dentro_de_tabla_de_maquetacion():
+    """Los items marcados por clase dentro de un <tr> de maquetacion son filas separadas"""
+    html = (
+        '<table><tr><td><div class="list-group">'
+        '<a class="aRucs list-group-item">RUC: 20100070970 - SUPERMERCADOS PERUANOS SA'
+        '<p class="list-group-item-text">Estado: ACTIVO</p></a>'
+        '<a class="aRucs list-group-item">RUC: 20601234567 - INVERSIONES DEL SUR SAC'
+        '<p class="list-group-item-text">Estado: BAJA</p></a>'
+        '</div></td></tr></table>'
+    )
+
+    filas = parsear_resultados(html)
+
+    assert [(f['ruc'], f['estado']) for f in filas] == [
+        ('20100070970', 'ACTIVO'),
+        ('20601234567', 'BAJA'),
+    ]
+
+
+def test_filas_de_tabla_sin_clases():
+    html = (
+        '<table>'
+        '<tr><td>20100070970</td><td>SUPERMERCADOS PERUANOS SA</td><td>ACTIVO</td></tr>'
+        '<tr><td>20601234567</td><td>INVERSIONES DEL SUR SAC</td><td>BAJA</td></tr>'
+        '</table>'
+    )
+
+    filas = parsear_resultados(html)
+
+    assert [(f['ruc'], f['razon_social'], f['estado']) for f in filas] == [
+        ('20100070970', 'SUPERMERCADOS PERUANOS SA', 'ACTIVO'),
+        ('20601234567', 'INVERSIONES DEL SUR SAC', 'BAJA'),
+    ]